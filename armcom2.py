@@ -51,19 +51,42 @@ from random import choice, shuffle, sample		# for the illusion of randomness
 from math import floor, degrees, atan2, ceil		# math and heading calculations
 import traceback					# for error reporting
 from calendar import monthrange				# for date calculations
-import gzip, json, time
+from copy import copy					# duplicating objects
+import csv, gzip, json, time
+import random, zlib					# seeded map generation
+import multiprocessing					# parallel simulated campaigns and arena engagements
 from datetime import date, datetime, timedelta		# for timestamping logs, date calculations
 from textwrap import wrap				# breaking up strings
 import shelve						# saving and loading games
 from astral import LocationInfo, moon
 from astral.sun import sun
 os.environ['PYSDL2_DLL_PATH'] = os.getcwd() + os.sep + 'lib'	# set sdl2 dll path
+SIMULATE = '--simulate' in sys.argv			# play campaigns under the autopilot, see RunCampaignSimulator
+REPLAY = '--replay' in sys.argv				# play back a replay log, see ReplayLog
+ARENA = '--arena' in sys.argv				# play AI-versus-AI engagements as a benchmark, see RunArena
+HEADLESS = '--headless' in sys.argv or SIMULATE or REPLAY or ARENA	# run without a display, using null display backend
+if HEADLESS:
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	os.environ['SDL_AUDIODRIVER'] = 'dummy'
 import sdl2.sdlmixer as mixer				# sound effects
 import sdl2						# gamepad support
-import libtcodpy as libtcod				# main display library
+if HEADLESS:
+	import null_display as libtcod			# in-memory consoles and scripted input
+else:
+	import libtcodpy as libtcod			# main display library
 import xp_loader					# loading xp image files
+if HEADLESS:
+	xp_loader.libtcod = libtcod
 from steamworks import STEAMWORKS			# main steamworks library
 import ctypes
+try:
+	import numpy					# optional, fast bulk random number generation
+except ImportError:
+	numpy = None
+try:
+	import pyarrow, pyarrow.parquet			# optional, analytics export to parquet files
+except ImportError:
+	pyarrow = None
 
 
 ##########################################################################################
@@ -267,13 +290,24 @@ CHAR_MAP = {
 DEBUG_OPTIONS  = [
 	'Regenerate CD Map Roads & Rivers', 'Stress Test', 'Spawn Enemy', 'Remove Enemy',
 	'Attack Selected Crewman (Scenario)', 'Set Crewman Injury', 'Set Time to End of Day',
-	'End Current Scenario', 'Regenerate Weather', 'Set Steam Stat'
+	'End Current Scenario', 'Regenerate Weather', 'Set Steam Stat', 'Benchmark CD Map Generation',
+	'Export AP Score Table', 'Toggle Threat Map', 'Benchmark Percentile Rolls', 'Toggle AI Profiling',
+	'Set AI Time Budget'
 ]
+DEBUG_OPTION_KEYS = '1234567890-=[]\\;'			# keys used to select debug menu options, in order
+
+# number of maps to generate per region and mission type in the CD map generation benchmark
+CD_MAP_BENCHMARK_MAPS = 10000
+# number of rolls to make with each method in the percentile roll benchmark
+PERCENTILE_ROLL_BENCHMARK_ROLLS = 1000000
+# number of rolls made in each random number stream entry in the percentile roll benchmark, about as
+# many as one attack or AI activation makes
+PERCENTILE_ROLL_BENCHMARK_ENTRY_ROLLS = 2
 
 # definitions for game options
 GAME_OPTIONS = [
 	'Font Size', 'Fullscreen', 'Ultrawide Fullscreen', 'Sound Effects', 'Music',
-	'Master Volume', 'Message Pause', 'Must Dismiss Messages', 'Animation Speed',
+	'Master Volume', 'Message Pause', 'Must Dismiss Messages', 'Animation Speed', 'Turbo Mode',
 	'Unit Stack Display', 'New Inf/Cav Portraits', 'Ready Rack Refill', 'Keyboard', 'Active Controller',
 	'Return to Main Menu'
 ]
@@ -397,6 +431,14 @@ CAMPAIGN_DAY_HEXES = [
 	(-4,8),(-3,8),(-2,8),(-1,8),(0,8)
 ]
 
+# index of each campaign day hex in the list above, and the index of the adjacent hex in each
+# direction for each campaign day hex, -1 if adjacent hex is off-map
+CD_HEX_INDEX = {(hx, hy) : i for i, (hx, hy) in enumerate(CAMPAIGN_DAY_HEXES)}
+CD_HEX_NEIGHBOURS = [
+	[CD_HEX_INDEX.get((hx+hx_m, hy+hy_m), -1) for (hx_m, hy_m) in CD_DESTHEX]
+	for (hx, hy) in CAMPAIGN_DAY_HEXES
+]
+
 # ordered list of scenario hex locations, not including 0,0, ordered by distance and hextant
 SCENARIO_HEXES = [
 	(0,-1), (0,-2), (0,-3), (1,-2), (1,-3), (1,-1), (2,-2), (2,-3), (3,-3), (2,-1), (3,-2),
@@ -672,6 +714,63 @@ MISSED_FP_REVEAL_CHANCE = 20.0
 AI_ACTION_MIN = 3.0
 # chance after every failed action roll that unit will simply do nothing that activation
 AI_PASS_TURN_CHANCE = 10.0
+# default maximum time in seconds that an AI unit will spend scoring possible attacks and moves for one
+# action, or None for no limit; can be changed for the current session from the debug menu
+AI_DECISION_TIME_BUDGET = None
+# number of moves that AI units look ahead when choosing where to move: 0 for none, 1 to consider the
+# attacks they could make after each move, or 2 to also consider the enemy attacks that could be made
+# in response
+AI_LOOKAHEAD_DEPTH = 0
+# number of the best possible moves that are looked ahead at for each AI action
+AI_LOOKAHEAD_MOVES = 4
+# weight given to the change in attack chances found by looking ahead when rescoring a move
+AI_LOOKAHEAD_WEIGHT = 0.5
+# unit and weapon attributes copied into a scenario snapshot
+SNAPSHOT_UNIT_FIELDS = ['hx', 'hy', 'terrain', 'alive', 'spotted', 'smoke', 'dust', 'hull_down', 'moving',
+	'immobilized', 'bogged', 'fired', 'facing', 'previous_facing', 'turret_facing', 'previous_turret_facing',
+	'pinned', 'deployed', 'reduced', 'routed', 'dug_in', 'entrenched', 'fortified']
+SNAPSHOT_WEAPON_FIELDS = ['ammo_type', 'ammo_stores', 'ready_rack', 'covered_hexes', 'jammed', 'broken',
+	'fired', 'acquired_target']
+# minimum chance of LoS between two units in a scenario snapshot for them to be treated as having LoS
+SNAPSHOT_LOS_MIN_CHANCE = 50.0
+# categories of pauses and animations that are skipped in turbo mode, unless listed in the turbo_keep
+# config setting: Rolls, Movement, Animations, Messages, Transitions
+TURBO_DEFAULT_KEEP = 'Messages'
+# smallest and largest number of percentile rolls drawn at once by a roll buffer; each refill draws
+# twice as many as the last
+ROLL_BUFFER_MIN_BLOCK = 64
+ROLL_BUFFER_MAX_BLOCK = 4096
+# independent random number streams for each part of the game, all derived from the campaign seed
+RNG_STREAMS = ['Map', 'Spawn', 'Combat', 'AI', 'Weather', 'Cosmetic']
+# streams whose rolls don't affect play, and that move on with animation timing, so are left out of
+# the game state checked by replays
+RNG_COSMETIC_STREAMS = ['Cosmetic']
+# maximum number of inputs the autopilot will give in one simulated campaign before giving up on it
+AUTOPILOT_MAX_INPUTS = 250000
+# maximum number of times in a row the autopilot will try to continue past the same menu or message
+AUTOPILOT_MAX_REPEATS = 1000
+# crew commands the autopilot gives in each command phase, in order of preference
+AUTOPILOT_CREW_COMMANDS = ['Operate Gun', 'Reload', 'Direct Fire', 'Operate MG']
+# fields of each summary record written by the campaign simulator
+SIMULATION_FIELDS = ['Run', 'Seed', 'Campaign', 'Vehicle', 'Result', 'VP', 'Days Survived', 'Tanks Lost',
+	'Crew KIA', 'Enemies Destroyed', 'Seconds']
+# tables written by the campaign simulator analytics export, and the name and type of each field
+ANALYTICS_FIELDS = {
+	'shots' : [('Run', 'int'), ('Engagement', 'int'), ('Date', 'str'), ('Turn', 'int'), ('Attacker', 'str'),
+		('Attacker Side', 'int'), ('Weapon', 'str'), ('Ammo', 'str'), ('Attack Type', 'str'),
+		('Target', 'str'), ('Target Side', 'int'), ('Range', 'int'), ('Chance', 'float'),
+		('Roll', 'float'), ('Result', 'str')],
+	'losses' : [('Run', 'int'), ('Engagement', 'int'), ('Date', 'str'), ('Turn', 'int'), ('Unit', 'str'),
+		('Side', 'int'), ('Category', 'str'), ('Destroyed By', 'str'), ('Weapon', 'str'), ('Cause', 'str')],
+	'engagements' : [('Run', 'int'), ('Engagement', 'int'), ('Date', 'str'), ('Player Unit', 'str'),
+		('Turns', 'int'), ('Player Survived', 'int'), ('Enemy Losses', 'int'), ('Friendly Losses', 'int'),
+		('Shots', 'int')]
+}
+# number of rows of an analytics table held in memory before they are written out
+ANALYTICS_BATCH_ROWS = 5000
+# fields of each engagement record written by the arena benchmark
+ARENA_FIELDS = ['Engagement', 'Seed', 'Result', 'Turns', 'Player Survived', 'Enemy Losses', 'Friendly Losses',
+	'Seconds']
 
 # ballistic attack (eg. mortars) HE fp effect modifier
 BALLISTIC_HE_FP_MOD = 0.5
@@ -709,6 +808,29 @@ EXP_MULTIPLIER = 0.5
 # base chance of CD hex zone capture per enemy-held adjacent hex zone
 CD_ZONE_CAPTURE_CHANCE = 5.0
 
+# multipliers for base odds of friendly and enemy zone capture for each Campaign Day mission
+CD_ZONE_CAPTURE_MULTIPLIERS = {
+	'Advance' : (3.0, 0.3),
+	'Spearhead' : (0.5, 0.2),
+	'Battle' : (1.0, 1.0),
+	'Major Battle' : (2.0, 2.0),
+	'Fighting Withdrawal' : (0.0, 2.0),
+	'Counterattack' : (0.3, 3.0),
+	'Hold the Line' : (0.2, 1.2),
+	'Patrol' : (0.1, 0.1),
+	'Urban Assault' : (0.5, 0.25),
+	'Urban Defense' : (0.25, 3.0),
+	'Amphibious Assault' : (0.7, 0.4)
+}
+
+# modifier for zone capture odds based on the last player action that triggered the check
+CD_ZONE_CAPTURE_ACTION_MODIFIERS = {
+	'recon' : 0.03,
+	'wait' : 1.3,
+	'quick_move' : 0.5,
+	'slow_move' : 0.85
+}
+
 # base chance that a unit not in LoS of any enemy units will regain concealment after its side's activation
 BASE_RECONCEAL_CHANCE = 20.0
 
@@ -802,6 +924,15 @@ BASE_HD_BONUS = 5.0
 CRITICAL_HIT = 3.0
 CRITICAL_MISS = 99.5
 
+# chance that a failed HE roll against an unarmoured AI vehicle will immobilize rather than stun it
+HE_IMMOBILIZE_CHANCE = 50.0
+
+# weapons that have a 1 in x chance of being placed well enough to hit the top armour of a vehicle
+TOP_ARMOUR_PLACEMENT_ODDS = {
+	'Demolition Charge' : 6,
+	'Molotovs' : 4
+}
+
 # base success chances for point fire attacks
 # first column is for vehicle targets, second is everything else
 PF_BASE_CHANCE = [
@@ -864,6 +995,17 @@ AP_STUN_MULT = 0.5
 AP_RECALL_MARGIN = 10.0
 AP_RECALL_CHANCE = 20.0
 
+# hit results that are included in the summary of hits resolved on unseen units, and how they are described
+HIT_SUMMARY_RESULTS = {
+	'DESTROYED' : 'destroyed',
+	'PENETRATED' : 'destroyed',
+	'REDUCED' : 'reduced',
+	'ROUTED' : 'routed',
+	'PINNED' : 'pinned',
+	'IMMOBILIZED' : 'immobilized',
+	'STUNNED' : 'stunned'
+}
+
 # definitions for terrain types on the Campaign Day map
 CD_TERRAIN_TYPES = {
 	'Flat' : {
@@ -1484,6 +1626,8 @@ class Campaign:
 		self.player_vp = 0		# total player victory points
 		self.max_one_day_vp = 0		# max one-day VP since last check
 		self.combat_days = 0		# total number of combat days completed
+		self.tanks_lost = 0		# total number of player vehicles destroyed or abandoned
+		self.crew_kia = 0		# total number of player crewmen killed
 		self.pc_decorations = 0		# total number of player commander decorations awarded this campaign
 		self.stats = {}			# local copy of campaign stats
 		self.combat_calendar = []	# list of combat days
@@ -1512,6 +1656,84 @@ class Campaign:
 		self.records['Combat Days'] = 0
 		
 		self.tutorial_slides = []	# list of tutorial slides that have already been displayed this tutorial campaign
+		
+		# campaign seed, and the random number streams derived from it
+		self.seed = libtcod.random_get_int(0, 0, 2147483647)
+		self.InitRNGStreams()
+		
+		# base seed for campaign day map generation, and number of maps used so far for each map type
+		self.cd_map_seed = self.rng_streams['Map'].getrandbits(31)
+		self.cd_maps_used = {}
+	
+	
+	# create the random number streams for this campaign, each seeded from the campaign seed and
+	# the stream name
+	def InitRNGStreams(self):
+		self.rng_streams = {}
+		for stream in RNG_STREAMS:
+			self.rng_streams[stream] = random.Random(zlib.crc32((str(self.seed) + stream).encode('utf-8')))
+	
+	
+	# return the season on a given calendar day in the current campaign region
+	def GetSeason(self, day, region=None):
+		if region is None:
+			region = self.stats['region']
+		weather_odds_dict = session.regions[region]['season_weather_odds']
+		date = day[day.find('.') + 1:]
+		
+		for season, value in weather_odds_dict.items():
+			if date <= value['end_date']:
+				return season
+		
+		# catch cases where date is late in the calendar year
+		if region == 'Southeast Asia':
+			return 'Northeast Monsoon'
+		elif region == 'South Pacific':
+			return 'Wet Season'
+		return 'Winter'
+	
+	
+	# return the calendar week that a given day falls in, without actually advancing the calendar
+	def GetWeekForDay(self, day):
+		week = self.current_week
+		week_index = self.stats['calendar_weeks'].index(self.current_week)
+		for calendar_week in self.stats['calendar_weeks'][week_index+1:]:
+			if day >= calendar_week['start_date']:
+				week = calendar_week
+		return week
+	
+	
+	# return a list of campaign day map types that may be needed for the next combat day in the
+	# calendar, along with the campaign week that they will be generated in
+	def GetNextDayCDMapKeys(self):
+		if self.today not in self.combat_calendar: return []
+		day_index = self.combat_calendar.index(self.today)
+		if day_index == len(self.combat_calendar) - 1: return []
+		day = self.combat_calendar[day_index+1]
+		
+		week = self.GetWeekForDay(day)
+		if 'refitting' in week: return []
+		region = week.get('new_region', self.stats['region'])
+		season = self.GetSeason(day, region=region)
+		terrain_mod = tuple(sorted(week.get('terrain_odds_modifier', {}).items()))
+		
+		# build a list of possible missions and whether they take place in urban terrain
+		if 'mission_days' in week and day in week['mission_days']:
+			mission_list = [(week['mission_days'][day], False)]
+		else:
+			mission_list = []
+			for k, v in week['mission_odds'].items():
+				if float(v) <= 0.0: continue
+				mission_list.append((k, k in RATTENKRIEG_MISSIONS))
+		
+		key_list = []
+		for (mission, rattenkrieg) in mission_list:
+			coastal_list = [None]
+			if 'coastal_chance' in week and mission != 'Amphibious Assault':
+				coastal_list += ['left', 'right']
+			for coastal_map in coastal_list:
+				key_list.append(((region, mission, rattenkrieg, season, coastal_map, terrain_mod), week))
+		return key_list
 	
 	
 	# generate a list of units for armoured unit support
@@ -1671,6 +1893,9 @@ class Campaign:
 	# do post-init modifier checks, these need to wait until the player unit is generated, etc.
 	def DoPostInitChecks(self):
 		
+		# build the AP score table for all unit types
+		BuildAPBaseScoreTable()
+		
 		# modify the player unit if required
 		
 		# if current campaign region is north africa, german and italian vehicles are all unreliable before Oct. 1941
@@ -2172,7 +2397,7 @@ class Campaign:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Assign Positions'): continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# confirm and finish
@@ -2288,8 +2513,11 @@ class Campaign:
 		self.CheckForDecorations()
 		ShowTutorialSlide('end_of_campaign')
 		self.DisplayCampaignEpilogue()
-		self.SaveAndDisplayCampaignRecord()
-		ExportLog()
+		
+		# simulated campaigns are not added to campaign records or logs
+		if session.autopilot is None:
+			self.SaveAndDisplayCampaignRecord()
+			ExportLog()
 		self.completed = True
 			
 	
@@ -2762,7 +2990,7 @@ class Campaign:
 		
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Campaign Selection'): continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# exit without starting a new campaign
@@ -2912,6 +3140,7 @@ class Campaign:
 	
 	# save current campaign options to a JSON file in the user folder
 	def SaveCampaignOptions(self):
+		if session.autopilot is not None: return
 		with open(HOMEPATH + os.sep + 'campaign_options.json', 'w', encoding='utf8') as write_file:
 			json.dump(self.options, write_file, indent=4)
 	
@@ -3108,7 +3337,7 @@ class Campaign:
 		
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent() and not skip_menu: continue
+			if not GetInputEvent(context='Campaign Options') and not skip_menu: continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# exit menu
@@ -3408,7 +3637,7 @@ class Campaign:
 		
 		while not exit_loop:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Tank Selection'): continue
 			
 			# proceed with selected vehicle
 			if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
@@ -3699,14 +3928,17 @@ class Campaign:
 			libtcod.console_blit(darken_con, 0, 0, 0, 0, 0, window_x, window_y, 0.0, (i * 0.01))
 			libtcod.console_flush()
 			if not DEBUG:
-				Wait(3, ignore_animations=True)
+				Wait(3, ignore_animations=True, category='Transitions')
 		if not DEBUG:
-			Wait(115, ignore_animations=True)
+			Wait(115, ignore_animations=True, category='Transitions')
 	
 	
 	# determine and show results of a completed campaign day: injury results and level ups
 	def ShowEndOfDay(self):
 		
+		if session.replay is not None:
+			session.replay.Checkpoint('End of Day')
+		
 		MOON_PHASES = [
 			'Full Moon', 'Waning Gibbous', 'Last Quarter', 'Waning Crescent',
 			'New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous'
@@ -3774,7 +4006,7 @@ class Campaign:
 		for i in range(100, 0, -5):
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 			libtcod.console_blit(darken_con, 0, 0, 0, 0, 0, 0, 0, 0.0, (i * 0.01))
-			Wait(5, ignore_animations=True)
+			Wait(5, ignore_animations=True, category='Transitions')
 		
 		# award exp for entire day, roll for crew injury resolution, apply results
 		for position in self.player_unit.positions_list:
@@ -3825,7 +4057,7 @@ class Campaign:
 						text)
 			
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-			Wait(30, ignore_animations=True)
+			Wait(30, ignore_animations=True, category='Transitions')
 			
 			if not position.crewman.alive:
 				libtcod.console_set_default_foreground(con, libtcod.red)
@@ -3862,7 +4094,7 @@ class Campaign:
 					libtcod.CENTER, text)
 			
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-			Wait(30, ignore_animations=True)
+			Wait(30, ignore_animations=True, category='Transitions')
 			y += 6
 		
 		# remove dead crewmen
@@ -3929,7 +4161,7 @@ class Campaign:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='End of Day'): continue
 			if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
 				exit_menu = True
 
@@ -4266,7 +4498,7 @@ class Campaign:
 			libtcod.CENTER, 'Campaign Epilogue')
 		
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(50, ignore_animations=True)
+		Wait(50, ignore_animations=True, category='Transitions')
 		
 		y = 10
 		lines = wrap(self.stats['epilogue_text'], 30)
@@ -4275,7 +4507,7 @@ class Campaign:
 			y += 2
 			if y >= 49: break
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-			Wait(30, ignore_animations=True)
+			Wait(30, ignore_animations=True, category='Transitions')
 		
 		if gamepad is not None:
 			DisplayButton(con, 44, 54, GAMEPADCHAR_A)
@@ -4291,7 +4523,7 @@ class Campaign:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Campaign Epilogue'): continue
 			
 			# exit menu
 			if key.vk == sdl2.SDLK_TAB or session.gamepad_input == 0:
@@ -4367,7 +4599,7 @@ class Campaign:
 		libtcod.console_blit(LoadXP('transfer_KIA.xp'), 0, 0, 0, 0, con, 0, 0)
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 		libtcod.console_flush()
-		Wait(30, ignore_animations=True)
+		Wait(30, ignore_animations=True, category='Transitions')
 		
 		libtcod.console_set_default_foreground(con, libtcod.black)
 		
@@ -4375,17 +4607,17 @@ class Campaign:
 		libtcod.console_print(con, 30, 12, 'Name:')
 		PrintExtended(con, 39, 12, crewman.GetCrewmanName())
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(20, ignore_animations=True)
+		Wait(20, ignore_animations=True, category='Transitions')
 		
 		libtcod.console_print(con, 30, 14, 'Age:')
 		libtcod.console_print(con, 39, 14, str(crewman.age))
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(20, ignore_animations=True)
+		Wait(20, ignore_animations=True, category='Transitions')
 		
 		libtcod.console_print(con, 30, 16, 'Rank:')
 		libtcod.console_print(con, 39, 16, session.nations[crewman.nation]['rank_names'][str(crewman.rank)])
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(20, ignore_animations=True)
+		Wait(20, ignore_animations=True, category='Transitions')
 		
 		# stats
 		libtcod.console_print(con, 30, 18, 'Stats:')
@@ -4394,7 +4626,7 @@ class Campaign:
 		libtcod.console_put_char(con, 39, 20, chr(5))
 		libtcod.console_put_char(con, 39, 21, chr(6))
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(20, ignore_animations=True)
+		Wait(20, ignore_animations=True, category='Transitions')
 		
 		y = 18
 		for t in CREW_STATS:
@@ -4403,7 +4635,7 @@ class Campaign:
 				libtcod.RIGHT, str(crewman.stats[t]))
 			y += 1
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-			Wait(10, ignore_animations=True)
+			Wait(10, ignore_animations=True, category='Transitions')
 		
 		# skills
 		libtcod.console_print(con, 30, 23, 'Skills:')
@@ -4412,7 +4644,7 @@ class Campaign:
 			libtcod.console_print(con, 32, y, skill)
 			y += 1
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-			Wait(10, ignore_animations=True)
+			Wait(10, ignore_animations=True, category='Transitions')
 		
 		# fate
 		if crewman.alive:
@@ -4421,7 +4653,7 @@ class Campaign:
 			libtcod.console_set_default_foreground(con, libtcod.light_red)
 			libtcod.console_print(con, 36, 50, 'KILLED IN ACTION')
 		
-		Wait(30, ignore_animations=True)
+		Wait(30, ignore_animations=True, category='Transitions')
 		
 		# display inputs
 		if gamepad is not None:
@@ -4438,7 +4670,7 @@ class Campaign:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Transfer or KIA'): continue
 			if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
 				PlaySoundFor(None, 'menu_select')
 				exit_menu = True
@@ -4898,6 +5130,10 @@ class Campaign:
 							
 				campaign_day.DoCampaignDayLoop()
 				
+				# player vehicle was destroyed or abandoned
+				if not self.player_unit.alive:
+					self.tanks_lost += 1
+				
 				# player was taken out
 				if campaign.ended:
 					
@@ -4906,6 +5142,11 @@ class Campaign:
 					campaign.player_vp += campaign_day.day_vp
 					if campaign_day.day_vp > campaign.max_one_day_vp:
 						campaign.max_one_day_vp = campaign_day.day_vp
+					for k in campaign_day.enemies_destroyed:
+						if k not in campaign.enemies_destroyed:
+							campaign.enemies_destroyed[k] = campaign_day.enemies_destroyed[k]
+						else:
+							campaign.enemies_destroyed[k] += campaign_day.enemies_destroyed[k]
 					
 					self.LogDayRecords()
 					self.DoEnd()
@@ -4928,7 +5169,10 @@ class Campaign:
 				self.UpdateCCDisplay()
 				
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Campaign Calendar'):
+				# use idle time to pre-generate maps that may be needed for the next combat day
+				session.FillCDMapPool()
+				continue
 			
 			# open game menus
 			if key.vk in [sdl2.SDLK_ESCAPE, sdl2.SDLK_F1, sdl2.SDLK_F2, sdl2.SDLK_F3, sdl2.SDLK_F4] or session.gamepad_input == 6:
@@ -5101,8 +5345,6 @@ class Campaign:
 						campaign_day = CampaignDay()
 						for (hx, hy) in CAMPAIGN_DAY_HEXES:
 							campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
-						campaign_day.GenerateRoads()
-						campaign_day.GenerateRivers()
 						
 						self.ShowStartOfDay()
 						campaign.AddJournal('Start of day')
@@ -5746,7 +5988,7 @@ class CDMapHex:
 			self.controlled_by = player_num
 			# generate new strength level and enemy unit list
 			if not no_generation:
-				self.GenerateStrengthAndUnits(campaign_day.mission)
+				RunInRNGStream('Spawn', self.GenerateStrengthAndUnits, campaign_day.mission)
 			return
 		
 		# captured by friendlies
@@ -5788,7 +6030,7 @@ class CDMapHex:
 			else:
 			
 				# regenerate unit classes present
-				self.GenerateStrengthAndUnits(campaign_day.mission, skip_strength=True)
+				RunInRNGStream('Spawn', self.GenerateStrengthAndUnits, campaign_day.mission, skip_strength=True)
 			
 		else:
 		
@@ -5895,7 +6137,7 @@ class CampaignDay:
 			'Storm' : False
 		}
 		self.weather_update_clock = 0		# number of in-game minutes until next weather update
-		self.GenerateWeather()
+		RunInRNGStream('Weather', self.GenerateWeather)
 		
 		self.fate_points = 3			# number of fate points protecting the player today
 		if campaign.options['fate_points'] is False:
@@ -5939,85 +6181,14 @@ class CampaignDay:
 		# current odds of a random event being triggered
 		self.random_event_chance = BASE_CD_RANDOM_EVENT_CHANCE
 		
-		# generate campaign day map and terrain, placeholder for objectives
-		self.map_hexes = {}
-		for (hx, hy) in CAMPAIGN_DAY_HEXES:
-			self.map_hexes[(hx,hy)] = CDMapHex(hx, hy, self.mission)
-		self.GenerateCDMapTerrain()
-		
-		if self.mission in ['Fighting Withdrawal', 'Urban Defense']:
-			for (hx, hy) in CAMPAIGN_DAY_HEXES:	
-				self.map_hexes[(hx, hy)].controlled_by = 0
-		
-		elif self.mission == 'Hold the Line':
-			for (hx, hy) in CAMPAIGN_DAY_HEXES:
-				if hy < 3:
-					self.map_hexes[(hx, hy)].controlled_by = 1
-				else:
-					self.map_hexes[(hx, hy)].controlled_by = 0		
-		
-		elif self.mission == 'Counterattack':
-			for (hx, hy) in CAMPAIGN_DAY_HEXES:
-				self.map_hexes[(hx, hy)].controlled_by = 0
-			hy = 0
-			hx1 = 0 - floor(hy / 2)
-			for hx in range(hx1, hx1 + 5):
-				if (hx, hy) not in self.map_hexes: continue
-				self.map_hexes[(hx, hy)].controlled_by = 1
-		
-		elif self.mission in ['Battle', 'Major Battle']:
-			for (hx, hy) in CAMPAIGN_DAY_HEXES:
-				self.map_hexes[(hx, hy)].controlled_by = 1
-			for hy in range(6, 9):
-				hx1 = 0 - floor(hy / 2)
-				for hx in range(hx1, hx1 + 5):
-					if (hx, hy) not in self.map_hexes: continue
-					self.map_hexes[(hx, hy)].controlled_by = 0
-		
-		# impassable hexes are held by nobody
-		for (hx, hy) in CAMPAIGN_DAY_HEXES:
-			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx, hy)].terrain_type]:
-				self.map_hexes[(hx, hy)].controlled_by = 2
-		
-		
-		
 		# dictionary of screen display locations on the display console
 		self.cd_map_index = {}
 		
 		# list of screen display locations that contain a bridge
 		self.cd_map_bridge_locations = []
 		
-		# set up initial player location
-		if self.mission in ['Fighting Withdrawal', 'Urban Defense']:
-			hx, hy = 2, 0				# top center of map
-		elif self.mission in ['Battle', 'Major Battle', 'Amphibious Assault']:
-			hx, hy = -1, 6				# lower center of map
-		elif self.mission == 'Counterattack':
-			hx, hy = 2, 1				# second row of map
-		elif self.mission == 'Hold the Line':
-			hx, hy = 0, 4
-		else:
-			hx, hy = -2, 8				# bottom center of map
-		
-		# Amphibious Assault starts the player in a water hex, it's ok!
-		if self.mission == 'Amphibious Assault':
-			self.player_unit_location = (hx, hy)
-			self.coastal_map = True
-		else:
-			# place player as close as possible to target location
-			for hx_mod in [0, -1, 1, -2, 2, -3, 3, 4, -4]:
-				# target is off map
-				if (hx+hx_mod, hy) not in self.map_hexes: continue
-				if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx+hx_mod, hy)].terrain_type]:
-					continue
-				self.player_unit_location = (hx+hx_mod, hy)
-				break
-			else:
-				print('ERROR: Could not place player in a clear map hex')
-				self.player_unit_location = (hx, hy)
-		
-		self.GenerateObjectives()
-		self.GenerateMinefields()
+		# generate campaign day map, set initial player location, objectives, and minefields
+		self.GenerateCDMap()
 		
 		self.active_menu = 3				# number of currently active command menu
 		self.selected_position = 0			# selected crew position in crew command menu tab
@@ -6067,7 +6238,7 @@ class CampaignDay:
 		
 		# set enemy strength and units present in each zone
 		for (hx, hy) in CAMPAIGN_DAY_HEXES:
-			self.map_hexes[(hx,hy)].GenerateStrengthAndUnits(self.mission)
+			RunInRNGStream('Spawn', self.map_hexes[(hx,hy)].GenerateStrengthAndUnits, self.mission)
 		
 		# set up initial player comms status
 		self.bg_radio_comms = False
@@ -6086,11 +6257,113 @@ class CampaignDay:
 		}
 	
 	
+	# return the key describing the type of map that will be generated for today; any two days with
+	# the same key draw from the same sequence of pre-generated maps
+	def GetCDMapKey(self):
+		terrain_mod = tuple(sorted(campaign.current_week.get('terrain_odds_modifier', {}).items()))
+		return (campaign.stats['region'], self.mission, self.rattenkrieg, self.weather['Season'],
+			self.coastal_map, terrain_mod)
+	
+	
+	# generate the zones of a new campaign day map and their terrain, roads, and rivers; this
+	# depends only on the map key so can be done ahead of time, returns the new map hexes
+	def GenerateCDMapZones(self):
+		self.map_hexes = {}
+		for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			self.map_hexes[(hx,hy)] = CDMapHex(hx, hy, self.mission)
+		self.GenerateCDMapTerrain()
+		self.GenerateRoads()
+		self.GenerateRivers()
+		return self.map_hexes
+	
+	
+	# generate a new campaign day map: zones and their terrain, initial zone control, player
+	# location, objectives, and minefields
+	# if use_pool is true, zones are taken from the pool of pre-generated maps if possible
+	def GenerateCDMap(self, use_pool=True):
+		
+		# generate campaign day map and terrain, placeholder for objectives
+		if use_pool:
+			self.map_hexes = session.TakeCDMap(self)
+			self.cd_map_bridge_locations = []
+		else:
+			self.GenerateCDMapZones()
+		
+		if self.mission in ['Fighting Withdrawal', 'Urban Defense']:
+			for (hx, hy) in CAMPAIGN_DAY_HEXES:	
+				self.map_hexes[(hx, hy)].controlled_by = 0
+		
+		elif self.mission == 'Hold the Line':
+			for (hx, hy) in CAMPAIGN_DAY_HEXES:
+				if hy < 3:
+					self.map_hexes[(hx, hy)].controlled_by = 1
+				else:
+					self.map_hexes[(hx, hy)].controlled_by = 0		
+		
+		elif self.mission == 'Counterattack':
+			for (hx, hy) in CAMPAIGN_DAY_HEXES:
+				self.map_hexes[(hx, hy)].controlled_by = 0
+			hy = 0
+			hx1 = 0 - floor(hy / 2)
+			for hx in range(hx1, hx1 + 5):
+				if (hx, hy) not in self.map_hexes: continue
+				self.map_hexes[(hx, hy)].controlled_by = 1
+		
+		elif self.mission in ['Battle', 'Major Battle']:
+			for (hx, hy) in CAMPAIGN_DAY_HEXES:
+				self.map_hexes[(hx, hy)].controlled_by = 1
+			for hy in range(6, 9):
+				hx1 = 0 - floor(hy / 2)
+				for hx in range(hx1, hx1 + 5):
+					if (hx, hy) not in self.map_hexes: continue
+					self.map_hexes[(hx, hy)].controlled_by = 0
+		
+		# impassable hexes are held by nobody
+		for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx, hy)].terrain_type]:
+				self.map_hexes[(hx, hy)].controlled_by = 2
+		
+		# set up initial player location
+		if self.mission in ['Fighting Withdrawal', 'Urban Defense']:
+			hx, hy = 2, 0				# top center of map
+		elif self.mission in ['Battle', 'Major Battle', 'Amphibious Assault']:
+			hx, hy = -1, 6				# lower center of map
+		elif self.mission == 'Counterattack':
+			hx, hy = 2, 1				# second row of map
+		elif self.mission == 'Hold the Line':
+			hx, hy = 0, 4
+		else:
+			hx, hy = -2, 8				# bottom center of map
+		
+		# Amphibious Assault starts the player in a water hex, it's ok!
+		if self.mission == 'Amphibious Assault':
+			self.player_unit_location = (hx, hy)
+			self.coastal_map = True
+		else:
+			# place player as close as possible to target location
+			for hx_mod in [0, -1, 1, -2, 2, -3, 3, 4, -4]:
+				# target is off map
+				if (hx+hx_mod, hy) not in self.map_hexes: continue
+				if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx+hx_mod, hy)].terrain_type]:
+					continue
+				self.player_unit_location = (hx+hx_mod, hy)
+				break
+			else:
+				print('ERROR: Could not place player in a clear map hex')
+				self.player_unit_location = (hx, hy)
+		
+		self.GenerateObjectives()
+		self.GenerateMinefields()
+	
+	
 	# do various upkeep and resolution things after a scenario has finished
 	# returns true if the DoCampaignDay loop should be broken
 	def DoPostScenario(self):
 		global scenario
 		
+		if session.analytics is not None:
+			session.analytics.EndEngagement()
+		
 		# check for player crew recovery
 		self.DoCrewRecoveryCheck(campaign.player_unit)
 		
@@ -6231,9 +6504,9 @@ class CampaignDay:
 			scenario = None
 			
 			if len(unit_list) > 0:
-				map_hex.GenerateStrengthAndUnits(self.mission, unit_list=unit_list)
+				RunInRNGStream('Spawn', map_hex.GenerateStrengthAndUnits, self.mission, unit_list=unit_list)
 			else:
-				map_hex.GenerateStrengthAndUnits(self.mission)
+				RunInRNGStream('Spawn', map_hex.GenerateStrengthAndUnits, self.mission)
 			
 			# check for end of day after withdrawing from a battle
 			self.CheckForEndOfDay()
@@ -6629,7 +6902,7 @@ class CampaignDay:
 		while not exit_menu:
 			
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Unit Support'): continue
 			
 			# cancel travel
 			if (key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1) and self.selected_direction is not None:
@@ -6940,7 +7213,7 @@ class CampaignDay:
 			session.cd_x_offset, session.cd_y_offset = line.pop(0)
 			self.UpdateCDUnitCon()
 			self.UpdateCDDisplay()
-			Wait(20)
+			Wait(20, category='Movement')
 
 		# check for breakdown - increases travel time, or results in immobilization
 		# we use the reposition chance because non-combat movement is likely to be more cautious
@@ -7038,7 +7311,7 @@ class CampaignDay:
 			session.cd_x_offset, session.cd_y_offset = line.pop(0)
 			self.UpdateCDUnitCon()
 			self.UpdateCDDisplay()
-			Wait(20)
+			Wait(20, category='Movement')
 
 		if advancing_fire_he:
 			PlaySound('37mm_he_explosion')
@@ -7366,12 +7639,13 @@ class CampaignDay:
 		if current_objectives >= total_objectives: return
 		
 		# build initial list of possible hexes
+		reachable = self.GetReachableZones([(phx, phy)])
 		hex_list = []
 		for (hx, hy) in CAMPAIGN_DAY_HEXES:
 			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx, hy)].terrain_type]:
 				continue
 			if GetHexDistance(hx, hy, phx, phy) < 2: continue
-			if len(self.GetHexPath(hx, hy, phx, phy)) == 0: continue
+			if (hx, hy) not in reachable: continue
 			hex_list.append((hx, hy))
 		
 		# no possible locations (should not happen)
@@ -7382,6 +7656,12 @@ class CampaignDay:
 		# set to true when we have already placed a Convoy Attack objective in this map area
 		convoy_objective_placed = False
 		
+		# zones that the player can reach without requiring a map shift
+		if self.mission in ['Fighting Withdrawal', 'Counterattack']:
+			reachable = self.GetReachableZones([(p_hx, p_hy)], avoid_rows=[8])
+		else:
+			reachable = self.GetReachableZones([(p_hx, p_hy)], avoid_rows=[0])
+		
 		# generate enough objectives to bring total up to desired number
 		for i in range(total_objectives - current_objectives):	
 			for tries in range(300):
@@ -7424,12 +7704,8 @@ class CampaignDay:
 					
 					# don't place if player moving to this zone would require a map shift
 					if hy not in [0, 8] and not (self.rattenkrieg or self.mission == 'Hold the Line'):
-						if self.mission in ['Fighting Withdrawal', 'Counterattack']:
-							if len(self.GetHexPath(p_hx, p_hy, hx, hy, avoid_rows=[8])) == 0:
-								continue
-						else:
-							if len(self.GetHexPath(p_hx, p_hy, hx, hy, avoid_rows=[0])) == 0:
-								continue
+						if (hx, hy) not in reachable:
+							continue
 					
 					# already an objective here
 					if self.map_hexes[(hx, hy)].objective is not None: continue
@@ -7633,22 +7909,42 @@ class CampaignDay:
 	
 	# check to see if clear path between hexes in top and bottom row
 	def CheckClearMapPath(self):
-		path_good = False
 		STARTING_HEXES = [(-4,8), (-3,8), (-2,8), (-1,8), (0,8)]
 		ENDING_HEXES = [(4,0), (3,0), (2,0), (1,0), (0,0)]
 		
-		for (hx1, hy1) in STARTING_HEXES:
-			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx1,hy1)].terrain_type]: continue
-			for (hx2, hy2) in ENDING_HEXES:
-				if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx2,hy2)].terrain_type]: continue
-				if len(self.GetHexPath(hx1, hy1, hx2, hy2)) == 0:
-					continue
-				path_good = True
-				break
-			if path_good:
-				break
+		hex_list = []
+		for (hx, hy) in STARTING_HEXES:
+			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx,hy)].terrain_type]: continue
+			hex_list.append((hx, hy))
 		
-		return path_good
+		reachable = self.GetReachableZones(hex_list)
+		for (hx, hy) in ENDING_HEXES:
+			if (hx, hy) in reachable:
+				return True
+		return False
+	
+	
+	# returns a set of all hex zones that can be reached from any of the given hex zones without
+	# passing through impassible zones or hexrows in avoid_rows; a quicker alternative to
+	# checking for a path to each zone in turn
+	def GetReachableZones(self, start_hexes, avoid_rows=[]):
+		(controllers, impassible) = self.GetZoneStates()
+		open_list = []
+		reachable = set()
+		for (hx, hy) in start_hexes:
+			open_list.append(CD_HEX_INDEX[(hx, hy)])
+			reachable.add((hx, hy))
+		while open_list:
+			i = open_list.pop()
+			for i2 in CD_HEX_NEIGHBOURS[i]:
+				if i2 == -1: continue
+				if impassible[i2]: continue
+				(hx, hy) = CAMPAIGN_DAY_HEXES[i2]
+				if (hx, hy) in reachable: continue
+				if hy in avoid_rows: continue
+				reachable.add((hx, hy))
+				open_list.append(i2)
+		return reachable
 	
 	
 	# returns a path from one campaign day hex zone to another
@@ -7687,7 +7983,7 @@ class CampaignDay:
 		while open_list:
 			
 			# grab the node with the best H value from the list of open nodes
-			current = sorted(open_list, key=lambda inst:inst.f)[0]
+			current = min(open_list, key=lambda inst:inst.f)
 			
 			# we've reached our destination
 			if current == end:
@@ -7704,7 +8000,7 @@ class CampaignDay:
 				hx, hy = self.GetAdjacentCDHex(current.hx, current.hy, direction)
 				
 				# no map hex exists here, skip
-				if (hx, hy) not in CAMPAIGN_DAY_HEXES: continue
+				if (hx, hy) not in CD_HEX_INDEX: continue
 				
 				node = self.map_hexes[(hx,hy)]
 				
@@ -7774,6 +8070,14 @@ class CampaignDay:
 		for terrain_type, odds in terrain_dict.items():
 			total_chance += odds
 		
+		# build a table of terrain types and their weights: a terrain type with odds x is chosen with
+		# the same relative chance as a roll of 0 to total_chance coming up at or under x
+		terrain_table = []
+		for terrain_type, odds in terrain_dict.items():
+			terrain_table.append((terrain_type, max(int(floor(odds)) + 1, 0),
+				'impassible' in CD_TERRAIN_TYPES[terrain_type],
+				CD_TERRAIN_TYPES[terrain_type].get('max_per_map')))
+		
 		for tries in range(300):
 			
 			# check for coastal daymap
@@ -7786,58 +8090,63 @@ class CampaignDay:
 				for i in range(9):
 					self.map_hexes[(hx,hy)].terrain_type = 'Water'
 					if self.coastal_map == 'right':
-						if self.GetAdjacentCDHex(hx, hy, 2) in CAMPAIGN_DAY_HEXES:
+						if self.GetAdjacentCDHex(hx, hy, 2) in CD_HEX_INDEX:
 							(hx, hy) = self.GetAdjacentCDHex(hx, hy, 2)
 						else:
 							(hx, hy) = self.GetAdjacentCDHex(hx, hy, 3)
 					else:
-						if self.GetAdjacentCDHex(hx, hy, 3) in CAMPAIGN_DAY_HEXES:
+						if self.GetAdjacentCDHex(hx, hy, 3) in CD_HEX_INDEX:
 							(hx, hy) = self.GetAdjacentCDHex(hx, hy, 3)
 						else:
 							(hx, hy) = self.GetAdjacentCDHex(hx, hy, 2)
-		
-			for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			
+			for i, (hx, hy) in enumerate(CAMPAIGN_DAY_HEXES):
 				
 				if avoid_y:
 					if hy == avoid_y:
 						continue
 				
 				map_hex = self.map_hexes[(hx,hy)]
-				
-				while map_hex.terrain_type == '':
-					
-					terrain_type = choice(list(terrain_dict.keys()))
-					odds = terrain_dict[terrain_type]
-					
-					# check for terrain types that have already been spawned
-					if 'max_per_map' in CD_TERRAIN_TYPES[terrain_type]:
-						if terrain_type in cd_hex_numbers:
-							if cd_hex_numbers[terrain_type] == CD_TERRAIN_TYPES[terrain_type]['max_per_map']:
-								continue
-					
-					# don't allow two impassible terrain types next to each other
+				if map_hex.terrain_type != '': continue
+				
+				# don't allow two impassible terrain types next to each other
+				blocked_by_adjacent = False
+				for i2 in CD_HEX_NEIGHBOURS[i]:
+					if i2 == -1: continue
+					terrain_type = self.map_hexes[CAMPAIGN_DAY_HEXES[i2]].terrain_type
+					if terrain_type == '': continue
 					if 'impassible' in CD_TERRAIN_TYPES[terrain_type]:
-						blocked_by_adjacent = False
-						for direction in range(6):
-							(hx2, hy2) = self.GetAdjacentCDHex(hx, hy, direction)
-							# off map
-							if (hx2, hy2) not in self.map_hexes: continue
-							if self.map_hexes[(hx2,hy2)].terrain_type == '': continue
-							if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx2,hy2)].terrain_type]:
-								blocked_by_adjacent = True
-								break
-						if blocked_by_adjacent:
-							continue
-					
-					if libtcod.random_get_int(0, 0, total_chance) <= odds:
-						map_hex.terrain_type = terrain_type
-						
-						# record addition of this terrain type
-						if terrain_type in cd_hex_numbers:
-							cd_hex_numbers[terrain_type] += 1
-						else:
-							cd_hex_numbers[terrain_type] = 1
+						blocked_by_adjacent = True
 						break
+				
+				# build a list of terrain types that can be placed here, skipping any that have
+				# already been spawned the maximum number of times
+				candidate_list = []
+				total_weight = 0
+				for (terrain_type, weight, impassible, max_per_map) in terrain_table:
+					if weight == 0: continue
+					if impassible and blocked_by_adjacent: continue
+					if max_per_map is not None:
+						if cd_hex_numbers.get(terrain_type, 0) == max_per_map:
+							continue
+					candidate_list.append((terrain_type, weight))
+					total_weight += weight
+				
+				# no possible terrain types (should not happen)
+				if len(candidate_list) == 0: continue
+				
+				# pick one terrain type by weight
+				roll = libtcod.random_get_int(0, 1, total_weight)
+				for (terrain_type, weight) in candidate_list:
+					if roll <= weight: break
+					roll -= weight
+				map_hex.terrain_type = terrain_type
+				
+				# record addition of this terrain type
+				if terrain_type in cd_hex_numbers:
+					cd_hex_numbers[terrain_type] += 1
+				else:
+					cd_hex_numbers[terrain_type] = 1
 			
 			# map terrain is finished, make sure that it can be traversed
 			if self.CheckClearMapPath():
@@ -8027,7 +8336,7 @@ class CampaignDay:
 		# set new enemy strength and units for all new zones
 		for (hx, hy) in CAMPAIGN_DAY_HEXES:
 			if hy == new_hy: continue
-			self.map_hexes[(hx,hy)].GenerateStrengthAndUnits(self.mission)
+			RunInRNGStream('Spawn', self.map_hexes[(hx,hy)].GenerateStrengthAndUnits, self.mission)
 		
 		# generate new objectives and landmines
 		self.GenerateObjectives()
@@ -8188,19 +8497,7 @@ class CampaignDay:
 		# determine current calendar season
 		weather_odds_dict = session.regions[campaign.stats['region']]['season_weather_odds']
 		date = campaign.today[campaign.today.find('.') + 1:]
-		
-		for season, value in weather_odds_dict.items():
-			if date <= value['end_date']:
-				break
-		else:
-			# catch cases where date is late in the calendar year
-			if campaign.stats['region'] == 'Southeast Asia':
-				season = 'Northeast Monsoon'
-			elif campaign.stats['region'] == 'South Pacific':
-				season = 'Wet Season'
-			else:
-				season = 'Winter'
-		
+		season = campaign.GetSeason(campaign.today)
 		self.weather['Season'] = season
 		
 		### modify actual odds based on time to previous/next season ###
@@ -8421,7 +8718,7 @@ class CampaignDay:
 		
 		# 1.2.0 compatibility check
 		if self.weather['Season'] not in session.regions[campaign.stats['region']]['season_weather_odds']:
-			self.GenerateWeather()
+			RunInRNGStream('Weather', self.GenerateWeather)
 		
 		# get weather odds for region
 		weather_odds_dict = session.regions[campaign.stats['region']]['season_weather_odds'][self.weather['Season']]
@@ -8670,9 +8967,9 @@ class CampaignDay:
 					return
 			
 			# update animations
-			self.InitAnimations()
+			RunInRNGStream('Cosmetic', self.InitAnimations)
 			if scenario is not None:
-				scenario.InitAnimations()
+				RunInRNGStream('Cosmetic', scenario.InitAnimations)
 		
 		# fog possibly arrives
 		elif roll <= 75.0:
@@ -8739,9 +9036,9 @@ class CampaignDay:
 				self.weather['Precipitation'] = 'None'
 				
 				# stop animation
-				self.InitAnimations()
+				RunInRNGStream('Cosmetic', self.InitAnimations)
 				if scenario is not None:
-					scenario.InitAnimations()
+					RunInRNGStream('Cosmetic', scenario.InitAnimations)
 		
 		# check for change in storm status
 		if self.weather['Storm']:
@@ -8781,6 +9078,8 @@ class CampaignDay:
 
 	# advance the current campaign day time, check for end of day, and also weather conditions update
 	def AdvanceClock(self, hours, minutes, skip_checks=False):
+		if session.replay is not None:
+			session.replay.Checkpoint('Clock')
 		self.day_clock['hour'] += hours
 		self.day_clock['minute'] += minutes
 		while self.day_clock['minute'] >= 60:
@@ -8801,7 +9100,7 @@ class CampaignDay:
 		
 		if self.weather_update_clock <= 0:
 			# check for weather conditions change, update relevant consoles
-			self.UpdateWeather()
+			RunInRNGStream('Weather', self.UpdateWeather)
 			self.UpdateCDCommandCon()
 			DisplayWeatherInfo(cd_weather_con)
 			if scenario is not None:
@@ -8938,7 +9237,7 @@ class CampaignDay:
 			if map_hex.enemy_strength > 10:
 				map_hex.enemy_strength = 10
 			
-			map_hex.GenerateStrengthAndUnits(self.mission, skip_strength=True)
+			RunInRNGStream('Spawn', map_hex.GenerateStrengthAndUnits, self.mission, skip_strength=True)
 			
 			# don't show anything if zone not known to player
 			if not map_hex.known_to_player: return
@@ -9005,7 +9304,7 @@ class CampaignDay:
 			ShowMessage('Campaign Day Random Event!', no_log=True)
 			ShowMessage('Enemy movement reported in a map zone, estimated strength no longer certain.',
 				cd_highlight=(hx,hy), longer_pause=True)
-			map_hex.GenerateStrengthAndUnits(self.mission)
+			RunInRNGStream('Spawn', map_hex.GenerateStrengthAndUnits, self.mission)
 		
 		# decrease or increase a current support level
 		elif roll <= 75.0:
@@ -9138,6 +9437,18 @@ class CampaignDay:
 		self.UpdateCDDisplay()
 	
 	
+	# return compact lists of zone control and impassible terrain flags for the campaign day map,
+	# in the same order as CAMPAIGN_DAY_HEXES
+	def GetZoneStates(self):
+		controllers = []
+		impassible = []
+		for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			map_hex = self.map_hexes[(hx,hy)]
+			controllers.append(map_hex.controlled_by)
+			impassible.append('impassible' in CD_TERRAIN_TYPES[map_hex.terrain_type])
+		return (controllers, impassible)
+	
+	
 	# check for zone capture/loss
 	# if last player action was 'capture_zone', then the player's own zone won't be selected as one that
 	# the enemy captures
@@ -9151,50 +9462,38 @@ class CampaignDay:
 		# get player location
 		(player_hx, player_hy) = self.player_unit_location
 		
-		# set modifiers for base odds of enemy/friendly zone capture
-		if campaign_day.mission == 'Advance':
-			friendly_multiplier = 3.0
-			enemy_multipler = 0.3
-		elif campaign_day.mission == 'Spearhead':
-			friendly_multiplier = 0.5
-			enemy_multipler = 0.2
-		elif campaign_day.mission == 'Battle':
-			friendly_multiplier = 1.0
-			enemy_multipler = 1.0
-		elif campaign_day.mission == 'Major Battle':
-			friendly_multiplier = 2.0
-			enemy_multipler = 2.0
-		elif campaign_day.mission == 'Fighting Withdrawal':
-			friendly_multiplier = 0.0
-			enemy_multipler = 2.0
-		elif campaign_day.mission == 'Counterattack':
-			friendly_multiplier = 0.3
-			enemy_multipler = 3.0
-		elif campaign_day.mission == 'Hold the Line':
-			friendly_multiplier = 0.2
-			enemy_multipler = 1.2
-		elif campaign_day.mission == 'Patrol':
-			friendly_multiplier = 0.1
-			enemy_multipler = 0.1
-		elif campaign_day.mission == 'Urban Assault':
-			friendly_multiplier = 0.5
-			enemy_multipler = 0.25
-		elif campaign_day.mission == 'Urban Defense':
-			friendly_multiplier = 0.25
-			enemy_multipler = 3.0
-		elif campaign_day.mission == 'Amphibious Assault':
-			friendly_multiplier = 0.7
-			enemy_multipler = 0.4
-		# no other missions for now
+		# get modifiers for base odds of enemy/friendly zone capture; no other missions for now
+		if campaign_day.mission not in CD_ZONE_CAPTURE_MULTIPLIERS: return
+		(friendly_multiplier, enemy_multipler) = CD_ZONE_CAPTURE_MULTIPLIERS[campaign_day.mission]
+		
+		# build a table of capture odds for each possible number of adjacent enemy-held zones,
+		# for friendly-held (0) and enemy-held (1) zones, modified by last player action that
+		# triggered this check
+		action_modifier = CD_ZONE_CAPTURE_ACTION_MODIFIERS.get(last_player_action)
+		odds_table = ([], [])
+		for adjacent_enemy_hexes in range(9):
+			for (controlled_by, multiplier) in [(0, enemy_multipler), (1, friendly_multiplier)]:
+				odds = round(adjacent_enemy_hexes * CD_ZONE_CAPTURE_CHANCE * multiplier, 1)
+				if action_modifier is not None:
+					odds = round(odds * action_modifier, 1)
+				odds_table[controlled_by].append(odds)
+		
+		# zones on top/bottom row automatically count as bordering two enemy hexes
+		# if held by other side
+		if campaign_day.mission in ['Fighting Withdrawal', 'Counterattack', 'Urban Defense', 'Hold the Line']:
+			(edge_hy, edge_controlled_by) = (0, 0)
+		elif campaign_day.mission in ['Advance', 'Spearhead', 'Battle', 'Major Battle', 'Patrol', 'Urban Assault']:
+			(edge_hy, edge_controlled_by) = (8, 1)
 		else:
-			return
+			(edge_hy, edge_controlled_by) = (None, None)
 		
-		# build a list of hex zones that are liable to be captured, plus odds of their capture
+		# build a list of hex zones that are liable to be captured, plus odds of their capture,
+		# in one pass over the compact zone state lists
+		(controllers, impassible) = self.GetZoneStates()
 		hex_list = []
-		for (hx, hy) in self.map_hexes:
+		for i, (hx, hy) in enumerate(CAMPAIGN_DAY_HEXES):
 			
-			if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx,hy)].terrain_type]:
-				continue
+			if impassible[i]: continue
 			
 			# skip if player present and just captured this zone
 			if last_player_action == 'capture_zone':
@@ -9207,59 +9506,57 @@ class CampaignDay:
 					if session.debug['Never Scenario']:
 						continue
 			
+			map_hex = self.map_hexes[(hx,hy)]
+			
 			# skip objective hexes other than Hold/Rescue objectives
-			if self.map_hexes[(hx,hy)].objective is not None:
-				if self.map_hexes[(hx,hy)].objective['type'] not in ['Hold', 'Rescue']:
+			if map_hex.objective is not None:
+				if map_hex.objective['type'] not in ['Hold', 'Rescue']:
 					continue
 			
-			map_hex = self.map_hexes[(hx,hy)]
+			controlled_by = controllers[i]
 			
 			# Hold the Line - friendly units won't capture hexrows above 1
-			if campaign_day.mission == 'Hold the Line' and map_hex.controlled_by == 1:
+			if campaign_day.mission == 'Hold the Line' and controlled_by == 1:
 				if hy < 1: continue
 			
 			# determine number of adjacent hexes held by other side
 			adjacent_enemy_hexes = 0
-			edge_adjacent = False
-			for direction in range(6):
-				(hx2, hy2) = self.GetAdjacentCDHex(hx, hy, direction)
-				if (hx2, hy2) not in self.map_hexes:
-					edge_adjacent = True
-					continue
-				
-				# impassable hex
-				if 'impassible' in CD_TERRAIN_TYPES[self.map_hexes[(hx2,hy2)].terrain_type]:
-					continue
-				
-				if self.map_hexes[(hx2,hy2)].controlled_by != map_hex.controlled_by:
-					
-					# if river crossing, chance that this one doesn't count
-					if self.RiverCrossing(hx, hy, hx2, hy2):
-						if GetPercentileRoll() <= 75.0:
-							continue
-					adjacent_enemy_hexes += 1
+			for i2 in CD_HEX_NEIGHBOURS[i]:
+				if i2 == -1: continue
+				if impassible[i2]: continue
+				if controllers[i2] == controlled_by: continue
+				
+				# if river crossing, chance that this one doesn't count
+				(hx2, hy2) = CAMPAIGN_DAY_HEXES[i2]
+				if self.RiverCrossing(hx, hy, hx2, hy2):
+					if GetPercentileRoll() <= 75.0:
+						continue
+				adjacent_enemy_hexes += 1
 			
-			# zones on top/bottom row automatically count as bordering two enemy hexes
-			# if held by other side
-			if campaign_day.mission in ['Fighting Withdrawal', 'Counterattack', 'Urban Defense', 'Hold the Line']:
-				if hy == 0 and map_hex.controlled_by == 0:
-					adjacent_enemy_hexes += 2
-			elif campaign_day.mission in ['Advance', 'Spearhead', 'Battle', 'Major Battle', 'Patrol', 'Urban Assault']:
-				if hy == 8 and map_hex.controlled_by == 1:
-					adjacent_enemy_hexes += 2
+			if hy == edge_hy and controlled_by == edge_controlled_by:
+				adjacent_enemy_hexes += 2
 			
 			if adjacent_enemy_hexes == 0: continue
 			
 			# enemy-held zone has been cut off
-			if adjacent_enemy_hexes == 6 and map_hex.controlled_by == 1:
+			if adjacent_enemy_hexes == 6 and controlled_by == 1:
 				if not campaign_day.rattenkrieg:
 					map_hex.enemy_strength = int(map_hex.enemy_strength / 2)
 					if map_hex.enemy_strength < 1:
 						map_hex.enemy_strength = 1
 			
-			# add the hex to list of possible capture targets
-			hex_list.append((hx, hy, adjacent_enemy_hexes))
+			odds = odds_table[controlled_by][adjacent_enemy_hexes]
+			
+			# during Fighting Withdrawl, any zones above the player's current location will automatically be captured
+			if campaign_day.mission == 'Fighting Withdrawal' and hy < player_hy:
+				if controlled_by == 0:
+					odds = 100.0
+				else:
+					odds = -100.0
 			
+			# add the hex to list of possible capture targets
+			hex_list.append((hx, hy, odds))
+		
 		if len(hex_list) == 0:
 			return
 		
@@ -9268,31 +9565,7 @@ class CampaignDay:
 		capture_list = []
 		friendly_captures = 0
 		enemy_captures = 0
-		for (hx, hy, adjacent_enemy_hexes) in hex_list:
-			
-			odds = adjacent_enemy_hexes * CD_ZONE_CAPTURE_CHANCE
-			
-			if self.map_hexes[(hx,hy)].controlled_by == 0:
-				odds = round(odds * enemy_multipler, 1)
-			else:
-				odds = round(odds * friendly_multiplier, 1)
-			
-			# modify final odds by last player action that triggered this check
-			if last_player_action == 'recon':
-				odds = round(odds * 0.03, 1)
-			elif last_player_action == 'wait':
-				odds = round(odds * 1.3, 1)
-			elif last_player_action == 'quick_move':
-				odds = round(odds * 0.5, 1)
-			elif last_player_action == 'slow_move':
-				odds = round(odds * 0.85, 1)
-			
-			# during Fighting Withdrawl, any zones above the player's current location will automatically be captured
-			if campaign_day.mission == 'Fighting Withdrawal' and hy < player_hy:
-				if self.map_hexes[(hx,hy)].controlled_by == 0:
-					odds = 100.0
-				elif self.map_hexes[(hx,hy)].controlled_by == 1:
-					odds = -100.0
+		for (hx, hy, odds) in hex_list:
 			
 			if GetPercentileRoll() > odds: continue
 			
@@ -9308,7 +9581,7 @@ class CampaignDay:
 			if self.map_hexes[(hx,hy)].controlled_by == 0:
 				self.map_hexes[(hx,hy)].CaptureMe(1)
 				enemy_captures += 1
-				
+			
 			# enemy hex zone captured
 			else:
 				self.map_hexes[(hx,hy)].CaptureMe(0, no_vp=True)
@@ -9796,7 +10069,7 @@ class CampaignDay:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Ammo Reload', details={'weapon' : weapon, 'gun_list' : gun_list}): continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# proceed
@@ -10586,7 +10859,7 @@ class CampaignDay:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Campaign Day Summary'): continue
 			
 			# end menu
 			if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
@@ -10626,26 +10899,27 @@ class CampaignDay:
 		self.cd_map_index = {}
 		
 		# draw map hexes to console
-		# load base zone image - depends on day mission, region, and current ground conditions
+		# determine base zone image - depends on day mission, region, and current ground conditions
 		if self.rattenkrieg:
-			dayhex = LoadXP('dayhex_urban.xp')
+			dayhex_filename = 'dayhex_urban.xp'
 			bg_col = libtcod.Color(77,77,77)
 		elif campaign.stats['region'] in ['South Pacific', 'Southeast Asia']:
-			dayhex = LoadXP('dayhex_openground_sp.xp')
+			dayhex_filename = 'dayhex_openground_sp.xp'
 			bg_col = libtcod.Color(0,102,0)
 		elif self.weather['Ground'] in ['Snow', 'Deep Snow']:
-			dayhex = LoadXP('dayhex_openground_snow.xp')
+			dayhex_filename = 'dayhex_openground_snow.xp'
 			bg_col = libtcod.Color(191,191,191)
 		elif campaign.stats['region'] == 'North Africa':
-			dayhex = LoadXP('dayhex_openground_desert.xp')
+			dayhex_filename = 'dayhex_openground_desert.xp'
 			bg_col = libtcod.Color(128,102,64)
 		# winter season, no snow cover
 		elif self.weather['Season'] == 'Winter':
-			dayhex = LoadXP('dayhex_openground_winter.xp')
+			dayhex_filename = 'dayhex_openground_winter.xp'
 			bg_col = libtcod.Color(51,41,26)
 		else:
-			dayhex = LoadXP('dayhex_openground.xp')
+			dayhex_filename = 'dayhex_openground.xp'
 			bg_col = libtcod.Color(0,64,0)
+		dayhex = None
 		temp_con = libtcod.console_new(7, 9)
 		libtcod.console_set_key_color(temp_con, KEY_COLOR)
 		
@@ -10669,11 +10943,35 @@ class CampaignDay:
 			libtcod.console_blit(temp_con, 0, 0, 0, 0, cd_map_con, x-3, y-4)
 			RecordScreenLocations(hx, hy)
 		
+		# zone images drawn this time, will replace the cache from the last redraw
+		zone_tiles = {}
+		
 		for (hx, hy), cd_hex in self.map_hexes.items():
 			
 			if cd_hex.terrain_type == 'Water': continue
 			
+			(x,y) = self.PlotCDHex(hx, hy)
+			
+			# if the image for this zone was already generated in the last redraw, eg. zone
+			# remained on the map after a map shift, reuse it
+			tile_key = (cd_hex.console_seed, cd_hex.terrain_type, cd_hex.landmines, dayhex_filename,
+				campaign.stats['region'], self.weather['Ground'], self.weather['Season'],
+				bg_col.r, bg_col.g, bg_col.b)
+			if tile_key in session.cd_zone_tiles:
+				zone_tiles[tile_key] = session.cd_zone_tiles[tile_key]
+				libtcod.console_blit(zone_tiles[tile_key], 0, 0, 0, 0, cd_map_con, x-3, y-4)
+				RecordScreenLocations(hx, hy)
+				
+				# beach zones change the background colour for any zones that follow
+				if cd_hex.terrain_type == 'Beach':
+					bg_col = libtcod.Color(130,130,0)
+				continue
+			
 			# generate console image for this zone's terrain type
+			if dayhex is None:
+				dayhex = LoadXP(dayhex_filename)
+			temp_con = libtcod.console_new(7, 9)
+			libtcod.console_set_key_color(temp_con, KEY_COLOR)
 			libtcod.console_blit(dayhex, 0, 0, 0, 0, temp_con, 0, 0)
 			
 			generator = libtcod.random_new_from_seed(cd_hex.console_seed)
@@ -11254,13 +11552,15 @@ class CampaignDay:
 						libtcod.red, bg_col)
 					elements -= 1
 			
-			# draw the final image to the map console
+			# draw the final image to the map console and store it for next redraw
 			(x,y) = self.PlotCDHex(hx, hy)
 			libtcod.console_blit(temp_con, 0, 0, 0, 0, cd_map_con, x-3, y-4)
+			zone_tiles[tile_key] = temp_con
 			
 			# record screen locations of hex
 			RecordScreenLocations(hx, hy)
-			
+		
+		session.cd_zone_tiles = zone_tiles
 		del temp_con, dayhex
 		
 		# set a default road color in case we need to draw an edge road first
@@ -12557,7 +12857,7 @@ class CampaignDay:
 			self.UpdateCDDisplay()
 		
 		# init looping animations
-		self.InitAnimations()
+		RunInRNGStream('Cosmetic', self.InitAnimations)
 		
 		# calculate initial time to travel to front lines
 		if not self.travel_time_spent:
@@ -12640,6 +12940,10 @@ class CampaignDay:
 				
 				scenario.DoScenarioLoop()
 				
+				# save a summary of AI decision timings for this scenario if AI profiling is on
+				if DEBUG and session.debug.get('AI Profiling', False) and len(scenario.ai_profile) > 0:
+					scenario.ExportAIProfile()
+				
 				if session.exiting:
 					exit_loop = True
 					continue
@@ -12686,7 +12990,7 @@ class CampaignDay:
 				if mixer.Mix_PlayingMusic() == 0:
 					session.MusicHandler('cd_music', True)
 			
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Campaign Day'): continue
 			
 			# game menus
 			if key.vk in [sdl2.SDLK_ESCAPE, sdl2.SDLK_F1, sdl2.SDLK_F2, sdl2.SDLK_F3, sdl2.SDLK_F4] or session.gamepad_input == 6:
@@ -13194,6 +13498,82 @@ class CampaignDay:
 
 
 
+# Attack Profile: holds the details and results of a single attack, or of an AP or HE roll following
+# one; fields may also be read and set like dictionary keys, and a field that has not been set yet
+# is treated as a missing key
+class AttackProfile:
+	__slots__ = (
+		'attacker',		# attacking unit
+		'weapon',		# weapon used in the attack
+		'ammo_type',		# ammo type used, or None
+		'target',		# target unit
+		'crewman',		# crewman operating the weapon, player unit only
+		'type',			# attack type: 'Point Fire', 'Area Fire', 'Close Combat', 'Flame Thrower', 'ap', or 'he'
+		'distance',		# distance in hexes to target
+		'ballistic_attack',	# attack is a ballistic attack
+		'rocket',		# attack is a rocket attack
+		'overrun',		# attack is an overrun attack
+		'defensive_fire',	# attack is defensive fire against an overrunning unit
+		'immobilize',		# attack is an immobilization attempt
+		'critical_hit',		# chance of a critical hit (float)
+		'base_chance',		# base chance of success before modifiers (float)
+		'base_fp',		# base firepower of an area fire attack (int)
+		'effective_fp',		# firepower of a successful attack (int)
+		'modifier_list',	# list of (description, modifier) tuples
+		'final_chance',		# final chance of success (float)
+		'final_score',		# final 2D6 score of an AP or HE roll (int)
+		'hd_mod',		# modifier applied for target being hull down (float)
+		'full_effect',		# chance of full effect (float)
+		'critical_effect',	# chance of critical effect (float)
+		'fate_point_allowed',	# player may spend a fate point to cancel this attack
+		'roll',			# final percentile roll (float)
+		'location',		# location hit on target: 'Hull' or 'Turret'
+		'location_desc',	# text description of location hit
+		'modifier',		# text description of any final effect modifier
+		'result'		# text description of result
+	)
+	
+	def __init__(self, attacker, weapon, target, ammo_type=None):
+		self.attacker = attacker
+		self.weapon = weapon
+		self.ammo_type = ammo_type
+		self.target = target
+		self.crewman = None
+		self.ballistic_attack = False
+		self.rocket = False
+		self.overrun = False
+		self.defensive_fire = False
+		self.immobilize = False
+		self.effective_fp = 0
+		self.modifier = ''
+		self.result = ''
+	
+	# dictionary-style access
+	def __getitem__(self, key):
+		try:
+			return getattr(self, key)
+		except AttributeError:
+			raise KeyError(key)
+	
+	def __setitem__(self, key, value):
+		setattr(self, key, value)
+	
+	def __contains__(self, key):
+		return hasattr(self, key)
+	
+	def get(self, key, default=None):
+		return getattr(self, key, default)
+	
+	# return a new profile with the same fields set
+	def copy(self):
+		new_profile = AttackProfile.__new__(AttackProfile)
+		for key in self.__slots__:
+			if hasattr(self, key):
+				setattr(new_profile, key, getattr(self, key))
+		return new_profile
+
+
+
 # Scenario: represents a single battle encounter
 class Scenario:
 	def __init__(self, cd_map_hex, advancing_fire_success = False):
@@ -13275,6 +13655,144 @@ class Scenario:
 		self.target_list = []					# list of possible player targets
 		self.selected_weapon = None				# player's currently selected weapon
 		self.selected_position = 0				# index of selected position in player unit
+		
+		self.hit_log = []					# outcome of each resolved hit and firepower attack
+		self.rof_cache_hits = 0					# number of base RoF chances found in weapon caches
+		self.rof_cache_misses = 0				# " that needed to be calculated
+		self.ai_situation = None				# AISituation snapshot shared by AI activations
+		self.ai_profile = {}					# AI decision stage timings: stage name ->
+									#   [calls, total seconds, max seconds, candidates, times truncated]
+		self.timings = {}					# phase, turn, and unit activation timings: name ->
+									#   [calls, total seconds, max seconds]
+		self.timed_phase = None					# (turn, phase) currently being timed
+		self.phase_start = 0.0					# time that the current phase began
+		self.turn_start = 0.0					# time that the current turn began
+	
+	
+	# return the current AI situation snapshot, building a new one if required
+	def GetAISituation(self):
+		if self.ai_situation is None:
+			self.ai_situation = AISituation(self.units)
+		return self.ai_situation
+	
+	
+	# record the time taken by one AI decision stage since start_time, plus the number of candidates
+	# it evaluated and whether it was cut short by the time budget
+	def RecordAIStage(self, stage, start_time, candidates=0, truncated=False):
+		elapsed = time.perf_counter() - start_time
+		if stage not in self.ai_profile:
+			self.ai_profile[stage] = [0, 0.0, 0.0, 0, 0]
+		entry = self.ai_profile[stage]
+		entry[0] += 1
+		entry[1] += elapsed
+		if elapsed > entry[2]:
+			entry[2] = elapsed
+		entry[3] += candidates
+		if truncated:
+			entry[4] += 1
+	
+	
+	# record the time taken by a phase, turn, or unit activation since start_time
+	def RecordTiming(self, name, start_time):
+		elapsed = time.perf_counter() - start_time
+		if name not in self.timings:
+			self.timings[name] = [0, 0.0, 0.0]
+		entry = self.timings[name]
+		entry[0] += 1
+		entry[1] += elapsed
+		if elapsed > entry[2]:
+			entry[2] = elapsed
+	
+	
+	# record the time taken by the previous phase, and turn if a new one has begun, once the scenario has
+	# moved on to a new phase or has finished
+	def UpdatePhaseTiming(self):
+		if not self.finished and self.timed_phase == (self.current_turn, self.phase): return
+		
+		if self.timed_phase is None:
+			self.turn_start = time.perf_counter()
+		else:
+			(turn, phase) = self.timed_phase
+			self.RecordTiming('Phase: ' + SCEN_PHASE_NAMES[phase], self.phase_start)
+			if self.finished or turn != self.current_turn:
+				self.RecordTiming('Turn', self.turn_start)
+				self.turn_start = time.perf_counter()
+		
+		if self.finished:
+			self.timed_phase = None
+			return
+		self.timed_phase = (self.current_turn, self.phase)
+		self.phase_start = time.perf_counter()
+	
+	
+	# write a summary of AI decision stage timings for this scenario to the log folder; returns the filename
+	def ExportAIProfile(self):
+		filename = session.log_path + os.sep + 'ai_profile_' + datetime.now().strftime("%Y-%m-%d_%H_%M_%S") + '.txt'
+		with open(filename, 'w', encoding='utf-8') as f:
+			f.write('ArmCom2 AI Decision Profile (' + VERSION + '), ' + campaign.today + ', zone ' +
+				str(self.cd_map_hex.hx) + ',' + str(self.cd_map_hex.hy) + ', ' + str(self.current_turn) + ' turns\n')
+			f.write('RoF chance cache: ' + str(self.rof_cache_hits) + ' hits, ' + str(self.rof_cache_misses) +
+				' misses\n')
+			if session.ai_time_budget is None:
+				f.write('Time budget: none\n')
+			else:
+				f.write('Time budget: ' + str(session.ai_time_budget) + ' seconds\n')
+			if not session.batch_resolution:
+				f.write('Attack Resolution not timed, since attacks were displayed\n')
+			f.write('\n')
+			f.write('Stage,Calls,Total Seconds,Mean ms,Max ms,Candidates,Truncated\n')
+			for stage, (calls, total, max_time, candidates, truncated) in self.ai_profile.items():
+				f.write(stage + ',' + str(calls) + ',' + str(round(total, 3)) + ',' +
+					str(round(total * 1000.0 / calls, 3)) + ',' + str(round(max_time * 1000.0, 3)) + ',' +
+					str(candidates) + ',' + str(truncated) + '\n')
+		return filename
+	
+	
+	# record the outcome of a resolved hit, or of firepower if profile is None, in the hit log
+	def LogHit(self, unit, profile, result, fp=0):
+		if profile is None:
+			source = str(fp) + ' FP'
+		else:
+			source = profile['attacker'].unit_id + ' - ' + profile['weapon'].stats['name']
+			if profile['ammo_type'] is not None:
+				source += ' (' + profile['ammo_type'] + ')'
+		self.hit_log.append((self.current_turn, self.phase, unit.unit_id, unit.owning_player, source, result))
+	
+	
+	# resolve pending firepower and/or hits on a list of units in one pass; outcomes on units that
+	# can be resolved quietly are summarized in a single message instead of being shown one by one
+	def ResolveHits(self, unit_list, resolve_fp=False, resolve_hits=True):
+		
+		summary = {}
+		for unit in unit_list:
+			if not unit.alive: continue
+			
+			quiet = unit.CanResolveHitsQuietly()
+			log_start = len(self.hit_log)
+			
+			if resolve_fp:
+				RunInRNGStream('Combat', unit.ResolveFP, quiet=quiet)
+			if resolve_hits:
+				unit.ResolveAPHits(quiet=quiet)
+				unit.ResolveHEHits(quiet=quiet)
+			
+			if not quiet:
+				libtcod.console_flush()
+				continue
+			
+			for (turn, phase, unit_id, owning_player, source, result) in self.hit_log[log_start:]:
+				if result not in HIT_SUMMARY_RESULTS: continue
+				text = HIT_SUMMARY_RESULTS[result]
+				if text not in summary:
+					summary[text] = 0
+				summary[text] += 1
+		
+		if len(summary) == 0: return
+		
+		text = 'Hits on unseen units: '
+		for (result, number) in summary.items():
+			text += str(number) + ' ' + result + ', '
+		ShowMessage(text[:-2] + '.')
 	
 	
 	# return whether an immobilization attempt is possible
@@ -13386,7 +13904,7 @@ class Scenario:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='First Aid'): continue
 			
 			# cancel action
 			if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
@@ -13637,9 +14155,8 @@ class Scenario:
 	def GetWithdrawChance(self):
 		
 		enemies_in_range = 0
-		for unit in self.units:
+		for unit in self.GetAISituation().units[1]:
 			if not unit.alive: continue
-			if unit.owning_player == 0: continue
 			if not self.player_unit.los_table[unit]: continue
 			distance = GetHexDistance(unit.hx, unit.hy, 0, 0)
 			if distance == 1:
@@ -14099,7 +14616,7 @@ class Scenario:
 				break
 		if all_crew_dead:
 			ShowMessage('Your crew is all dead.', good_news=False)
-			scenario.player_unit.DestroyMe()
+			scenario.player_unit.DestroyMe(cause='Crew Lost')
 			return
 		
 		# check for end of campaign day, but don't end the scenario
@@ -14136,7 +14653,7 @@ class Scenario:
 			
 			if campaign.player_unit.nation == 'Empire of Japan':
 				if roll <= 5.0:
-					unit = self.SpawnFriendlyReinforcements(unit_list=['SMG Squad', 'Flame Thrower Team', 'Combat Engineer Team'])
+					unit = RunInRNGStream('Spawn', self.SpawnFriendlyReinforcements, unit_list=['SMG Squad', 'Flame Thrower Team', 'Combat Engineer Team'])
 					if unit is not None:
 						ShowMessage('A hidden friendly ' + unit.unit_id + ' has revealed themselves and joins the battle!',
 							scenario_highlight=(unit.hx, unit.hy), good_news=True)
@@ -14144,7 +14661,7 @@ class Scenario:
 			
 			elif campaign.player_unit.nation == 'United Kingdom':
 				if roll <= 5.0:
-					unit = self.SpawnFriendlyReinforcements(unit_list=['OQF 25-Pounder'])
+					unit = RunInRNGStream('Spawn', self.SpawnFriendlyReinforcements, unit_list=['OQF 25-Pounder'])
 					if unit is not None:
 						ShowMessage('A friendly ' + unit.unit_id + ' was nearby and joins the battle!',
 							scenario_highlight=(unit.hx, unit.hy), good_news=True)
@@ -14152,7 +14669,7 @@ class Scenario:
 			
 			elif campaign.player_unit.nation == 'United States of America':
 				if roll <= 5.0 and 'player_arty_support' in campaign.stats:
-					self.DoArtilleryAttack(naval_only=True)
+					RunInRNGStream('Combat', self.DoArtilleryAttack, naval_only=True)
 					return
 			
 			# enemy event
@@ -14213,7 +14730,7 @@ class Scenario:
 			elif 'United States of America' in campaign.current_week['enemy_nations']:
 				if roll <= 5.0:
 					if 'enemy_arty_support' in campaign.stats:
-						self.DoArtilleryAttack(player_target=True, naval_only=True)
+						RunInRNGStream('Combat', self.DoArtilleryAttack, player_target=True, naval_only=True)
 						return
 					
 		
@@ -14246,9 +14763,9 @@ class Scenario:
 			if roll <= 0.2:
 				if campaign.player_unit.CrewmanHasSkill(['Radio Operator'], 'Good Comms'):
 					if GetPercentileRoll() < 80.0: return
-				self.DoAirAttack(friendly_fire=True)
+				RunInRNGStream('Combat', self.DoAirAttack, friendly_fire=True)
 			else:
-				self.DoAirAttack()
+				RunInRNGStream('Combat', self.DoAirAttack)
 			
 		# friendly arty attack
 		elif roll <= 20.0:
@@ -14259,9 +14776,9 @@ class Scenario:
 			if roll <= 10.2:
 				if campaign.player_unit.CrewmanHasSkill(['Radio Operator'], 'Good Comms'):
 					if GetPercentileRoll() < 80.0: return
-				self.DoArtilleryAttack(player_target=True, friendly_fire=True)
+				RunInRNGStream('Combat', self.DoArtilleryAttack, player_target=True, friendly_fire=True)
 			else:
-				self.DoArtilleryAttack()
+				RunInRNGStream('Combat', self.DoArtilleryAttack)
 		
 		# enemy reinforcement
 		elif roll <= 30.0:
@@ -14269,7 +14786,7 @@ class Scenario:
 				if GetPercentileRoll() <= (float(self.enemy_reinforcements) * 40.0):
 					return
 			self.enemy_reinforcements += 1
-			if self.SpawnEnemyUnits(reinforcement=True):
+			if RunInRNGStream('Spawn', self.SpawnEnemyUnits, reinforcement=True):
 				ShowMessage('Enemy reinforcements have arrived!', good_news=False)
 		
 		# sniper attack on player
@@ -14402,23 +14919,23 @@ class Scenario:
 			
 			# friendly fire!
 			if roll <= 50.5:
-				self.DoAirAttack(player_target=True, friendly_fire=True)
+				RunInRNGStream('Combat', self.DoAirAttack, player_target=True, friendly_fire=True)
 			else:
-				self.DoAirAttack(player_target=True)
+				RunInRNGStream('Combat', self.DoAirAttack, player_target=True)
 		
 		# enemy artillery attack on player
 		elif roll <= 60.0:
 			if 'enemy_arty_support' not in campaign.stats: return
 			# friendly fire!
 			if roll <= 55.5:
-				self.DoArtilleryAttack(player_target=True, friendly_fire=True)
+				RunInRNGStream('Combat', self.DoArtilleryAttack, player_target=True, friendly_fire=True)
 			else:
-				self.DoArtilleryAttack(player_target=True)
+				RunInRNGStream('Combat', self.DoArtilleryAttack, player_target=True)
 		
 		# friendly reinforcements
 		elif roll <= 65.0:
 			if 'player_unit_support' not in campaign.stats: return
-			unit = self.SpawnFriendlyReinforcements()
+			unit = RunInRNGStream('Spawn', self.SpawnFriendlyReinforcements)
 			if unit is not None:
 				ShowMessage('A friendly ' + unit.unit_id + ' arrives and joins the battle!',
 					scenario_highlight=(unit.hx, unit.hy), good_news=True)
@@ -14490,11 +15007,11 @@ class Scenario:
 				
 				ShowMessage(unit.GetName() + ' fires harassing fire at you!', good_news=False)
 				
-				if unit.Attack(unit.weapon_list[0], self.player_unit):
+				if RunInRNGStream('Combat', unit.Attack, unit.weapon_list[0], self.player_unit):
 					
 					# won't cause AP hits
 					self.player_unit.ap_hits_to_resolve = []
-					self.player_unit.ResolveFP()
+					RunInRNGStream('Combat', self.player_unit.ResolveFP)
 		
 		else:
 			return
@@ -14819,7 +15336,7 @@ class Scenario:
 				ys += 1
 			libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 			libtcod.console_flush()
-			Wait(150, ignore_animations=True)
+			Wait(150, ignore_animations=True, category='Messages')
 		
 		# attempt to do the selected action for the crewman
 		def DoBailoutAction(crewman):
@@ -15135,13 +15652,13 @@ class Scenario:
 						libtcod.RIGHT, str(GetPercentileRoll()))
 					libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 					libtcod.console_flush()
-					Wait(15, ignore_animations=True)
+					Wait(15, ignore_animations=True, category='Rolls')
 				libtcod.console_print(con, 64, 45, '      ')
 				libtcod.console_print_ex(con, 68, 45, libtcod.BKGND_NONE,
 					libtcod.RIGHT, str(roll))
 				libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 				libtcod.console_flush()
-				Wait(15, ignore_animations=True)
+				Wait(15, ignore_animations=True, category='Rolls')
 			
 			# display outcome
 			DisplayResult(crewman, result_text, roll<=odds)
@@ -15585,7 +16102,7 @@ class Scenario:
 			if DEBUG:
 				if key.vk == sdl2.SDLK_F11: sys.exit()
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Bail Out'): continue
 			
 			# debug menu
 			if key.vk == sdl2.SDLK_F10:
@@ -15941,7 +16458,7 @@ class Scenario:
 		
 			# player is being attacked in own zone, generate enemy units for this zone
 			if self.cd_map_hex.controlled_by == 0 and len(self.cd_map_hex.enemy_units) == 0:
-				self.cd_map_hex.GenerateStrengthAndUnits(campaign_day.mission, player_attacked=True)
+				RunInRNGStream('Spawn', self.cd_map_hex.GenerateStrengthAndUnits, campaign_day.mission, player_attacked=True)
 			
 			for (nation, unit_id) in self.cd_map_hex.enemy_units:
 				enemy_unit_list.append((nation, unit_id))
@@ -16415,18 +16932,141 @@ class Scenario:
 		return ''
 	
 	
+	# calculate the parts of an attack profile for an attacker firing a given weapon that don't depend on
+	# the target; cached by Unit.GetAttackModPartial() so they can be reused across target candidates
+	def CalcAttackerModPartials(self, attacker, weapon):
+		
+		partials = {}
+		weapon_type = weapon.GetStat('type')
+		
+		# crewman operating weapon, player unit only
+		crewman = None
+		if attacker.is_player:
+			crewman = weapon.GetOperatingCrewman()
+		partials['crewman'] = crewman
+		
+		# crewman skill modifiers to critical hit chance against armoured targets
+		partials['critical_hit_mod'] = None
+		if crewman is not None and weapon_type == 'Gun':
+			modifier = crewman.GetSkillMod('The Penetrator', 4.0)
+			if modifier is None:
+				modifier = crewman.GetSkillMod('Knows Weak Spots', 2.0)
+			partials['critical_hit_mod'] = modifier
+		
+		# attacker is packed-up gun
+		partials['packed_up'] = False
+		if attacker.GetStat('category') == 'Gun' and not attacker.deployed and attacker.GetStat('size_class') in ['Very Small', 'Small']:
+			partials['packed_up'] = True
+		
+		# slow-firing gun without enough loaders active
+		partials['slow_firing_mod'] = None
+		if weapon_type == 'Gun' and weapon.GetStat('rof_na') is not None and attacker.is_player:
+			if weapon.GetStat('reloaded_by') is None:
+				partials['slow_firing_mod'] = ('Slow Firing Gun', -5.0)
+			else:
+				loaders_required = 1
+				if weapon.GetStat('two_loaders') is not None:
+					loaders_required = 2
+				loaders_acting = 0
+				
+				for position_name in weapon.GetStat('reloaded_by'):
+					for position in attacker.positions_list:
+						if position.crewman is None: continue
+						if position.name != position_name: continue
+						if position.crewman.current_cmd == 'Reload':
+							loaders_acting += 1
+				
+				if loaders_required - loaders_acting >= 2:
+					partials['slow_firing_mod'] = ('Slow Reloading', -20.0)
+				elif loaders_required - loaders_acting == 1:
+					partials['slow_firing_mod'] = ('Slow Reloading', -10.0)
+		
+		# Commander directing fire, only the best modifier applies
+		partials['direct_fire_mod'] = None
+		for position in COMMANDER_POSITIONS:
+			commander = attacker.GetPersonnelByPosition(position)
+			if commander is None: continue
+			if commander.current_cmd == 'Direct Fire':
+				
+				crewman_mod_list = []
+				
+				# fire direction modifier
+				modifier = commander.GetActionMod(10.0)
+				if not commander.ce: modifier = round(modifier * 0.4, 1)
+				crewman_mod_list.append(('Commander Fire Direction', modifier))
+				
+				# check for possible skill modifiers
+				modifier = commander.GetSkillMod('Fire Spotter', 10.0)
+				if modifier is not None:
+					crewman_mod_list.append(('Fire Spotter', modifier))
+				if weapon_type in MG_WEAPONS:
+					modifier = commander.GetSkillMod('MG Spotter', 15.0)
+					if modifier is not None:
+						crewman_mod_list.append(('MG Spotter', modifier))
+				elif weapon_type == 'Gun':
+					modifier = commander.GetSkillMod('Gun Spotter', 15.0)
+					if modifier is not None:
+						crewman_mod_list.append(('Gun Spotter', modifier))
+				
+				# sort list and add only the best modifier
+				crewman_mod_list.sort(key = lambda x: x[1], reverse=True)
+				partials['direct_fire_mod'] = crewman_mod_list[0]
+				
+				break
+		
+		# operating crewman untrained, skills, injuries and fatigue
+		partials['untrained'] = False
+		partials['shot_skill_mod'] = None
+		partials['injury_mods'] = []
+		partials['fatigue_mod'] = None
+		if crewman is None:
+			return partials
+		
+		# MGs are excluded from the untrained penalty
+		if crewman.UntrainedPosition() and weapon_type not in MG_WEAPONS:
+			partials['untrained'] = True
+		elif weapon_type == 'Gun':
+			modifier = crewman.GetSkillMod('Expert Shot', 8.0)
+			if modifier is not None:
+				partials['shot_skill_mod'] = ('Expert Shot', modifier)
+			else:
+				modifier = crewman.GetSkillMod('Crack Shot', 3.0)
+				if modifier is not None:
+					partials['shot_skill_mod'] = ('Crack Shot', modifier)
+		
+		for (k, v) in crewman.injury.items():
+			if k not in ['Right Arm & Hand', 'Left Arm & Hand']: continue
+			if v[1] is None: continue
+			if v[1] == 'Light':
+				partials['injury_mods'].append(('Arm/Hand Injury', -5.0))
+			elif v[1] == 'Heavy':
+				partials['injury_mods'].append(('Arm/Hand Injury', -15.0))
+			else:
+				partials['injury_mods'].append(('Arm/Hand Injury', -25.0))
+		
+		if crewman.fatigue > 0:
+			partials['fatigue_mod'] = ('Crewman Fatigue', 0.0 - float(crewman.fatigue))
+		
+		return partials
+	
+	
+	# calculate the parts of an attack profile for a target that don't depend on the attacker
+	def CalcTargetModPartials(self, target):
+		partials = {}
+		partials['tem'] = target.GetTEM()
+		partials['size_mod'] = None
+		size_class = target.GetStat('size_class')
+		if size_class is not None:
+			if size_class != 'Normal':
+				partials['size_mod'] = (size_class + ' Target', PF_SIZE_MOD[size_class])
+		return partials
+	
+	
 	# generate a profile for a given attack
 	# if pivot or turret_rotate are set to True, will override actual attacker status
 	def CalcAttack(self, attacker, weapon, target, pivot=False, turret_rotate=False, attempt_immobilize=False):
 				
-		profile = {}
-		profile['attacker'] = attacker
-		profile['weapon'] = weapon
-		profile['ammo_type'] = weapon.ammo_type
-		profile['target'] = target
-		profile['modifier'] = ''	# placeholder for any final modifiers to attack result
-		profile['result'] = ''		# placeholder for text rescription of result
-		profile['immobilize'] = False
+		profile = AttackProfile(attacker, weapon, target, ammo_type=weapon.ammo_type)
 		
 		# determine attack type
 		weapon_type = weapon.GetStat('type')
@@ -16456,9 +17096,13 @@ class Scenario:
 		# determine crewman operating weapon:
 		# need to find a match between positions that can fire the weapon,
 		# and who is on the correct command
+		# get partial modifiers that stay the same as long as the attacker and target don't change
+		attacker_mods = attacker.GetAttackModPartial(weapon, self.CalcAttackerModPartials, attacker, weapon)
+		target_mods = target.GetAttackModPartial('target', self.CalcTargetModPartials, target)
+		
 		profile['crewman'] = None
 		if attacker.is_player:
-			profile['crewman'] = weapon.GetOperatingCrewman()
+			profile['crewman'] = attacker_mods['crewman']
 			if profile['crewman'] is None: return None
 		
 		# calculate distance to target
@@ -16496,15 +17140,8 @@ class Scenario:
 		if profile['type'] == 'Point Fire':
 			
 			# calculate critical hit chance modifier
-			if profile['crewman'] is not None:
-				if weapon_type == 'Gun' and target.GetStat('armour') is not None:
-					modifier = profile['crewman'].GetSkillMod('The Penetrator', 4.0)
-					if modifier is not None:
-						profile['critical_hit'] += modifier
-					else:
-						modifier = profile['crewman'].GetSkillMod('Knows Weak Spots', 2.0)
-						if modifier is not None:
-							profile['critical_hit'] += modifier
+			if attacker_mods['critical_hit_mod'] is not None and target.GetStat('armour') is not None:
+				profile['critical_hit'] += attacker_mods['critical_hit_mod']
 			
 			# calculate base success chance
 			
@@ -16586,7 +17223,7 @@ class Scenario:
 				modifier_list.append(('Attacker Reduced', -40.0))
 			
 			# attacker is packed-up gun
-			if attacker.GetStat('category') == 'Gun' and not attacker.deployed and attacker.GetStat('size_class') in ['Very Small', 'Small']:
+			if attacker_mods['packed_up']:
 				modifier_list.append(('Attacker Packed-up', -30.0))
 			
 			# precipitation/sandstorm effects
@@ -16707,22 +17344,19 @@ class Scenario:
 						modifier_list.append(('Target Moving', mod))
 				
 				# target size
-				size_class = target.GetStat('size_class')
-				if size_class is not None:
-					if size_class != 'Normal':
-						text = size_class + ' Target'
-						mod = PF_SIZE_MOD[size_class]
-						
-						# at close range, size modifiers are less
-						if profile['distance'] <= 1:
-							mod = round(mod / 2, 1)
-						modifier_list.append((text, mod))
+				if target_mods['size_mod'] is not None:
+					(text, mod) = target_mods['size_mod']
+					
+					# at close range, size modifiers are less
+					if profile['distance'] <= 1:
+						mod = round(mod / 2, 1)
+					modifier_list.append((text, mod))
 				
 				# target is not being overrun
 				if not profile['defensive_fire']:
 				
 					# target terrain
-					tem = target.GetTEM()
+					tem = target_mods['tem']
 					if tem != 0.0:
 						if profile['ballistic_attack']:
 							tem = round((tem * 0.5), 1)
@@ -16808,26 +17442,8 @@ class Scenario:
 			# guns that can't maintain RoF need to have loader(s) active or else suffer a to-hit penalty,
 			# due to the gun operator having to spend time loading the slow-firing gun themselves
 			# player unit only
-			if weapon_type == 'Gun' and weapon.GetStat('rof_na') is not None and attacker.is_player:
-				if weapon.GetStat('reloaded_by') is None:
-					modifier_list.append(('Slow Firing Gun', -5.0))
-				else:
-					loaders_required = 1
-					if weapon.GetStat('two_loaders') is not None:
-						loaders_required = 2
-					loaders_acting = 0
-					
-					for position_name in weapon.GetStat('reloaded_by'):
-						for position in attacker.positions_list:
-							if position.crewman is None: continue
-							if position.name != position_name: continue
-							if position.crewman.current_cmd == 'Reload':
-								loaders_acting += 1
-					
-					if loaders_required - loaders_acting >= 2:
-						modifier_list.append(('Slow Reloading', -20.0))
-					elif loaders_required - loaders_acting == 1:
-						modifier_list.append(('Slow Reloading', -10.0))
+			if attacker_mods['slow_firing_mod'] is not None:
+				modifier_list.append(attacker_mods['slow_firing_mod'])
 			
 		
 		# area fire
@@ -16997,15 +17613,12 @@ class Scenario:
 					modifier_list.append(('Moving Deployed Gun', mod))
 				
 				# target size
-				size_class = target.GetStat('size_class')
-				if size_class is not None:
-					if size_class != 'Normal':
-						text = size_class + ' Target'
-						mod = PF_SIZE_MOD[size_class]
-						# at close range, size modifiers are less
-						if profile['distance'] <= 1:
-							mod = round(mod / 2, 1)
-						modifier_list.append((text, mod))
+				if target_mods['size_mod'] is not None:
+					(text, mod) = target_mods['size_mod']
+					# at close range, size modifiers are less
+					if profile['distance'] <= 1:
+						mod = round(mod / 2, 1)
+					modifier_list.append((text, mod))
 				
 				# gun shield
 				if not profile['overrun'] and target.GetStat('gun_shield') is not None:
@@ -17029,7 +17642,7 @@ class Scenario:
 						tem_mod = ('Target Dug-in', -15.0)
 				
 				# apply target terrain modifier if better
-				tem = target.GetTEM()
+				tem = target_mods['tem']
 				if tem < tem_mod[1]:
 					tem_mod = ('Target in ' + target.terrain, tem)
 				
@@ -17186,15 +17799,11 @@ class Scenario:
 				modifier_list.append(('Moving Target', -60.0))
 			
 			# target size
-			size_class = target.GetStat('size_class')
-			if size_class is not None:
-				if size_class != 'Normal':
-					text = size_class + ' Target'
-					mod = PF_SIZE_MOD[size_class]
-					modifier_list.append((text, mod))
+			if target_mods['size_mod'] is not None:
+				modifier_list.append(target_mods['size_mod'])
 			
 			# target terrain
-			tem = target.GetTEM()
+			tem = target_mods['tem']
 			if tem != 0.0:
 				
 				# for placed/thrown weapons, improves odds of getting close enough for a good attack
@@ -17207,43 +17816,15 @@ class Scenario:
 				modifier_list.append(('Target Fortified', -20.0))
 		
 		# check for Commander directing fire
-		for position in COMMANDER_POSITIONS:
-			crewman = attacker.GetPersonnelByPosition(position)
-			if crewman is None: continue
-			if crewman.current_cmd == 'Direct Fire':
-				
-				crewman_mod_list = []
-				
-				# fire direction modifier
-				modifier = crewman.GetActionMod(10.0)
-				if not crewman.ce: modifier = round(modifier * 0.4, 1)
-				crewman_mod_list.append(('Commander Fire Direction', modifier))
-				
-				# check for possible skill modifiers
-				modifier = crewman.GetSkillMod('Fire Spotter', 10.0)
-				if modifier is not None:
-					crewman_mod_list.append(('Fire Spotter', modifier))
-				if weapon_type in MG_WEAPONS:
-					modifier = crewman.GetSkillMod('MG Spotter', 15.0)
-					if modifier is not None:
-						crewman_mod_list.append(('MG Spotter', modifier))
-				elif weapon_type == 'Gun':
-					modifier = crewman.GetSkillMod('Gun Spotter', 15.0)
-					if modifier is not None:
-						crewman_mod_list.append(('Gun Spotter', modifier))
-				
-				# sort list and add only the best modifier
-				crewman_mod_list.sort(key = lambda x: x[1], reverse=True)
-				modifier_list.append(crewman_mod_list[0])
-					
-				break
+		if attacker_mods['direct_fire_mod'] is not None:
+			modifier_list.append(attacker_mods['direct_fire_mod'])
 		
 		# check for firing crew skills
 		if profile['crewman'] is not None:
 			
 			# check for operating crewman in untrained position
 			# MGs are excluded from this penalty
-			if profile['crewman'].UntrainedPosition() and weapon_type not in MG_WEAPONS:
+			if attacker_mods['untrained']:
 				modifier_list.append(('Untrained Crewman', -50.0))
 			
 			else:
@@ -17251,13 +17832,8 @@ class Scenario:
 				# following skills can stack except for upgraded versions of skills
 				if weapon_type == 'Gun':
 					
-					modifier = profile['crewman'].GetSkillMod('Expert Shot', 8.0)
-					if modifier is not None:
-						modifier_list.append(('Expert Shot', modifier))
-					else:
-						modifier = profile['crewman'].GetSkillMod('Crack Shot', 3.0)
-						if modifier is not None:
-							modifier_list.append(('Crack Shot', modifier))	
+					if attacker_mods['shot_skill_mod'] is not None:
+						modifier_list.append(attacker_mods['shot_skill_mod'])
 					
 					if target.moving:
 						modifier = profile['crewman'].GetSkillMod('Target Tracker', 7.0)
@@ -17304,20 +17880,11 @@ class Scenario:
 						modifier_list.append(('Vehicle Specialist', modifier))
 			
 			# check for injury modifiers
-			for (k, v) in profile['crewman'].injury.items():
-				if k not in ['Right Arm & Hand', 'Left Arm & Hand']: continue
-				if v[1] is None: continue
-				if v[1] == 'Light':
-					modifier_list.append(('Arm/Hand Injury', -5.0))
-				elif v[1] == 'Heavy':
-					modifier_list.append(('Arm/Hand Injury', -15.0))
-				else:
-					modifier_list.append(('Arm/Hand Injury', -25.0))
+			modifier_list.extend(attacker_mods['injury_mods'])
 		
 		# operating crewman fatigue
-		if profile['crewman'] is not None:
-			if profile['crewman'].fatigue > 0:
-				modifier_list.append(('Crewman Fatigue', 0.0 - float(profile['crewman'].fatigue)))
+		if attacker_mods['fatigue_mod'] is not None:
+			modifier_list.append(attacker_mods['fatigue_mod'])
 		
 		# prune out zero modifiers
 		for (text, mod) in reversed(modifier_list):
@@ -17358,8 +17925,9 @@ class Scenario:
 	
 	
 	# takes an attack profile and generates a profile for an armour penetration attempt
-	# uses a slightly different system from to-hit
-	def CalcAP(self, profile, air_attack=False):
+	# uses a slightly different system from to-hit; if top_armour_placement is given, it is used
+	# instead of rolling for whether a Demolition Charge or Molotov hits the top armour
+	def CalcAP(self, profile, air_attack=False, top_armour_placement=None):
 		
 		profile['type'] = 'ap'
 		profile['modifier'] = ''			# clear any final modifier from the attack
@@ -17376,11 +17944,10 @@ class Scenario:
 			top_armour = True
 		
 		# check for good MOL/DC placement
-		if weapon.stats['name'] == 'Demolition Charge':
-			if libtcod.random_get_int(0, 1, 6) == 1:
-				top_armour = True
-		elif weapon.stats['name'] == 'Molotovs':
-			if libtcod.random_get_int(0, 1, 4) == 1:
+		if weapon.stats['name'] in TOP_ARMOUR_PLACEMENT_ODDS:
+			if top_armour_placement is None:
+				top_armour_placement = libtcod.random_get_int(0, 1, TOP_ARMOUR_PLACEMENT_ODDS[weapon.stats['name']]) == 1
+			if top_armour_placement:
 				top_armour = True
 		
 		# get location hit on target
@@ -17443,359 +18010,72 @@ class Scenario:
 				if armour[hit_location] != '-':
 					unarmoured_location = False
 		
-		# look up base AP score required
-		base_score = None
-		
-		if 'custom_ap' in weapon.stats:
-			base_score = int(weapon.GetStat('custom_ap'))
-		
-		elif weapon.GetStat('type') in MG_WEAPONS:
-			calibre = weapon.GetStat('calibre')
-			if calibre is None:
-				base_score = 4
-			elif calibre in ['13', '14', '15']:
-				base_score = 5
-			else:
-				base_score = 4
-			
-		elif weapon.GetStat('name') == 'Rifles':
-			base_score = 2
-			
-		elif weapon.GetStat('name') == 'AT Rifle':
-			if attacker.nation in ['Soviet Union', 'Finland', 'Japan']:
-				base_score = 6
-			else:
-				base_score = 5
-		
-		# vehicle flame thrower
-		elif weapon.GetStat('type') == 'Flame Thrower':
-			base_score = 8
+		# look up base AP score required; scores for most weapons come from the AP score table, AT rifles
+		# and close combat weapons are checked here
+		base_score = GetAPBaseScore(weapon, profile['ammo_type'], unarmoured_location)
 		
-		elif weapon.GetStat('type') == 'Close Combat':
-			
-			name = weapon.GetStat('name')
-			
-			# SMGs have no chance to penetrate armour
-			if name == 'Submachine Guns':
-				profile['base_chance'] = 0
-				profile['modifier_list'] = []
-				profile['final_score'] = 0
-				profile['final_chance'] = 0.0
-				return profile
+		if base_score is None:
 			
-			# HEAT close combat weapons
-			if name in AT_CC_WEAPONS:
-				
-				if unarmoured_location:
-					base_score = 11
+			if weapon.GetStat('name') == 'AT Rifle':
+				if attacker.nation in ['Soviet Union', 'Finland', 'Japan']:
+					base_score = 6
 				else:
-					if name == 'Bazooka':
-						if campaign.today < '1944.01.01':
-							base_score = 10
-						else:
-							base_score = 13
-					elif name == 'PIAT':
-						base_score = 15
-					elif name == 'Panzerfaust Klein':
-						base_score = 22
-					elif name == 'Panzerschreck':
-						base_score = 26
-					elif name == 'Panzerfaust':
-						base_score = 31
-			
-			# HE / Flame close combat weapons
-			else:
-				if name == 'Grenades':
-					if unarmoured_location:
-						base_score = 4
-					else:
-						base_score = 2
-				if name == 'Demolition Charge':
-					if unarmoured_location:
-						base_score = 8
-					else:
-						base_score = 10
-				elif name == 'Flame Thrower':
-					if unarmoured_location:
-						base_score = 8
-					else:
-						base_score = 6
-				elif name == 'Molotovs':
-					if unarmoured_location:
-						base_score = 6
-					else:
-						base_score = 4
-
-		else:
-			calibre = weapon.GetStat('calibre')
-			
-			# C/SH ammo
-			if profile['ammo_type'] in ['C', 'SH']:
-				base_score = 0
+					base_score = 5
 			
-			# AP ammo
-			elif profile['ammo_type'] == 'AP':
+			elif weapon.GetStat('type') == 'Close Combat':
 				
-				# unarmoured location
-				if unarmoured_location:
-					calibre = int(calibre)
-					if calibre <= 28:
-						base_score = 7
-					elif calibre <= 57:
-						base_score = 8
-					elif calibre <= 77:
-						base_score = 9
-					elif calibre <= 95:
-						base_score = 10
-					else:
-						base_score = 11
+				name = weapon.GetStat('name')
 				
-				# armoured location
-				else:
-					origin_nation = None
-					if 'origin_nation' in weapon.unit.stats:
-						origin_nation = weapon.unit.stats['origin_nation']
-					
-					if weapon.GetStat('long_range') is not None:
-						calibre += weapon.GetStat('long_range')
-					
-					# modded weapons
-					if 'custom_ammo_ap' in weapon.stats:
-						if 'AP' in weapon.stats['custom_ammo_ap']:
-							base_score = int(weapon.stats['custom_ammo_ap']['AP'])
-					
-					# special cases first
-					if base_score is None and calibre == '75' and ('Lee' in weapon.unit.unit_id or 'Grant' in weapon.unit.unit_id or 'M3S' in weapon.unit.unit_id):
-						base_score = 13
-					
-					if base_score is None and origin_nation is not None:
-						if calibre == '75S' and origin_nation == 'Empire of Japan':
-							base_score = 12
-						elif calibre == '76L' and origin_nation == 'Soviet Union':
-							base_score = 13
-						elif calibre == '76LL' and origin_nation == 'Soviet Union':
-							base_score = 16
-						elif calibre == '90L' and origin_nation == 'Italy':
-							base_score = 20
-						
-					# all other cases
-					if base_score is None:
-						if weapon.GetStat('name') == 'AT Rifle':
-							base_score = 5
-						elif calibre in ['15', '20']:
-							base_score = 5
-						elif calibre in ['20L']:
-							base_score = 6
-						elif calibre in ['20LL', '25LL', '37S', '30']:
-							base_score = 7
-						elif calibre in ['37', '40', '47S', '57S', '70S']:
-							base_score = 8
-						elif calibre in ['37L', '57', '65S', '76S']:
-							base_score = 9
-						elif calibre in ['40L', '45L', '47', '75S']:
-							base_score = 10
-						elif calibre in ['37LL', '45LL', '47L', '50']:
-							base_score = 11
-						elif calibre in ['76', '84S']:
-							base_score = 12
-						elif calibre in ['50L', '88', '120S']:
-							base_score = 13
-						elif calibre in ['75', '105']:
-							base_score = 14
-						elif calibre in ['57L', '57LL']:
-							base_score = 15
-						elif calibre in ['75L', '76L', '85L', '150S', '152S']:
-							base_score = 17
-						elif calibre in ['80L']:
-							base_score = 18
-						elif calibre in ['77L', '200L']:
-							base_score = 19
-						elif calibre in ['88L']:
-							base_score = 20
-						elif calibre in ['90L', '105L', '150', '152', '155']:
-							base_score = 21
-						elif calibre in ['75LL', '76LL']:
-							base_score = 23
-						elif calibre in ['122L']:
-							base_score = 25
-						elif calibre in ['88LL', '100L', '120L']:
-							base_score = 27
-						elif calibre in ['150L', '155L']:
-							base_score = 28
-						elif calibre in ['140L']:
-							base_score = 32
-						elif calibre in ['128L', '170L']:
-							base_score = 33
-			
-			# APCR/APDS ammo
-			elif profile['ammo_type'] in ['APCR', 'APDS']:
-				
-				# unarmoured location
-				if unarmoured_location:
-					calibre = int(calibre)
-					if calibre <= 28:
-						base_score = 7
-					elif calibre <= 57:
-						base_score = 8
-					elif calibre <= 77:
-						base_score = 9
-					elif calibre <= 95:
-						base_score = 10
-					else:
-						base_score = 11
+				# SMGs have no chance to penetrate armour
+				if name == 'Submachine Guns':
+					profile['base_chance'] = 0
+					profile['modifier_list'] = []
+					profile['final_score'] = 0
+					profile['final_chance'] = 0.0
+					return profile
 				
-				# armoured location
-				else:
+				# HEAT close combat weapons
+				if name in AT_CC_WEAPONS:
 					
-					if weapon.GetStat('long_range') is not None:
-						calibre += weapon.GetStat('long_range')
-					
-					origin_nation = None
-					if 'origin_nation' in weapon.unit.stats:
-						origin_nation = weapon.unit.stats['origin_nation']
-					
-					if profile['ammo_type'] == 'APDS':
-						
-						# modded weapons
-						if 'custom_ammo_ap' in weapon.stats:
-							if 'APDS' in weapon.stats['custom_ammo_ap']:
-								base_score = int(weapon.stats['custom_ammo_ap']['APDS'])
-						
-						if base_score is None:
-							if calibre in ['57L', '57LL']:
-								base_score = 18
-							elif calibre == '77L':
-								base_score = 19
-							elif calibre == '76LL':	
-								if origin_nation is None:
-									base_score = 25
-								else:
-									if origin_nation == 'Soviet Union':
-										base_score = 18
-									else:
-										base_score = 25
+					if unarmoured_location:
+						base_score = 11
 					else:
-						
-						# modded weapons
-						if 'custom_ammo_ap' in weapon.stats:
-							if 'APCR' in weapon.stats['custom_ammo_ap']:
-								base_score = int(weapon.stats['custom_ammo_ap']['APCR'])
-						
-						if base_score is None:
-							if calibre == '37L':
+						if name == 'Bazooka':
+							if campaign.today < '1944.01.01':
 								base_score = 10
-							elif calibre in ['28LL', '45L']:
-								base_score = 12
-							elif calibre in ['45LL', '47L']:
+							else:
 								base_score = 13
-							elif calibre in ['40LL', '50']:
-								base_score = 14
-							elif calibre == '76L':	
-								if origin_nation is None:
-									base_score = 20
-								else:
-									if origin_nation == 'Soviet Union':
-										base_score = 14
-									elif origin_nation == 'United States of America':
-										base_score = 22
-									else:
-										base_score = 20
-							elif calibre == '50L':
-								base_score = 17
-							elif calibre == '57LL':
-								base_score = 18
-							elif calibre in ['75', '85L']:
-								base_score = 19
-							elif calibre == '75L':
-								base_score = 20
-							elif calibre == '88L':
-								base_score = 23
-							elif calibre == '90L':
-								base_score = 27
-			
-			# HEAT ammo
-			elif profile['ammo_type'] == 'HEAT':
-				
-				# unarmoured location
-				if unarmoured_location:
-					base_score = 11
-				
-				# armoured location
-				else:
-					
-					# modded weapons
-					if 'custom_ammo_ap' in weapon.stats:
-						if 'HEAT' in weapon.stats['custom_ammo_ap']:
-							base_score = int(weapon.stats['custom_ammo_ap']['HEAT'])
-					
-					if base_score is None:
-						if calibre in ['57', '65', '94']:
-							base_score = 11
-						elif calibre == '70':
-							base_score = 12
-						elif calibre in ['75', '76', '88']:
-							base_score = 13
-						elif calibre == '100':
-							base_score = 14
-						elif calibre in ['105', '114']:
+						elif name == 'PIAT':
 							base_score = 15
-						elif calibre == '95':
-							base_score = 16
-						elif calibre == '122':
-							base_score = 17
-						elif calibre == '150':
-							base_score = 21
-						elif calibre in ['37', '47']:
+						elif name == 'Panzerfaust Klein':
+							base_score = 22
+						elif name == 'Panzerschreck':
 							base_score = 26
-						elif calibre == '380':		# Sturmtiger launcher
-							base_score = 30
-			
-			# HE hit
-			elif profile['ammo_type'] == 'HE':
+						elif name == 'Panzerfaust':
+							base_score = 31
 				
-				calibre = int(calibre)
-				
-				if unarmoured_location:
-					if calibre <= 20:
-						base_score = 6
-					elif calibre <= 30:
-						base_score = 8
-					elif calibre <= 40:
-						base_score = 9
-					elif calibre <= 50:
-						base_score = 10
-					elif calibre <= 70:
-						base_score = 12
-					elif calibre <= 80:
-						base_score = 14
-					elif calibre <= 100:
-						base_score = 16
-					elif calibre <= 120:
-						base_score = 18
-					else:
-						base_score = 20
-				
-				# armoured location
+				# HE / Flame close combat weapons
 				else:
-					
-					if calibre <= 20:
-						base_score = 3
-					elif calibre <= 30:
-						base_score = 4
-					elif calibre <= 40:
-						base_score = 5
-					elif calibre <= 50:
-						base_score = 6
-					elif calibre <= 70:
-						base_score = 7
-					elif calibre <= 80:
-						base_score = 8
-					elif calibre <= 100:
-						base_score = 10
-					elif calibre <= 120:
-						base_score = 12
-					else:
-						base_score = 16
+					if name == 'Grenades':
+						if unarmoured_location:
+							base_score = 4
+						else:
+							base_score = 2
+					if name == 'Demolition Charge':
+						if unarmoured_location:
+							base_score = 8
+						else:
+							base_score = 10
+					elif name == 'Flame Thrower':
+						if unarmoured_location:
+							base_score = 8
+						else:
+							base_score = 6
+					elif name == 'Molotovs':
+						if unarmoured_location:
+							base_score = 6
+						else:
+							base_score = 4
 		
 		if base_score is None:
 			print('ERROR: not able to find base AP score for: ' + weapon.GetStat('name'))
@@ -18073,6 +18353,15 @@ class Scenario:
 			libtcod.console_print_ex(attack_con, 13, 41, libtcod.BKGND_NONE, libtcod.CENTER,
 				str(profile['final_score']))
 		
+		# otherwise, display the overall chance of penetrating the target's armour if any
+		else:
+			outcomes = CalcAttackOutcomes(profile)
+			if 'PENETRATED' in outcomes:
+				libtcod.console_print_ex(attack_con, 13, 40, libtcod.BKGND_NONE, libtcod.CENTER,
+					'Chance to Penetrate:')
+				libtcod.console_print_ex(attack_con, 13, 41, libtcod.BKGND_NONE, libtcod.CENTER,
+					str(round(outcomes['PENETRATED'], 1)) + '%')
+		
 		# display final modified chance
 		libtcod.console_set_default_background(attack_con, libtcod.darker_blue)
 		libtcod.console_rect(attack_con, 1, 43, 25, 1, False, libtcod.BKGND_SET)
@@ -18203,21 +18492,9 @@ class Scenario:
 		libtcod.console_set_default_background(attack_con, libtcod.black)
 		libtcod.console_rect(attack_con, 6, 56, 18, 2, True, libtcod.BKGND_SET)
 		
-		result_text = ''
-		
-		# if AP roll, may not need to roll
-		if profile['type'] == 'ap':
-			if profile['final_chance'] == 0.0:
-				result_text = 'NO PENETRATION'
-			elif profile['final_chance'] == 100.0:
-				result_text = 'PENETRATED'
-		
-		# if HE roll, may not need to roll
-		elif profile['type'] == 'he':
-			if profile['final_chance'] == 0.0:
-				result_text = 'NO EFFECT'
-			elif profile['final_chance'] == 100.0:
-				result_text = 'DESTROYED'
+		# if AP or HE roll, may not need to roll
+		result_text = GetAutomaticAttackResult(profile)
+		roll = None
 		
 		# only roll if outcome not yet determined
 		if result_text == '':
@@ -18257,7 +18534,7 @@ class Scenario:
 						continue
 					
 					# pause between rolls
-					Wait(15)
+					Wait(15, category='Rolls')
 			
 			# wait for attack animation to end if still active
 			# compatibility check for <= 1.1.3
@@ -18266,9 +18543,6 @@ class Scenario:
 					libtcod.console_flush()
 					CheckForAnimationUpdate()
 			
-			# record the final roll in the attack profile
-			profile['roll'] = roll
-			
 			# if player is attacker, check for Steam achievement
 			if profile['attacker'] == scenario.player_unit and profile['type'] != 'he':
 				if 0.0 <= profile['final_chance'] - roll <= 0.5:
@@ -18276,233 +18550,19 @@ class Scenario:
 				elif 0.0 < roll - profile['final_chance'] <= 0.5:
 					session.ModifySteamStat('close_miss', 1)
 			
-			# determine location hit on target (not always used). Don't reroll this if doing an AP or HE kill roll.
-			if 'location' not in profile:
-				if GetPercentileRoll() <= profile['target'].GetHullHitChance(profile['ballistic_attack']):
-					profile['location'] = 'Hull'
-				else:
-					profile['location'] = 'Turret'
-			
-			profile['effective_fp'] = 0
-			
-			# armour penetration roll
-			if profile['type'] == 'ap':
-				if roll >= CRITICAL_MISS:
-					result_text = 'NO PENETRATION'
-				elif roll <= CRITICAL_HIT:
-					result_text = 'PENETRATED'
-				elif roll <= profile['final_chance']:
-					result_text = 'PENETRATED'
-				else:
-					result_text = 'NO PENETRATION'
-				
-				# modify message for unarmoured targets
-				if result_text == 'NO PENETRATION' and profile['target'].GetStat('armour') is None:
-					result_text = 'MINOR DAMAGE'
-			
-			# HE destruction roll
-			elif profile['type'] == 'he':
-				if roll <= profile['final_chance']:
-					result_text = 'DESTROYED'
-				else:
-					
-					# should be an unarmoured vehicle, but just make sure
-					if profile['target'].GetStat('armour') is not None:
-						result_text = 'NO EFFECT'
-					else:
-						
-						# player target
-						if profile['target'].ai is None:
-							if not profile['target'].immobilized:
-								result_text = 'IMMOBILIZED'
-							else:
-								result_text = 'NO EFFECT'
-						
-						# AI target
-						else:
-							
-							if GetPercentileRoll() <= 50.0:
-								if not profile['target'].immobilized:
-									result_text = 'IMMOBILIZED'
-								else:
-									result_text = 'NO EFFECT'
-							else:
-								if profile['target'].ai.state != 'Stunned':
-									result_text = 'STUNNED'	
-								else:
-									result_text = 'NO EFFECT'							
-			
-			# area fire attack
-			elif profile['type'] == 'Area Fire':
-				if roll <= profile['critical_effect']:
-					
-					# no critical effect possible if original odds were <= 3%
-					if profile['final_chance'] <= 3.0:
-						result_text = 'FULL EFFECT'
-						profile['effective_fp'] = profile['base_fp']
-					else:
-						result_text = 'CRITICAL EFFECT'
-						profile['effective_fp'] = profile['base_fp'] * 2
-				elif roll <= profile['full_effect']:
-					result_text = 'FULL EFFECT'
-					profile['effective_fp'] = profile['base_fp']
-				elif roll <= profile['final_chance']:
-					result_text = 'PARTIAL EFFECT'
-					profile['effective_fp'] = int(floor(profile['base_fp'] / 2))
-					if profile['effective_fp'] < 1:
-						profile['effective_fp'] = 1
-				else:
-					result_text = 'NO EFFECT'
-				
-				# overrun attacks get bonus FP
-				if profile['overrun']:
-					profile['effective_fp'] = profile['effective_fp'] * 2
-				
-				# unspotted targets take half FP rounded up
-				if not profile['target'].spotted:
-					profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
-				
-				# might be converted into an AP MG hit
-				if result_text in ['FULL EFFECT', 'CRITICAL EFFECT'] and profile['target'].GetStat('armour') is not None:
-					if profile['weapon'].GetStat('type') in MG_WEAPONS:
-						if result_text == 'FULL EFFECT':
-							result_text = 'HIT'
-						else:
-							result_text = 'CRITICAL HIT'
-					
-					# rifle weapons can result in an AP check if within 1 hex from target; compatibility check here for 1.2.13
-					elif profile['weapon'].GetStat('type') in RIFLE_WEAPONS and 'distance' in profile:
-						if distance <= 1:
-							if result_text == 'FULL EFFECT':
-								result_text = 'HIT'
-							else:
-								result_text = 'CRITICAL HIT'
-			
-			# vehicle flame thrower attack
-			elif profile['type'] == 'Flame Thrower':
-				if roll <= profile['full_effect']:
-					result_text = 'FULL EFFECT'
-					profile['effective_fp'] = profile['base_fp']
-				elif roll <= profile['final_chance']:
-					result_text = 'PARTIAL EFFECT'
-					profile['effective_fp'] = int(floor(profile['base_fp'] / 2))
-					if profile['effective_fp'] < 1:
-						profile['effective_fp'] = 1
-				else:
-					result_text = 'NO EFFECT'
-				
-				# overrun attacks get bonus FP
-				if profile['overrun']:
-					profile['effective_fp'] = profile['effective_fp'] * 2
-				
-				# unspotted targets take half FP rounded up
-				if not profile['target'].spotted:
-					profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
-				
-				# might be converted into an AP hit
-				if result_text in ['FULL EFFECT', 'CRITICAL EFFECT']:
-					if profile['target'].GetStat('armour') is not None:
-						if result_text == 'FULL EFFECT':
-							result_text = 'HIT'
-	
-			# point fire or close combat attack
-			else:
-				
-				if roll >= CRITICAL_MISS:
-					result_text = 'MISS'
-				
-				elif roll <= profile['critical_hit'] and profile['ammo_type'] not in ['Smoke', 'WP']:
-					
-					# make sure that original roll was a success
-					if roll > profile['final_chance']:
-						result_text = 'MISS'
-					else:
-						# no critical hit possible if original odds were <= 3%
-						if profile['final_chance'] <= 3.0:
-							result_text = 'HIT'
-						else:
-							result_text = 'CRITICAL HIT'
-				
-				elif profile['ammo_type'] == 'HE':
-					if roll <= profile['full_effect']:
-						result_text = 'HIT'
-					elif roll <= profile['final_chance']:
-						result_text = 'PARTIAL HIT'
-					else:
-						result_text = 'MISS'
-				
-				elif roll <= profile['final_chance']:
-					result_text = 'HIT'
-				else:
-					result_text = 'MISS'
-				
-				# calculate effective FP
-				if result_text in ['HIT', 'CRITICAL HIT', 'PARTIAL HIT']:
-					
-					if profile['type'] == 'Close Combat':
-						profile['effective_fp'] = int(profile['weapon'].GetStat('fp'))
-						if result_text == 'CRITICAL HIT':
-							profile['effective_fp'] = profile['effective_fp'] * 2
-					
-					elif profile['type'] == 'Point Fire':
-						if profile['ammo_type'] == 'WP':
-							profile['effective_fp'] = WP_FP
-						elif profile['ammo_type'] in ['C', 'SH']:
-							calibre = int(profile['weapon'].GetStat('calibre'))
-							if calibre <= 37:
-								profile['effective_fp'] = 12
-							elif calibre <= 75:
-								profile['effective_fp'] = 20
-							else:
-								profile['effective_fp'] = 24
-						elif profile['target'].GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
-							if profile['ammo_type'] in ['HE', 'HEAT']:
-								# set the result now so that the HE FP is calculated correctly
-								profile['result'] = result_text
-								profile = profile['attacker'].CalcHEEffectiveFP(profile)
-							elif profile['ammo_type'] in AP_AMMO_TYPES:
-								profile['effective_fp'] = 1
-						else:
-							if profile['ammo_type'] in ['HE', 'HEAT']:
-								profile['result'] = result_text
-								profile = profile['attacker'].CalcHEEffectiveFP(profile)
-					
-					# unspotted targets take half FP rounded up
-					if not profile['target'].spotted:
-						profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
-			
-			# checks for HD target
-			if 'hd_mod' in profile:
-				
-				# if final roll failed and was within the HD save modifier, change message to reflect that it was a HD save
-				if result_text == 'MISS':
-					if 'full_effect' in profile:
-						if roll + profile['hd_mod'] >= profile['full_effect']: 
-							result_text = 'HULL DOWN SAVED'
-					elif 'final_chance' in profile:
-						if roll + profile['hd_mod'] >= profile['final_chance']:
-							result_text = 'HULL DOWN SAVED'
-				
-				# if final roll passed and target was HD, roll to see if hit location is changed to turret
-				elif result_text in ['HIT', 'CRITICAL HIT'] and profile['location'] == 'Hull':
-					if GetPercentileRoll() >= profile['hd_mod']:
-						profile['location'] = 'Turret'
+			# determine the result of the roll
+			result_text = GetAttackRollResult(profile, roll)
 		
 		profile['result'] = result_text
+		if session.analytics is not None:
+			session.analytics.RecordShot(profile, roll)
 		
 		# check for RoF
-		profile['weapon'].maintained_rof = False
 		player_rof = False
-		if profile['type'] not in ['ap', 'he'] and not profile['immobilize'] and not profile['defensive_fire']:
-			
-			chance = profile['weapon'].GetRoFChance()
-			if chance > 0.0:
-				if GetPercentileRoll() <= chance:
-					profile['weapon'].maintained_rof = True
-					profile['weapon'].rof_shots += 1
+		if CheckAttackRoF(profile):
 			
 			# player is involved and maintained RoF
-			if (profile['attacker'] == scenario.player_unit or profile['target'] == scenario.player_unit) and profile['weapon'].maintained_rof:
+			if profile['attacker'] == scenario.player_unit or profile['target'] == scenario.player_unit:
 				libtcod.console_print_ex(attack_con, 13, 54, libtcod.BKGND_NONE,
 					libtcod.CENTER, 'Maintained Rate of Fire')
 				
@@ -18770,7 +18830,7 @@ class Scenario:
 				libtcod.CENTER, 'Chance: ' + str(chance) + '%')
 			
 			FlushKeyboardEvents()
-			Wait(120)
+			Wait(120, category='Messages')
 			
 			for i in range(6):
 				roll = GetPercentileRoll()
@@ -18782,7 +18842,7 @@ class Scenario:
 					libtcod.CENTER, '           ')
 				libtcod.console_print_ex(session.msg_con, 15, 15, libtcod.BKGND_NONE,
 					libtcod.CENTER, 'Roll: ' + str(roll))
-				Wait(20)
+				Wait(20, category='Rolls')
 			
 			if roll <= chance:
 				libtcod.console_print_ex(session.msg_con, 15, 17, libtcod.BKGND_NONE,
@@ -18790,7 +18850,7 @@ class Scenario:
 			else:
 				libtcod.console_print_ex(session.msg_con, 15, 17, libtcod.BKGND_NONE,
 					libtcod.CENTER, 'Attempt Failed')
-			Wait(1)
+			Wait(1, category='Messages')
 			
 			if config['ArmCom2'].getboolean('message_prompt'):
 				libtcod.console_print_ex(session.msg_con, 15, 18, libtcod.BKGND_NONE,
@@ -18802,7 +18862,7 @@ class Scenario:
 				FlushKeyboardEvents()
 				# allow the message to be read by the player
 				Wait(180 * config['ArmCom2'].getint('message_pause'),
-					allow_skip=True, ignore_animations=True)
+					allow_skip=True, ignore_animations=True, category='Messages')
 			
 			FlushKeyboardEvents()
 			
@@ -18841,7 +18901,7 @@ class Scenario:
 					campaign_day.air_support_level -= float(libtcod.random_get_int(0, 1, 3)) * 5.0
 					if campaign_day.air_support_level < 0.0:
 						campaign_day.air_support_level = 0.0
-					self.DoAirAttack(requested_attack=True)
+					RunInRNGStream('Combat', self.DoAirAttack, requested_attack=True)
 		
 		# check for artillery attack, also not in friendly zone
 		if campaign_day.arty_support_request and not self.cd_map_hex.controlled_by == 0:
@@ -18849,7 +18909,7 @@ class Scenario:
 				campaign_day.arty_support_level -= float(libtcod.random_get_int(0, 1, 3)) * 5.0
 				if campaign_day.arty_support_level < 0.0:
 					campaign_day.arty_support_level = 0.0
-				self.DoArtilleryAttack()
+				RunInRNGStream('Combat', self.DoArtilleryAttack)
 		
 		# check for Steam achivement
 		surviving_enemy_units = 0
@@ -19033,7 +19093,7 @@ class Scenario:
 				
 				if GetPercentileRoll() <= chance:
 					ShowMessage('Attacking enemy forces have brought air support!', good_news=False)
-					self.DoAirAttack(player_target=True)
+					RunInRNGStream('Combat', self.DoAirAttack, player_target=True)
 			
 			# possible enemy artillery attack
 			if 'enemy_arty_support' in campaign.stats:
@@ -19056,7 +19116,161 @@ class Scenario:
 				
 				if GetPercentileRoll() <= chance:
 					ShowMessage('Attacking enemy forces have brought artillery support!', good_news=False)
-					self.DoArtilleryAttack(player_target=True)
+					RunInRNGStream('Combat', self.DoArtilleryAttack, player_target=True)
+	
+	
+	# roll for the effect of one air attack on a target without displaying anything or applying it
+	# returns a result, one of 'miss', 'revealed', 'critical fp', 'fp', 'hit', 'near miss', 'destroyed',
+	# 'no penetration', or 'penetrated', and the FP to be applied to the target if any
+	def RollAirAttackHit(self, plane, weapon, target):
+		
+		# MG attack
+		if weapon.stats['type'] == 'MG':
+			
+			# calculate base FP and base effect chance
+			fp = int(weapon.GetStat('fp'))
+			
+			if target.GetStat('category') == 'Vehicle':
+				chance = VEH_FP_BASE_CHANCE
+			else:
+				chance = INF_FP_BASE_CHANCE
+			for i in range(2, fp + 1):
+				chance += FP_CHANCE_STEP * (FP_CHANCE_STEP_MOD ** (i-1)) 
+			chance = round(chance, 1)
+			
+			if not target.spotted:
+				chance -= 30.0
+			if target.GetStat('category') == 'Infantry' and target.moving:
+				chance += chance * 1.5
+			if target.fortified:
+				chance -= 50.0
+			elif target.entrenched:
+				chance -= 20.0
+			elif target.dug_in:
+				chance -= 10.0
+			
+			chance = round(chance, 1)
+			roll = GetPercentileRoll()
+			if roll <= 3.0:
+				return ('critical fp', fp * 2)
+			elif roll <= chance:
+				return ('fp', fp)
+			return ('miss', 0)
+		
+		# bombs, rockets, or cannon
+		if weapon.GetStat('type') == 'Cannon':
+			calibre = int(weapon.GetStat('calibre'))
+			if calibre <= 30:
+				effective_fp = 8
+			elif calibre <= 75:
+				effective_fp = 12
+			else:
+				effective_fp = 16
+		else:
+		
+			# determine effective fp
+			for (calibre, effective_fp) in HE_FP_EFFECT:
+				if calibre <= int(weapon.stats['calibre']):
+					break
+		
+		# calculate basic to-hit score required
+		if not target.spotted:
+			chance = PF_BASE_CHANCE[0][1]
+		else:
+			if target.GetStat('category') == 'Vehicle':
+				chance = PF_BASE_CHANCE[0][0]
+			else:
+				chance = PF_BASE_CHANCE[0][1]
+	
+		# target size modifier
+		size_class = target.GetStat('size_class')
+		if size_class is not None:
+			if size_class != 'Normal':
+				chance += PF_SIZE_MOD[size_class]
+		
+		# smoke or dust modifier
+		if target.smoke >= 2:
+			chance -= 30.0
+		elif target.dust >= 2:
+			chance -= 20.0
+		elif target.smoke == 1:
+			chance -= 15.0
+		elif target.dust == 1:
+			chance -= 10.0
+		
+		# bombs are less accurate
+		if weapon.stats['type'] == 'Ordinance':
+			chance = round(chance * 0.5, 1)
+		chance = RestrictChance(chance)
+		roll = GetPercentileRoll()
+		
+		# chance that a miss will still reveal a concealed unit
+		if roll > chance:
+			if GetPercentileRoll() <= MISSED_FP_REVEAL_CHANCE:
+				return ('revealed', 0)
+			return ('miss', 0)
+		
+		# roll for direct hit / near miss
+		direct_hit = False
+		chance = DIRECT_HIT_CHANCE
+		if weapon.stats['type'] in ['Rockets', 'Cannon']:
+			chance += 15.0
+		roll = GetPercentileRoll()
+		if roll <= chance:
+			direct_hit = True
+		else:
+			effective_fp = int(effective_fp / 2)
+		
+		# infantry, cavalry, or gun target
+		if target.GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
+			if direct_hit:
+				return ('destroyed', 0)
+			return ('near miss', effective_fp)
+		
+		if target.GetStat('category') != 'Vehicle':
+			return ('hit', 0)
+		
+		# vehicle target, near miss only applies FP if not a bomb or a rocket
+		if not direct_hit and weapon.stats['type'] not in ['Ordinance', 'Rockets']:
+			return ('near miss', effective_fp)
+		
+		# direct hit: unarmoured and open topped vehicles destroyed
+		if direct_hit and (target.GetStat('armour') is None or target.GetStat('open_topped') is not None):
+			return ('destroyed', 0)
+		
+		# armoured vehicle target
+		# create an attack profile for the AP calculation
+		profile = AttackProfile(plane, weapon, target)
+		if weapon.stats['name'] in ['Bombs', 'Rockets']:
+			profile['ammo_type'] = 'HE'
+		else:
+			profile['ammo_type'] = weapon.stats['ammo_type_list'][0]	
+		
+		if direct_hit:
+			profile['result'] = 'CRITICAL HIT'
+		else:
+			profile['result'] = 'HIT'
+		
+		profile['ballistic_attack'] = False
+		if weapon.stats['name'] == 'Bombs':
+			profile['ballistic_attack'] = True
+		
+		# determine location hit
+		if profile['ballistic_attack']:
+			chance = 30.0
+		else:
+			chance = 50.0
+		if GetPercentileRoll() <= chance:
+			profile['location'] = 'Hull'
+		else:
+			profile['location'] = 'Turret'
+		
+		profile = self.CalcAP(profile, air_attack=True)
+		
+		# do AP roll
+		if GetPercentileRoll() > profile['final_chance']:
+			return ('no penetration', 0)
+		return ('penetrated', 0)
 	
 	
 	# resolve an air support attack
@@ -19254,6 +19468,10 @@ class Scenario:
 		
 		results = False
 		
+		# seed for the stream used to roll the effect of each attack
+		attack_seed = libtcod.random_get_int(0, 0, 2147483647)
+		attack_num = 0
+		
 		# do each plane attack seperately, select and resolve each attack
 		for unit in plane_unit_list:
 			
@@ -19386,227 +19604,85 @@ class Scenario:
 					attack_finished = True
 					continue
 				
-				# do attack roll
-				if weapon.stats['type'] == 'MG':
-					
-					# calculate base FP and base effect chance
-					fp = int(weapon.GetStat('fp'))
-					
-					if target.GetStat('category') == 'Vehicle':
-						chance = VEH_FP_BASE_CHANCE
+				# roll for the effect of the attack using a seeded stream, then apply it
+				(result, fp) = RunSeeded(attack_seed + attack_num, self.RollAirAttackHit, unit, weapon, target)
+				attack_num += 1
+				
+				# miss, may still pin the target or reveal a concealed unit
+				if result in ['miss', 'revealed']:
+					if weapon.stats['type'] == 'MG':
+						target.PinTest(4)
 					else:
-						chance = INF_FP_BASE_CHANCE
-					for i in range(2, fp + 1):
-						chance += FP_CHANCE_STEP * (FP_CHANCE_STEP_MOD ** (i-1)) 
-					chance = round(chance, 1)
-					
-					if not target.spotted:
-						chance -= 30.0
-					if target.GetStat('category') == 'Infantry' and target.moving:
-						chance += chance * 1.5
-					if target.fortified:
-						chance -= 50.0
-					elif target.entrenched:
-						chance -= 20.0
-					elif target.dug_in:
-						chance -= 10.0
-					
-					chance = round(chance, 1)
-					roll = GetPercentileRoll()
-					if roll <= 3.0:
-						results = True
-						target.fp_to_resolve += (fp * 2)
-						target.hit_by_fp = True
-						target.ResolveFP()
+						target.PinTest(8)
+						if result == 'revealed':
+							target.hit_by_fp = True
+				
+				# MG hit
+				elif result in ['critical fp', 'fp']:
+					results = True
+					target.fp_to_resolve += fp
+					target.hit_by_fp = True
+					RunInRNGStream('Combat', target.ResolveFP)
+					if result == 'critical fp':
 						continue_attack_mod += 15.0
-					elif roll <= chance:
-						results = True
-						target.fp_to_resolve += fp
-						target.hit_by_fp = True
-						target.ResolveFP()
+					else:
 						continue_attack_mod += 5.0
+				
+				# direct hit: destroyed
+				elif result == 'destroyed':
+					results = True
+					if target == scenario.player_unit:
+						text = 'You were'
 					else:
-						target.PinTest(4)
+						text = target.GetName() + ' was'
+					if target.GetStat('category') == 'Vehicle':
+						text += ' destroyed by a direct hit from the air attack.'
+						continue_attack_mod += 20.0
+					else:
+						text += ' destroyed by a direct hit from the air attack!'
+						continue_attack_mod += 15.0
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+					target.DestroyMe(dest_unit=unit, cause='Air Attack')
 				
-				# bombs, rockets, or cannon
-				else:
-					
-					if weapon.GetStat('type') == 'Cannon':
-						calibre = int(weapon.GetStat('calibre'))
-						if calibre <= 30:
-							effective_fp = 8
-						elif calibre <= 75:
-							effective_fp = 12
-						else:
-							effective_fp = 16
+				# near miss, or hit on a vehicle by a cannon
+				elif result == 'near miss':
+					results = True
+					target.fp_to_resolve += fp
+					target.hit_by_fp = True
+					if target == scenario.player_unit:
+						text = 'You were'
 					else:
-					
-						# determine effective fp
-						for (calibre, effective_fp) in HE_FP_EFFECT:
-							if calibre <= int(weapon.stats['calibre']):
-								break
-					
-					# calculate basic to-hit score required
-					if not target.spotted:
-						chance = PF_BASE_CHANCE[0][1]
+						text = target.GetName() + ' was'
+					text += ' hit by the air attack.'
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+					RunInRNGStream('Combat', target.ResolveFP)
+					continue_attack_mod += 10.0
+				
+				# armoured vehicle target, no penetration
+				elif result == 'no penetration':
+					results = True
+					if target == scenario.player_unit:
+						text = 'You were'
 					else:
-						if target.GetStat('category') == 'Vehicle':
-							chance = PF_BASE_CHANCE[0][0]
-						else:
-							chance = PF_BASE_CHANCE[0][1]
-				
-					# target size modifier
-					size_class = target.GetStat('size_class')
-					if size_class is not None:
-						if size_class != 'Normal':
-							chance += PF_SIZE_MOD[size_class]
-					
-					# smoke or dust modifier
-					if target.smoke >= 2:
-						chance -= 30.0
-					elif target.dust >= 2:
-						chance -= 20.0
-					elif target.smoke == 1:
-						chance -= 15.0
-					elif target.dust == 1:
-						chance -= 10.0
-					
-					# bombs are less accurate
-					if weapon.stats['type'] == 'Ordinance':
-						chance = round(chance * 0.5, 1)
-					chance = RestrictChance(chance)
-					roll = GetPercentileRoll()
-					
-					# chance that a miss will still reveal a concealed unit
-					if roll > chance:
-						target.PinTest(8)
-						if GetPercentileRoll() <= MISSED_FP_REVEAL_CHANCE:
-							target.hit_by_fp = True
+						text = target.GetName() + ' was'
+					text += ' unaffected by the air attack'
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+				
+				# armoured vehicle target, penetrated
+				elif result == 'penetrated':
+					results = True
+					if target == scenario.player_unit:
+						text = 'Your vehicle was'
 					else:
-						
-						# hit
-						results = True
-						
-						# roll for direct hit / near miss
-						direct_hit = False
-						chance = DIRECT_HIT_CHANCE
-						if weapon.stats['type'] in ['Rockets', 'Cannon']:
-							chance += 15.0
-						roll = GetPercentileRoll()
-						if roll <= chance:
-							direct_hit = True
-						else:
-							effective_fp = int(effective_fp / 2)
-						
-						# infantry, cavalry, or gun target
-						if target.GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
-							
-							# direct hit: destroyed
-							if direct_hit:
-								if target == scenario.player_unit:
-									text = 'You were'
-								else:
-									text = target.GetName() + ' was'
-								text += ' destroyed by a direct hit from the air attack!'
-								ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-								target.DestroyMe()
-								continue_attack_mod += 15.0
-							
-							# near miss
-							else:
-							
-								target.fp_to_resolve += effective_fp
-								target.hit_by_fp = True
-								if target == scenario.player_unit:
-									text = 'You were'
-								else:
-									text = target.GetName() + ' was'
-								text += ' hit by the air attack.'
-								ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-								target.ResolveFP()
-								continue_attack_mod += 10.0
-						
-						# vehicle target
-						elif target.GetStat('category') == 'Vehicle':
-							
-							# near miss - only applies FP if not a bomb or a rocket
-							if not direct_hit and weapon.stats['type'] not in ['Ordinance', 'Rockets']:
-								target.fp_to_resolve += effective_fp
-								target.hit_by_fp = True
-								if target == scenario.player_unit:
-									text = 'You were'
-								else:
-									text = target.GetName() + ' was'
-								text += ' hit by the air attack.'
-								ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-								target.ResolveFP()
-								continue_attack_mod += 10.0
-							
-							# direct hit: unarmoured and open topped vehicles destroyed
-							elif direct_hit and (target.GetStat('armour') is None or target.GetStat('open_topped') is not None):
-								if target == scenario.player_unit:
-									text = 'You were'
-								else:
-									text = target.GetName() + ' was'
-								text += ' destroyed by a direct hit from the air attack.'
-								ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-								target.DestroyMe()
-								continue_attack_mod += 20.0
-							
-							else:
-							
-								# armoured vehicle target
-								# create an attack profile for the AP calculation
-								profile = {}
-								profile['attacker'] = unit
-								profile['weapon'] = weapon
-								profile['overrun'] = False
-								if weapon.stats['name'] in ['Bombs', 'Rockets']:
-									profile['ammo_type'] = 'HE'
-								else:
-									profile['ammo_type'] = weapon.stats['ammo_type_list'][0]	
-								profile['target'] = target
-								
-								if direct_hit:
-									profile['result'] = 'CRITICAL HIT'
-								else:
-									profile['result'] = 'HIT'
-								
-								profile['ballistic_attack'] = False
-								if weapon.stats['name'] == 'Bombs':
-									profile['ballistic_attack'] = True
-								
-								# determine location hit
-								if profile['ballistic_attack']:
-									chance = 30.0
-								else:
-									chance = 50.0
-								if GetPercentileRoll() <= chance:
-									profile['location'] = 'Hull'
-								else:
-									profile['location'] = 'Turret'
-								
-								profile = self.CalcAP(profile, air_attack=True)
-								
-								# do AP roll
-								if GetPercentileRoll() > profile['final_chance']:
-									if target == scenario.player_unit:
-										text = 'You were'
-									else:
-										text = target.GetName() + ' was'
-									text += ' unaffected by the air attack'
-									ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-								else:
-								
-									# penetrated
-									if target == scenario.player_unit:
-										text = 'Your vehicle was'
-									else:
-										text = target.GetName() + ' was'
-									text += ' knocked out by the air attack.'
-									ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-									target.DestroyMe()
-									continue_attack_mod += 20.0
+						text = target.GetName() + ' was'
+					text += ' knocked out by the air attack.'
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+					target.DestroyMe(dest_unit=unit, cause='Air Attack')
+					continue_attack_mod += 20.0
+				
+				# hit with no further effect
+				else:
+					results = True
 				
 				# increase Steam stat if appropriate
 				if not player_target and not friendly_fire and not target.alive:
@@ -19636,6 +19712,95 @@ class Scenario:
 		libtcod.console_flush()
 		
 
+	# roll for the effect of an artillery attack on each unit in a list without displaying anything
+	# returns a list of (target, result, profile) tuples, where result is one of 'miss', 'revealed', 'hit',
+	# 'near miss', 'destroyed', 'no penetration', or 'penetrated'; profile is the AP profile if any
+	def RollArtilleryHits(self, gun_unit, target_list, effective_fp, skill_mod, soft_target_mod, naval_attack):
+		
+		# calculate base effect chance, the same for every target in the same category
+		base_chance = {}
+		for (category, chance) in [('Vehicle', VEH_FP_BASE_CHANCE), ('Other', INF_FP_BASE_CHANCE)]:
+			for i in range(2, effective_fp + 1):
+				chance += FP_CHANCE_STEP * (FP_CHANCE_STEP_MOD ** (i-1))
+			base_chance[category] = RestrictChance(round(chance * 0.5, 1)) + skill_mod
+		
+		hit_list = []
+		for target in target_list:
+			
+			category = target.GetStat('category')
+			if category == 'Vehicle':
+				chance = base_chance['Vehicle']
+			else:
+				chance = base_chance['Other']
+			
+			# apply campaign skill modifier if any
+			if category in ['Infantry', 'Cavalry', 'Gun']:
+				chance += soft_target_mod
+			
+			roll = GetPercentileRoll()
+			
+			# naval bombardment allows a re-roll
+			if roll > chance and naval_attack:
+				roll = GetPercentileRoll()
+			
+			# no effect, chance that a miss will still reveal a concealed unit
+			if roll > chance:
+				if GetPercentileRoll() <= MISSED_FP_REVEAL_CHANCE:
+					hit_list.append((target, 'revealed', None))
+				else:
+					hit_list.append((target, 'miss', None))
+				continue
+			
+			# roll for direct hit / near miss
+			direct_hit = False
+			if GetPercentileRoll() <= DIRECT_HIT_CHANCE:
+				direct_hit = True
+			
+			if category in ['Infantry', 'Cavalry', 'Gun']:
+				if direct_hit:
+					hit_list.append((target, 'destroyed', None))
+				else:
+					hit_list.append((target, 'near miss', None))
+				continue
+			
+			elif category != 'Vehicle':
+				hit_list.append((target, 'hit', None))
+				continue
+			
+			if not direct_hit:
+				hit_list.append((target, 'near miss', None))
+				continue
+			
+			# unarmoured and open topped vehicles destroyed
+			if target.GetStat('armour') is None or target.GetStat('open_topped') is not None:
+				hit_list.append((target, 'destroyed', None))
+				continue
+			
+			# otherwise, calculate an AP hit on the top armour
+			# create an attack profile for the AP calculation
+			gun_unit.hx = target.hx
+			gun_unit.hy = target.hy+4
+			profile = AttackProfile(gun_unit, gun_unit.weapon_list[0], target, ammo_type='HE')
+			profile['result'] = 'CRITICAL HIT'
+			profile['ballistic_attack'] = True
+			
+			# determine location hit
+			if GetPercentileRoll() <= 50.0:
+				profile['location'] = 'Hull'
+			else:
+				profile['location'] = 'Turret'
+			
+			profile = self.CalcAP(profile)
+			
+			# do AP roll
+			if GetPercentileRoll() > profile['final_chance']:
+				hit_list.append((target, 'no penetration', profile))
+			else:
+				hit_list.append((target, 'penetrated', profile))
+		
+		return hit_list
+	
+	
 	# resolve an artillery attack
 	# if player_target is true, the player squad is the target of an enemy attack
 	# if friendly_fire is true, attack is against target's own forces
@@ -19817,71 +19982,71 @@ class Scenario:
 			if campaign.player_unit.CrewmanHasSkill(COMMANDER_POSITIONS, 'Combined Bombardment'):
 				soft_target_mod = 25.0
 		
-		# roll for possible hit against each unit in each target hex
-		results = False
+		# gather every unit in the target hexes, then roll for possible hits against all of them at once
+		# using a seeded stream, so results don't depend on the animations and messages that follow
+		target_list = []
 		for map_hex in target_hex_list:
 			for target in map_hex.unit_stack:
 				if not target.alive: continue
+				target_list.append(target)
+		hit_list = RunSeeded(libtcod.random_get_int(0, 0, 2147483647), self.RollArtilleryHits, gun_unit,
+			target_list, effective_fp, skill_mod, soft_target_mod, naval_attack)
+		
+		# display and apply the results
+		results = False
+		for (target, result, profile) in hit_list:
+			if not target.alive: continue
+			
+			# no effect, but a miss may still reveal a concealed unit
+			if result in ['miss', 'revealed']:
+				if result == 'revealed':
+					target.hit_by_fp = True
+				continue
+			
+			results = True
+			
+			# move target unit to top of hex stack and update screen
+			target.MoveToTopOfStack()
+			self.UpdateUnitCon()
+			self.UpdateScenarioDisplay()
+			
+			# set artillery location on map
+			gun_unit.hx = target.hx
+			gun_unit.hy = target.hy+4
+			
+			# infantry, cavalry, or gun target hit
+			if target.GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
 				
-				# calculate base effect chance
-				if target.GetStat('category') == 'Vehicle':
-					chance = VEH_FP_BASE_CHANCE
-				else:
-					chance = INF_FP_BASE_CHANCE
-				for i in range(2, effective_fp + 1):
-					chance += FP_CHANCE_STEP * (FP_CHANCE_STEP_MOD ** (i-1)) 
-				
-				chance = RestrictChance(round(chance * 0.5, 1))
-				
-				# apply campaign skill modifiers if any
-				chance += skill_mod
-				if target.GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
-					chance += soft_target_mod
-				
-				roll = GetPercentileRoll()
-				
-				# naval bombardment allows a re-roll
-				if roll > chance and naval_attack:
-					roll = GetPercentileRoll()
-				
-				# no effect
-				if roll > chance:
-					# chance that a miss will still reveal a concealed unit
-					if GetPercentileRoll() <= MISSED_FP_REVEAL_CHANCE:
-						target.hit_by_fp = True
+				# direct hit: destroyed
+				if result == 'destroyed':
+					if target == scenario.player_unit:
+						text = 'You were'
+					else:
+						text = target.GetName() + ' was'
+					text += ' destroyed by a direct hit from the artillery attack.'
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+					target.DestroyMe(dest_unit=gun_unit, cause='Artillery')
 					continue
 				
-				results = True
-				
-				# move target unit to top of hex stack and update screen
-				target.MoveToTopOfStack()
-				self.UpdateUnitCon()
-				self.UpdateScenarioDisplay()
+				# near miss
+				target.fp_to_resolve += effective_fp
+				target.hit_by_fp = True
 				
-				# set artillery location on map
-				gun_unit.hx = target.hx
-				gun_unit.hy = target.hy+4
+				if target == scenario.player_unit:
+					text = 'You were'
+				else:
+					text = target.GetName() + ' was'
+				text += ' hit by artillery attack.'
+				ShowMessage(text, scenario_highlight=(target.hx, target.hy))
 				
-				# roll for direct hit / near miss
-				direct_hit = False
-				if GetPercentileRoll() <= DIRECT_HIT_CHANCE:
-					direct_hit = True
+				RunInRNGStream('Combat', target.ResolveFP)
+			
+			# vehicle hit
+			elif target.GetStat('category') == 'Vehicle':
 				
-				# infantry, cavalry, or gun target hit
-				if target.GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
-					
-					# direct hit: destroyed
-					if direct_hit:
-						if target == scenario.player_unit:
-							text = 'You were'
-						else:
-							text = target.GetName() + ' was'
-						text += ' destroyed by a direct hit from the artillery attack.'
-						ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-						target.DestroyMe()
-						continue
+				# near miss - only applies FP
+				if result == 'near miss':
 					
-					# near miss
 					target.fp_to_resolve += effective_fp
 					target.hit_by_fp = True
 					
@@ -19889,113 +20054,71 @@ class Scenario:
 						text = 'You were'
 					else:
 						text = target.GetName() + ' was'
-					text += ' hit by artillery attack.'
+					text += ' nearly hit by the artillery attack.'
 					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
 					
-					target.ResolveFP()
-				
-				# vehicle hit
-				elif target.GetStat('category') == 'Vehicle':
-					
-					# near miss - only applies FP
-					if not direct_hit:
-						
-						target.fp_to_resolve += effective_fp
-						target.hit_by_fp = True
-						
-						if target == scenario.player_unit:
-							text = 'You were'
-						else:
-							text = target.GetName() + ' was'
-						text += ' nearly hit by the artillery attack.'
-						ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-						
-						target.ResolveFP()
-						
-						# player crewmen might be shaken by attack
-						if target == scenario.player_unit:
-							for position in target.positions_list:
-								if position.crewman is None: continue
-								if position.crewman.condition != 'Good Order': continue
-								if position.crewman.DoMoraleCheck(-10): continue
-								position.crewman.condition = 'Shaken'
-								ShowMessage('The nearby explosion has shaken your crewman:',
-									crewman=position.crewman, good_news=False)
-						
-						continue
-					
-					# direct hit
-					
-					# unarmoured and open topped vehicles destroyed
-					if target.GetStat('armour') is None or target.GetStat('open_topped') is not None:
-						if target == scenario.player_unit:
-							text = 'You were'
-						else:
-							text = target.GetName() + ' was'
-						text += ' destroyed by a direct hit from the artillery attack.'
-						ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-						target.DestroyMe()
-						continue
-					
-					# otherwise, calculate an AP hit on the top armour
-					# create an attack profile for the AP calculation
-					profile = {}
-					profile['attacker'] = gun_unit
-					profile['weapon'] = gun_unit.weapon_list[0]
-					profile['ammo_type'] = 'HE'
-					profile['target'] = target
-					profile['result'] = 'CRITICAL HIT'
-					profile['ballistic_attack'] = True
-					profile['overrun'] = False
-					
-					# determine location hit
-					if GetPercentileRoll() <= 50.0:
-						profile['location'] = 'Hull'
-					else:
-						profile['location'] = 'Turret'
-					
-					profile = self.CalcAP(profile)
-												
-					# do AP roll
-					roll = GetPercentileRoll()
+					RunInRNGStream('Combat', target.ResolveFP)
 					
-					# no penetration
-					if roll > profile['final_chance']:
-						if target == scenario.player_unit:
-							text = 'You were hit by the artillery attack but your tank was not damaged.'
-						else:
-							text = target.GetName() + ' was hit by the artillery attack but remains unharmed.'
-						ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-						
-						# calculate and apply effective FP
-						profile = gun_unit.CalcHEEffectiveFP(profile)
-						target.fp_to_resolve += profile['effective_fp']
-						target.hit_by_fp = True
-						target.ResolveFP()
-						
-						# player crew may get shaken by the impact
-						if target == scenario.player_unit:
-							for position in target.positions_list:
-								if position.crewman is None: continue
-								if position.crewman.condition != 'Good Order': continue
-								if position.crewman.DoMoraleCheck(-50): continue
-								position.crewman.condition = 'Shaken'
-								ShowMessage('The impact has shaken your crewman:',
-									crewman=position.crewman, good_news=False)
-						
-						continue
+					# player crewmen might be shaken by attack
+					if target == scenario.player_unit:
+						for position in target.positions_list:
+							if position.crewman is None: continue
+							if position.crewman.condition != 'Good Order': continue
+							if position.crewman.DoMoraleCheck(-10): continue
+							position.crewman.condition = 'Shaken'
+							ShowMessage('The nearby explosion has shaken your crewman:',
+								crewman=position.crewman, good_news=False)
 					
-					# penetrated
+					continue
+				
+				# direct hit: unarmoured and open topped vehicles destroyed
+				if result == 'destroyed':
 					if target == scenario.player_unit:
 						text = 'You were'
 					else:
 						text = target.GetName() + ' was'
-					text += ' destroyed by artillery attack'
+					text += ' destroyed by a direct hit from the artillery attack.'
 					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
-					target.DestroyMe()
+					target.DestroyMe(dest_unit=gun_unit, cause='Artillery')
+					continue
 				
-				if not target.alive:
-					session.ModifySteamStat('dest_air_arty', 1)
+				# direct hit on top armour, no penetration
+				if result == 'no penetration':
+					if target == scenario.player_unit:
+						text = 'You were hit by the artillery attack but your tank was not damaged.'
+					else:
+						text = target.GetName() + ' was hit by the artillery attack but remains unharmed.'
+					ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+					
+					# calculate and apply effective FP
+					profile = gun_unit.CalcHEEffectiveFP(profile)
+					target.fp_to_resolve += profile['effective_fp']
+					target.hit_by_fp = True
+					RunInRNGStream('Combat', target.ResolveFP)
+					
+					# player crew may get shaken by the impact
+					if target == scenario.player_unit:
+						for position in target.positions_list:
+							if position.crewman is None: continue
+							if position.crewman.condition != 'Good Order': continue
+							if position.crewman.DoMoraleCheck(-50): continue
+							position.crewman.condition = 'Shaken'
+							ShowMessage('The impact has shaken your crewman:',
+								crewman=position.crewman, good_news=False)
+					
+					continue
+				
+				# penetrated
+				if target == scenario.player_unit:
+					text = 'You were'
+				else:
+					text = target.GetName() + ' was'
+				text += ' destroyed by artillery attack'
+				ShowMessage(text, scenario_highlight=(target.hx, target.hy))
+				target.DestroyMe(dest_unit=gun_unit, cause='Artillery')
+			
+			if not target.alive:
+				session.ModifySteamStat('dest_air_arty', 1)
 		
 		if not results:
 			ShowMessage('Artillery attack had no effect.')
@@ -20250,7 +20373,7 @@ class Scenario:
 						unit.animation_cells.pop(0)
 				self.UpdateUnitCon()
 				self.UpdateScenarioDisplay()
-				Wait(15)
+				Wait(15, category='Movement')
 			
 			# set new hex location for each moving unit and move into new hex stack
 			for unit in self.units:
@@ -20446,7 +20569,7 @@ class Scenario:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Reposition'): continue
 			
 			# cancel reposition
 			if allow_cancel and (key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1):
@@ -20712,7 +20835,7 @@ class Scenario:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Conceal or Reveal'): continue
 			
 			# cancel action
 			if key.vk in [sdl2.SDLK_BACKSPACE, sdl2.SDLK_ESCAPE] or session.gamepad_input == 1:
@@ -20868,7 +20991,7 @@ class Scenario:
 		exit = False
 		while not exit:
 			libtcod.console_flush()
-			keypress = GetInputEvent()
+			keypress = GetInputEvent(context='Unit Info')
 			if mouse.rbutton_pressed or mouse.lbutton_pressed:
 				mouse.rbutton_pressed = False
 				mouse.lbutton_pressed = False
@@ -20885,16 +21008,16 @@ class Scenario:
 	# advance to next phase/turn and do automatic events
 	def AdvanceToNextPhase(self):
 		
+		if session.replay is not None:
+			session.replay.Checkpoint('Phase')
+		
 		# do end of phase actions for player
 		
 		# end of player turn, switching to enemy turn
 		if self.phase == PHASE_ALLIED_ACTION:
 			
 			# resolve fp on units first
-			for unit in reversed(self.units):
-				if not unit.alive: continue
-				unit.ResolveFP()
-				libtcod.console_flush()
+			RunInRNGStream('Combat', self.ResolveHits, reversed(self.units), resolve_fp=True, resolve_hits=False)
 			
 			self.phase = PHASE_ENEMY_ACTION
 			self.active_player = 1
@@ -20903,10 +21026,7 @@ class Scenario:
 		elif self.phase == PHASE_ENEMY_ACTION:
 			
 			# resolve fp on units first
-			for unit in reversed(self.units):
-				if not unit.alive: continue
-				unit.ResolveFP()
-				libtcod.console_flush()
+			RunInRNGStream('Combat', self.ResolveHits, reversed(self.units), resolve_fp=True, resolve_hits=False)
 			
 			# if units are on overrun, reset their overrun statuses, etc.
 			for unit in self.units:
@@ -21044,10 +21164,7 @@ class Scenario:
 				libtcod.console_flush()
 				
 				# resolve hits on units
-				for unit in reversed(self.units):
-					if not unit.alive: continue
-					unit.ResolveAPHits()
-					unit.ResolveHEHits()
+				RunInRNGStream('Combat', self.ResolveHits, reversed(self.units))
 				
 				# do concealment check for player
 				self.player_unit.DoConcealmentCheck()
@@ -21354,6 +21471,7 @@ class Scenario:
 			ShowTutorialSlide('scenario_allied_phase')
 			
 			self.DoAISpotChecks(0)
+			self.ai_situation = AISituation(self.units)
 			
 			# player squad and allies act
 			unit_list = []
@@ -21378,16 +21496,15 @@ class Scenario:
 				self.UpdateUnitCon()
 				self.UpdateScenarioDisplay()
 				libtcod.console_flush()
-				unit.ai.DoActivation()
+				activation_start = time.perf_counter()
+				RunInRNGStream('AI', unit.ai.DoActivation)
+				self.RecordTiming('Unit Activation', activation_start)
 				self.UpdateUnitCon()
 				self.UpdateScenarioDisplay()
 				libtcod.console_flush()
 				
 				# resolve any hits caused by this unit
-				for unit2 in self.units:
-					if not unit2.alive: continue
-					unit2.ResolveAPHits()
-					unit2.ResolveHEHits()
+				RunInRNGStream('Combat', self.ResolveHits, self.units)
 				
 				# do concealment check for this unit
 				unit.DoConcealmentCheck()
@@ -21401,6 +21518,7 @@ class Scenario:
 			ShowTutorialSlide('scenario_enemy_phase')
 			
 			self.DoAISpotChecks(1)
+			self.ai_situation = AISituation(self.units)
 			
 			# build list of enemy units to activate
 			unit_list = []
@@ -21425,16 +21543,15 @@ class Scenario:
 				unit.ResetForNewTurn()
 				unit.DoRecoveryRoll()
 				unit.CalculateMoveChances()
-				unit.ai.DoActivation()
+				activation_start = time.perf_counter()
+				RunInRNGStream('AI', unit.ai.DoActivation)
+				self.RecordTiming('Unit Activation', activation_start)
 				scenario.UpdateUnitCon()
 				scenario.UpdateScenarioDisplay()
 				libtcod.console_flush()
 				
 				# resolve any hits caused by this unit
-				for unit2 in self.units:
-					if not unit2.alive: continue
-					unit2.ResolveAPHits()
-					unit2.ResolveHEHits()
+				RunInRNGStream('Combat', self.ResolveHits, self.units)
 
 				unit.DoConcealmentCheck()
 				libtcod.console_flush()
@@ -21721,6 +21838,32 @@ class Scenario:
 				if result == '':
 					libtcod.console_set_default_foreground(context_con, libtcod.light_blue)
 					libtcod.console_print(context_con, 0, 9, 'Ready to fire!')
+					
+					# display chance of success, and of penetration if any
+					profile = self.CalcAttack(scenario.player_unit, weapon, weapon.selected_target)
+					if profile is not None:
+						outcomes = CalcAttackOutcomes(profile)
+						chance = 100.0
+						for text in ['MISS', 'NO EFFECT', 'HULL DOWN SAVED']:
+							if text in outcomes:
+								chance -= outcomes[text]
+						if profile['type'] in ['Area Fire', 'Flame Thrower'] or profile['ammo_type'] == 'HE':
+							text = 'Effect'
+						else:
+							text = 'Hit'
+						libtcod.console_set_default_foreground(context_con, libtcod.white)
+						libtcod.console_print_ex(context_con, 17, 4, libtcod.BKGND_NONE,
+							libtcod.RIGHT, text)
+						libtcod.console_set_default_foreground(context_con, libtcod.light_grey)
+						libtcod.console_print_ex(context_con, 17, 5, libtcod.BKGND_NONE,
+							libtcod.RIGHT, str(round(chance, 1)) + '%')
+						if 'PENETRATED' in outcomes:
+							libtcod.console_set_default_foreground(context_con, libtcod.white)
+							libtcod.console_print_ex(context_con, 17, 6, libtcod.BKGND_NONE,
+								libtcod.RIGHT, 'Pen')
+							libtcod.console_set_default_foreground(context_con, libtcod.light_grey)
+							libtcod.console_print_ex(context_con, 17, 7, libtcod.BKGND_NONE,
+								libtcod.RIGHT, str(round(outcomes['PENETRATED'], 1)) + '%')
 				# attack is not fine
 				else:
 					lines = wrap(result, 18)
@@ -22495,6 +22638,22 @@ class Scenario:
 					for (x,y) in line[2:-1]:
 						libtcod.console_put_char_ex(gui_con, x, y, 250, col, libtcod.black)
 		
+		# display threat posed by enemy units to each map hex: total firepower above, best AP score below
+		if DEBUG and session.debug.get('Show Threat Map', False):
+			threat_map = self.GetAISituation().GetThreatMap(1, weapons=True)
+			for (hx, hy), threat in threat_map.items():
+				if GetHexDistance(0, 0, hx, hy) > 3: continue
+				(x,y) = self.PlotHex(hx, hy)
+				if threat['fp'] > 0:
+					libtcod.console_set_default_foreground(gui_con, libtcod.light_red)
+					libtcod.console_print_ex(gui_con, x, y-2, libtcod.BKGND_NONE, libtcod.CENTER,
+						str(threat['fp']))
+				if threat['ap'] > 0:
+					libtcod.console_set_default_foreground(gui_con, libtcod.light_blue)
+					libtcod.console_print_ex(gui_con, x, y+2, libtcod.BKGND_NONE, libtcod.CENTER,
+						str(threat['ap']))
+			libtcod.console_set_default_foreground(gui_con, libtcod.white)
+		
 		# for AISpy
 		if highlight_covered_hexes is not None:
 			for (hx, hy) in highlight_covered_hexes:
@@ -23207,14 +23366,14 @@ class Scenario:
 			
 			# try and generate enemy units
 			no_units_here = False
-			if not self.SpawnEnemyUnits():
+			if not RunInRNGStream('Spawn', self.SpawnEnemyUnits):
 				no_units_here = True
 			
 			# generate Rescue units if any
 			rescue_unit = None
 			if self.cd_map_hex.objective is not None:
 				if self.cd_map_hex.objective['type'] == 'Rescue':
-					rescue_unit = self.SpawnFriendlyReinforcements(rescue_spawn=True)
+					rescue_unit = RunInRNGStream('Spawn', self.SpawnFriendlyReinforcements, rescue_spawn=True)
 			
 			# apply effects from advancing fire if any
 			if self.cd_map_hex.controlled_by != 0 and self.advancing_fire:
@@ -23260,7 +23419,7 @@ class Scenario:
 		session.weather_anim_timer = time.time()
 		
 		# init looping animations
-		self.InitAnimations()
+		RunInRNGStream('Cosmetic', self.InitAnimations)
 		
 		# generate consoles and draw scenario screen for first time
 		self.UpdateContextCon()
@@ -23273,7 +23432,7 @@ class Scenario:
 		self.UpdateCmdCon()
 		self.UpdateUnitCon()
 		self.UpdateGuiCon()
-		self.UpdateAnimCon()
+		RunInRNGStream('Cosmetic', self.UpdateAnimCon)
 		self.UpdateHexmapCon()
 		
 		# draw the final display, but skip blitting to screen if we're still setting up the scenario
@@ -23311,7 +23470,7 @@ class Scenario:
 					0, window_x+int(x1), window_y+int(y1))
 				DrawFrame(0, window_x+int(x1), window_y+int(y1), int(x2-x1),
 					int(y2-y1))
-				Wait(3, ignore_animations=True)
+				Wait(3, ignore_animations=True, category='Transitions')
 			
 			# clear the root console
 			libtcod.console_clear(0)
@@ -23405,6 +23564,9 @@ class Scenario:
 		exit_scenario = False
 		while not exit_scenario:
 			
+			# time each phase and turn
+			self.UpdatePhaseTiming()
+			
 			# check for exiting game
 			if session.exiting:
 				return
@@ -23442,7 +23604,7 @@ class Scenario:
 			
 			CheckForAnimationUpdate()
 			libtcod.console_flush()
-			input_event = GetInputEvent()
+			input_event = GetInputEvent(context='Scenario')
 			
 			##### Mouse Commands #####
 			
@@ -24016,13 +24178,10 @@ class Scenario:
 						
 						ShowMessage(unit.GetName() + ' attempts to engage in defensive fire!')
 						
-						unit.ai.DoActivation(defensive_fire=True)
+						RunInRNGStream('AI', unit.ai.DoActivation, defensive_fire=True)
 					
 					# resolve any hits from defensive fire
-					for unit in target_list:
-						unit.ResolveFP()
-						unit.ResolveAPHits()
-						unit.ResolveHEHits()
+					RunInRNGStream('Combat', self.ResolveHits, target_list, resolve_fp=True)
 					
 					# return player to top of unit stack if needed
 					self.player_unit.MoveToTopOfStack()
@@ -24193,7 +24352,7 @@ class Scenario:
 					attempt_immobilize = False
 					if key_char == 'i' or session.gamepad_input == 1:
 						attempt_immobilize = True
-					result = scenario.player_unit.Attack(scenario.selected_weapon,
+					result = RunInRNGStream('Combat', scenario.player_unit.Attack, scenario.selected_weapon,
 						scenario.selected_weapon.selected_target,
 						attempt_immobilize=attempt_immobilize)
 					if result:
@@ -24327,6 +24486,34 @@ class Session:
 		self.msg_con = None
 		self.msg_location = None
 		
+		# cache of generated campaign day zone images from the last map redraw
+		self.cd_zone_tiles = {}
+		
+		# pool of pre-generated campaign day map zones, keyed by campaign map seed, map key, and index
+		self.cd_map_pool = {}
+		
+		# table of base AP scores, keyed by unit type, weapon name, ammo type, and unarmoured location
+		self.ap_base_scores = {}
+		
+		# resolve hits on all units in one pass without displaying them, eg. for headless play
+		self.batch_resolution = False
+		# maximum time in seconds that an AI unit will spend scoring possible actions, or None for no limit
+		self.ai_time_budget = AI_DECISION_TIME_BUDGET
+		# autopilot making decisions for the player in a simulated campaign, if any
+		self.autopilot = None
+		# analytics being collected for a simulated campaign, if any
+		self.analytics = None
+		# campaign random number stream currently in use, if any
+		self.rng_stream = None
+		# percentile roll buffer for each random number stream of the current campaign, and that campaign
+		self.stream_roll_buffers = {}
+		self.stream_roll_buffer_campaign = None
+		# replay log being recorded or played back, if any
+		self.replay = None
+		# generator used to choose sound effects and music tracks, kept apart from the game's random
+		# numbers since sounds are not played in every session
+		self.sound_rng = random.Random()
+		
 		# build list of mod directories and prepare a list of active mods
 		mod_directories = []
 		self.active_mods = []
@@ -24711,12 +24898,12 @@ class Session:
 			
 			elif music_name == 'cd_music':
 				if len(self.cd_music_tracks) == 0: return
-				self.music = mixer.Mix_LoadMUS((choice(self.cd_music_tracks)).encode('ascii'))
+				self.music = mixer.Mix_LoadMUS((self.sound_rng.choice(self.cd_music_tracks)).encode('ascii'))
 				repeat = 0
 			
 			elif music_name == 'scen_music':
 				if len(self.scen_music_tracks) == 0: return
-				self.music = mixer.Mix_LoadMUS((choice(self.scen_music_tracks)).encode('ascii'))
+				self.music = mixer.Mix_LoadMUS((self.sound_rng.choice(self.scen_music_tracks)).encode('ascii'))
 				repeat = 0
 			
 			else:
@@ -24733,6 +24920,14 @@ class Session:
 	# update the stored values for window size and cell display size
 	def UpdateDisplaySize(self):
 		
+		# no window when headless; use the size of the root console instead
+		if HEADLESS:
+			self.window_cell_width = WINDOW_WIDTH
+			self.window_cell_height = WINDOW_HEIGHT
+			self.window_w = WINDOW_WIDTH * 8
+			self.window_h = WINDOW_HEIGHT * 8
+			return
+		
 		self.window_id += 1
 		w, h = ctypes.c_int(), ctypes.c_int()
 		
@@ -24807,6 +25002,7 @@ class Session:
 	def AddMemorial(self, crewman):
 		if crewman is None: return
 		if crewman.alive: return
+		if self.autopilot is not None: return
 		
 		text1 = session.nations[crewman.nation]['rank_names'][str(crewman.rank)]
 		text1 += ' ' + crewman.GetCrewmanName()
@@ -24832,6 +25028,59 @@ class Session:
 			save['graveyard'] = graveyard
 	
 	
+	# return the map hexes for a new campaign day map, taking them from the pool of pre-generated maps
+	# if possible; maps are generated with a seed based on the campaign map seed, map key, and number
+	# of maps of this type used so far, so the result is the same whether or not it was pre-generated
+	def TakeCDMap(self, cd_day):
+		key = cd_day.GetCDMapKey()
+		index = campaign.cd_maps_used.get(key, 0)
+		campaign.cd_maps_used[key] = index + 1
+		pool_key = (campaign.cd_map_seed, key, index)
+		if pool_key in self.cd_map_pool:
+			return self.cd_map_pool.pop(pool_key)
+		return RunSeeded(GetCDMapSeed(pool_key), cd_day.GenerateCDMapZones)
+	
+	
+	# generate one missing map for the pool of campaign day maps that may be needed on the next combat
+	# day, and drop any maps that are no longer needed; returns True if a map was generated
+	def FillCDMapPool(self):
+		if campaign is None: return False
+		key_list = campaign.GetNextDayCDMapKeys()
+		
+		needed_maps = {}
+		for (key, week) in key_list:
+			pool_key = (campaign.cd_map_seed, key, campaign.cd_maps_used.get(key, 0))
+			needed_maps[pool_key] = week
+		for pool_key in list(self.cd_map_pool.keys()):
+			if pool_key not in needed_maps:
+				del self.cd_map_pool[pool_key]
+		
+		for pool_key, week in needed_maps.items():
+			if pool_key in self.cd_map_pool: continue
+			(seed, (region, mission, rattenkrieg, season, coastal_map, terrain_mod), index) = pool_key
+			
+			# set up a stand-in campaign day with this map type, and generate the map in the
+			# campaign week and region that it will be used in
+			cd_day = CampaignDay.__new__(CampaignDay)
+			cd_day.mission = mission
+			cd_day.rattenkrieg = rattenkrieg
+			cd_day.coastal_map = coastal_map
+			cd_day.weather = {'Season' : season}
+			
+			current_week = campaign.current_week
+			current_region = campaign.stats['region']
+			campaign.current_week = week
+			campaign.stats['region'] = region
+			try:
+				self.cd_map_pool[pool_key] = RunSeeded(GetCDMapSeed(pool_key), cd_day.GenerateCDMapZones)
+			finally:
+				campaign.current_week = current_week
+				campaign.stats['region'] = current_region
+			return True
+		
+		return False
+	
+	
 	# try to initialize SDL2 mixer
 	def InitMixer(self):
 		mixer.Mix_Init(mixer.MIX_INIT_OGG)
@@ -25972,6 +26221,7 @@ class Personnel:
 		
 		# check for memorial addition
 		if self.unit.is_player:
+			campaign.crew_kia += 1
 			session.AddMemorial(self)
 		
 		# check for player commander death
@@ -26380,7 +26630,7 @@ class Personnel:
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Crewman'): continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# exit menu
@@ -26571,7 +26821,7 @@ class Personnel:
 		while not exit_menu:
 			
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Increase Stat'): continue
 			key_char = DeKey(chr(key.c).lower())
 			
 			# cancel
@@ -27047,24 +27297,7 @@ class Weapon:
 		
 		# some weapons need a descriptive name generated
 		if 'name' not in self.stats:
-			if self.GetStat('type') == 'Gun':
-				text = self.GetStat('calibre')
-				if self.GetStat('long_range') is not None:
-					text += self.GetStat('long_range')
-				if 'autocannon' in self.stats:
-					text += 'a'
-				self.stats['name'] = text
-				
-			elif self.GetStat('type') == 'Cannon':
-				text = self.GetStat('calibre')
-				self.stats['name'] = text + 'mm Cannon'
-			
-			# high-calibre MG
-			elif self.GetStat('type') in MG_WEAPONS and self.GetStat('calibre') is not None:
-				self.stats['name'] = self.GetStat('type') + '+'
-			
-			else:
-				self.stats['name'] = self.GetStat('type')
+			self.stats['name'] = GetWeaponName(self.stats)
 		
 		# save maximum range as an local int
 		self.max_range = 3
@@ -27148,6 +27381,7 @@ class Weapon:
 		self.broken = False			# weapon has broken and cannot be used
 		self.selected_target = None		# for player unit
 		self.acquired_target = None		# acquired target status and target unit
+		self.rof_chance_cache = None		# state key and cached base RoF chance
 	
 	
 	# check for the value of a stat, return None if stat not present
@@ -27556,44 +27790,64 @@ class Weapon:
 		return True
 		
 	
-	# calculate the odds for maintain RoF with this weapon
-	def GetRoFChance(self):
+	# return a key for the weapon and unit state that the base RoF chance depends on
+	def GetRoFChanceKey(self):
+		ammo_count = None
+		if self.ammo_type is not None and self.ammo_stores is not None:
+			ammo_count = (self.ready_rack.get(self.ammo_type), self.ammo_stores.get(self.ammo_type))
+		flame_ammo = None
+		if self.GetStat('type') == 'Flame Thrower':
+			flame_ammo = self.flame_ammo
+		enemy_rof = None
+		if self.unit.owning_player == 1:
+			enemy_rof = campaign.options['enemy_rof']
+		return (self.jammed, self.broken, self.ammo_type, self.using_rr, ammo_count, flame_ammo,
+			enemy_rof, self.unit.GetAttackModKey())
+	
+	
+	# calculate the part of the RoF chance for this weapon that doesn't depend on the selected target or
+	# on shots already taken, returns the chance and a list of firing crewmen whose skills depend on the
+	# target, or None if RoF is not possible
+	def CalcBaseRoFChance(self):
 		
 		# no RoF for jammed or broken weapons
 		if self.jammed or self.broken:
-			return 0.0
+			return None
 		
 		# enemy unit
 		if self.unit.owning_player == 1:
 			if not campaign.options['enemy_rof'] and self.GetStat('name') != 'Rocket Launcher' and self.GetStat('type') not in MG_WEAPONS:
-				return 0.0
+				return None
 		
 		# no RoF chance if weapon is gun and unit has moved that turn
-		if self.GetStat('type') == 'Gun' and self.unit.moving: return 0.0
+		if self.GetStat('type') == 'Gun' and self.unit.moving: return None
 		
 		# no RoF chance for packed-up gun units
-		if self.unit.GetStat('category') == 'Gun' and not self.unit.deployed: return 0.0
+		if self.unit.GetStat('category') == 'Gun' and not self.unit.deployed: return None
 		
 		# no RoF chance for airplanes, always moving
-		if self.unit.GetStat('category') == 'Airplane': return 0.0
+		if self.unit.GetStat('category') == 'Airplane': return None
 		
 		# some guns are so slow-firing they can never maintain RoF
-		if self.GetStat('rof_na') is not None: return 0.0
+		if self.GetStat('rof_na') is not None: return None
 		
 		# guns must have at least one shell of the current type available
 		if self.GetStat('type') == 'Gun':
 			if self.ammo_type is not None:
 				if self.using_rr:
 					if self.ready_rack[self.ammo_type] == 0:
-						return 0.0
+						return None
 				else:
 					if self.ammo_stores[self.ammo_type] == 0:
-						return 0.0
+						return None
 		
 		# FTR must have fuel remaining
 		if self.GetStat('type') == 'Flame Thrower':
 			if self.flame_ammo == 0:
-				return 0.0
+				return None
+		
+		# firing crewmen with skills that depend on the selected target
+		target_crewmen = []
 		
 		# get base RoF, set default value if none
 		chance = self.GetStat('rof')
@@ -27726,15 +27980,8 @@ class Weapon:
 						if modifier is not None:
 							chance += modifier
 						
-						if self.selected_target is not None:
-							if self.selected_target.moving:
-								modifier = crewman.GetSkillMod('Skeet Shooter', 10.0)
-								if modifier is not None:
-									chance += modifier
-							else:
-								modifier = crewman.GetSkillMod('Time on Target', 10.0)
-								if modifier is not None:
-									chance += modifier
+						# modifiers that depend on the selected target are applied later
+						target_crewmen.append(crewman)
 					
 					elif self.GetStat('name') == 'Flame Thrower':
 						if 'They Call Him Ronson' in crewman.skills:
@@ -27750,6 +27997,44 @@ class Weapon:
 				if self.unit.CrewmanHasSkill(COMMANDER_POSITIONS, 'Superior Firepower'):
 					chance += 25.0
 		
+		return (chance, target_crewmen)
+	
+	
+	# return the base RoF chance for this weapon, using the cached value unless the weapon, its ammo,
+	# its unit or the unit's crew have changed since it was calculated
+	def GetBaseRoFChance(self):
+		key = self.GetRoFChanceKey()
+		if self.rof_chance_cache is not None and self.rof_chance_cache[0] == key:
+			if scenario is not None:
+				scenario.rof_cache_hits += 1
+			return self.rof_chance_cache[1]
+		if scenario is not None:
+			scenario.rof_cache_misses += 1
+		partial = self.CalcBaseRoFChance()
+		self.rof_chance_cache = (key, partial)
+		return partial
+	
+	
+	# calculate the odds for maintain RoF with this weapon
+	def GetRoFChance(self):
+		
+		partial = self.GetBaseRoFChance()
+		if partial is None:
+			return 0.0
+		(chance, target_crewmen) = partial
+		
+		# firing crewman modifiers that depend on the selected target
+		if self.selected_target is not None:
+			for crewman in target_crewmen:
+				if self.selected_target.moving:
+					modifier = crewman.GetSkillMod('Skeet Shooter', 10.0)
+					if modifier is not None:
+						chance += modifier
+				else:
+					modifier = crewman.GetSkillMod('Time on Target', 10.0)
+					if modifier is not None:
+						chance += modifier
+		
 		# acquired target modifiers
 		if self.GetStat('name') != 'Flame Thrower':
 			if self.acquired_target is None:
@@ -27990,6 +28275,7 @@ class Weapon:
 	def ResetMe(self):
 		self.fired = False
 		self.maintained_rof = False
+		self.rof_chance_cache = None
 		self.UpdateCoveredHexes()
 		self.weapon_target_list = []
 	
@@ -28054,6 +28340,385 @@ class Weapon:
 
 
 
+# AISituation: snapshot of units in play on each side, built once per action phase and shared by
+# all AI activations in that phase; kept up to date as units enter or leave play
+class AISituation:
+	def __init__(self, unit_list):
+		self.units = ([], [])			# units in play for each player, in scenario list order
+		self.threat_maps = {}			# cached (key, threat map) by player and whether weapon threat is included
+		for unit in unit_list:
+			self.AddUnit(unit)
+	
+	
+	# add a unit that has entered play
+	def AddUnit(self, unit):
+		if unit in self.units[unit.owning_player]: return
+		self.units[unit.owning_player].append(unit)
+	
+	
+	# remove a unit that has been destroyed or has left play
+	def RemoveUnit(self, unit):
+		if unit not in self.units[unit.owning_player]: return
+		self.units[unit.owning_player].remove(unit)
+	
+	
+	# return the list of units in play that are enemies of the given unit
+	def GetEnemies(self, unit):
+		return self.units[1 - unit.owning_player]
+	
+	
+	# return the number of other living units in play on the same side as the given unit
+	def CountAllies(self, unit):
+		total = 0
+		for unit2 in self.units[unit.owning_player]:
+			if unit2 == unit: continue
+			if unit2.alive: total += 1
+		return total
+	
+	
+	# return a key for the current position of all units of a given player, plus their facing and weapon
+	# state if weapon threat is included, used to tell whether their threat map needs to be rebuilt
+	def GetThreatMapKey(self, player, weapons):
+		key = []
+		for unit in self.units[player]:
+			unit_key = (unit.unit_id, unit.hx, unit.hy, unit.alive)
+			if weapons:
+				broken = tuple(weapon.broken for weapon in unit.weapon_list)
+				unit_key += (unit.facing, unit.turret_facing, broken)
+			key.append(unit_key)
+		return tuple(key)
+	
+	
+	# return the threat map for units of a given player: for each scenario map hex, the presence of those
+	# units, the sum of 1/distance from each to the hex. AI movement only uses presence; the total
+	# firepower and best armoured AP score of weapons covering each hex are only added if weapons is
+	# True, for the debug overlay
+	def GetThreatMap(self, player, weapons=False):
+		key = self.GetThreatMapKey(player, weapons)
+		if (player, weapons) in self.threat_maps:
+			if self.threat_maps[(player, weapons)][0] == key:
+				return self.threat_maps[(player, weapons)][1]
+		
+		threat_map = {}
+		for (hx, hy) in scenario.hex_dict:
+			threat_map[(hx, hy)] = {'presence' : 0.0}
+			if weapons:
+				threat_map[(hx, hy)]['fp'] = 0
+				threat_map[(hx, hy)]['ap'] = 0
+		
+		for unit in self.units[player]:
+			if not unit.alive: continue
+			
+			for (hx, hy), threat in threat_map.items():
+				distance = GetHexDistance(unit.hx, unit.hy, hx, hy)
+				if distance == 0: continue
+				threat['presence'] += 1.0 / float(distance)
+			
+			if not weapons: continue
+			
+			for weapon in unit.weapon_list:
+				if weapon.broken: continue
+				
+				fp = 0
+				if weapon.GetStat('fp') is not None:
+					fp = int(weapon.GetStat('fp'))
+				elif weapon.GetStat('type') == 'Gun':
+					fp = weapon.GetEffectiveFP()
+				
+				ap = 0
+				for ammo_type in weapon.stats.get('ammo_type_list', [None]):
+					score = GetAPBaseScore(weapon, ammo_type, False)
+					if score is not None and score > ap:
+						ap = score
+				
+				for (hx, hy) in weapon.covered_hexes:
+					if (hx, hy) not in threat_map: continue
+					threat_map[(hx, hy)]['fp'] += fp
+					if ap > threat_map[(hx, hy)]['ap']:
+						threat_map[(hx, hy)]['ap'] = ap
+		
+		self.threat_maps[(player, weapons)] = (key, threat_map)
+		return threat_map
+
+
+
+# ScenarioSnapshot: compact copy of the tactical state of a scenario - the location and statuses of each
+# unit, the state and ammo of its weapons, and the chance of LoS between units - that can be forked and
+# changed without affecting the scenario or any other snapshot. A forked snapshot shares the state of
+# each unit and weapon with its parent until it is changed. Attack calculations are run against a
+# snapshot with Run(), which applies it to the scenario units and restores them afterwards; none of
+# this uses any random numbers
+class ScenarioSnapshot:
+	def __init__(self, parent=None):
+		
+		# fork an existing snapshot
+		if parent is not None:
+			self.unit_states = parent.unit_states.copy()
+			self.weapon_states = parent.weapon_states.copy()
+			self.los_table = parent.los_table
+			self.los_changes = parent.los_changes.copy()
+			self.changed_units = parent.changed_units.copy()
+			self.owned = set()
+			
+			# the parent must now copy any state before changing it too
+			parent.owned = set()
+			return
+		
+		self.unit_states = {}			# attribute values of each unit, keyed by unit
+		self.weapon_states = {}			# attribute values of each weapon, keyed by weapon
+		self.los_table = {}			# LoS of each unit when the snapshot was taken, never changed
+		self.los_changes = {}			# chance of LoS from each unit that has moved to every other unit
+		self.changed_units = []			# units whose state differs from the scenario, in the order changed
+		self.owned = set()			# units and weapons whose state belongs to this snapshot alone
+		
+		for unit in scenario.units:
+			state = {}
+			for k in SNAPSHOT_UNIT_FIELDS:
+				state[k] = getattr(unit, k)
+			state['hull_down'] = unit.hull_down.copy()
+			self.unit_states[unit] = state
+			self.los_table[unit] = unit.los_table.copy()
+			for weapon in unit.weapon_list:
+				state = {}
+				for k in SNAPSHOT_WEAPON_FIELDS:
+					state[k] = getattr(weapon, k, None)
+				for k in ['ammo_stores', 'ready_rack']:
+					if state[k] is not None:
+						state[k] = state[k].copy()
+				self.weapon_states[weapon] = state
+	
+	
+	# return a new snapshot forked from this one
+	def Fork(self):
+		return ScenarioSnapshot(parent=self)
+	
+	
+	# return the value of an attribute of a unit
+	def GetUnit(self, unit, k):
+		return self.unit_states[unit][k]
+	
+	
+	# change attributes of a unit, copying its state first if it is shared
+	def SetUnit(self, unit, **kwargs):
+		if unit not in self.owned:
+			self.unit_states[unit] = self.unit_states[unit].copy()
+			self.owned.add(unit)
+		self.unit_states[unit].update(kwargs)
+		if unit not in self.changed_units:
+			self.changed_units.append(unit)
+	
+	
+	# return the value of an attribute of a weapon
+	def GetWeapon(self, weapon, k):
+		return self.weapon_states[weapon][k]
+	
+	
+	# change attributes of a weapon, copying its state first if it is shared
+	def SetWeapon(self, weapon, **kwargs):
+		if weapon not in self.owned:
+			state = self.weapon_states[weapon].copy()
+			for k in ['ammo_stores', 'ready_rack']:
+				if state[k] is not None:
+					state[k] = state[k].copy()
+			self.weapon_states[weapon] = state
+			self.owned.add(weapon)
+		self.weapon_states[weapon].update(kwargs)
+		if weapon.unit not in self.changed_units:
+			self.changed_units.append(weapon.unit)
+	
+	
+	# use one shell of the weapon's current ammo type, if it has any left
+	def UseAmmo(self, weapon):
+		ammo_type = self.GetWeapon(weapon, 'ammo_type')
+		ammo_stores = self.GetWeapon(weapon, 'ammo_stores')
+		if ammo_type is None or ammo_stores is None: return
+		self.SetWeapon(weapon)
+		ammo_stores = self.GetWeapon(weapon, 'ammo_stores')
+		if ammo_stores.get(ammo_type, 0) > 0:
+			ammo_stores[ammo_type] -= 1
+	
+	
+	# return the chance of LoS between two units
+	def GetLoSChance(self, unit1, unit2):
+		if unit1 in self.los_changes:
+			return self.los_changes[unit1][unit2]
+		if unit2 in self.los_changes:
+			return self.los_changes[unit2][unit1]
+		if self.los_table[unit1].get(unit2, False):
+			return 100.0
+		return 0.0
+	
+	
+	# move a unit into an adjacent hex, as an AI move action that succeeds; its terrain is kept,
+	# since new terrain is only rolled for once the unit arrives
+	def MoveUnit(self, unit, hx, hy, reverse=False):
+		
+		facing = self.GetUnit(unit, 'facing')
+		turret_facing = self.GetUnit(unit, 'turret_facing')
+		if facing is not None:
+			facing = GetDirectionToAdjacent(self.GetUnit(unit, 'hx'), self.GetUnit(unit, 'hy'), hx, hy)
+			if reverse:
+				facing = ConstrainDir(facing + 3)
+			if 'turret' in unit.stats and turret_facing is not None:
+				turret_facing = facing
+		
+		moved_units = [unit]
+		if unit.towing is not None:
+			moved_units.append(unit.towing)
+		for unit2 in moved_units:
+			self.SetUnit(unit2, hx=hx, hy=hy, moving=True, dug_in=False, entrenched=False, fortified=False,
+				hull_down=[])
+		self.SetUnit(unit, facing=facing, turret_facing=turret_facing)
+		
+		# weapons cover new hexes from the new location, and lose any acquired target
+		for unit2 in moved_units:
+			for weapon in unit2.weapon_list:
+				self.SetWeapon(weapon, covered_hexes=None, acquired_target=None)
+		
+		# recalculate the chance of LoS to the moved units, including from any units that moved before
+		for unit2 in moved_units:
+			chances = self.Run(self.CalcLoSChances, unit2)
+			for (unit3, chances3) in list(self.los_changes.items()):
+				if unit3 == unit2: continue
+				chances3 = chances3.copy()
+				chances3[unit2] = chances[unit3]
+				self.los_changes[unit3] = chances3
+			self.los_changes[unit2] = chances
+	
+	
+	# return the chance of LoS from a unit to every other unit; called through Run()
+	def CalcLoSChances(self, unit1):
+		chances = {}
+		for unit2 in self.unit_states:
+			if unit1.owning_player == unit2.owning_player and unit1.hx == unit2.hx and unit1.hy == unit2.hy:
+				chances[unit2] = 100.0
+				continue
+			chance = scenario.DoLoSRoll(unit1, unit2, chance_only=True)
+			if chance is True:
+				chance = 100.0
+			elif chance is False:
+				chance = 0.0
+			chances[unit2] = chance
+		return chances
+	
+	
+	# apply this snapshot to the scenario units, run a function, and restore the units; returns
+	# whatever the function returns
+	def Run(self, function, *args):
+		
+		saved_units = []
+		saved_weapons = []
+		saved_los = []
+		
+		try:
+			for unit in self.changed_units:
+				state = self.unit_states[unit]
+				stack_index = self.MoveHexStack(unit, unit.hx, unit.hy, state['hx'], state['hy'])
+				saved_units.append((unit, [getattr(unit, k) for k in SNAPSHOT_UNIT_FIELDS], stack_index))
+				for k in SNAPSHOT_UNIT_FIELDS:
+					setattr(unit, k, state[k])
+				
+				for weapon in unit.weapon_list:
+					saved_weapons.append((weapon, [getattr(weapon, k, None) for k in SNAPSHOT_WEAPON_FIELDS]))
+					for (k, value) in self.weapon_states[weapon].items():
+						if not hasattr(weapon, k): continue
+						if k == 'covered_hexes' and value is None: continue
+						setattr(weapon, k, value)
+			
+			# recalculate covered hexes for weapons of units that have moved
+			for unit in self.changed_units:
+				for weapon in unit.weapon_list:
+					if self.weapon_states[weapon]['covered_hexes'] is None:
+						weapon.UpdateCoveredHexes()
+			
+			for (unit1, chances) in self.los_changes.items():
+				saved_los.append((unit1, unit1.los_table))
+				unit1.los_table = unit1.los_table.copy()
+				for (unit2, chance) in chances.items():
+					if unit2 == unit1: continue
+					if unit2 not in unit1.los_table: continue
+					saved_los.append((unit2, unit2.los_table))
+					unit2.los_table = unit2.los_table.copy()
+					los = chance >= SNAPSHOT_LOS_MIN_CHANCE
+					unit1.los_table[unit2] = los
+					unit2.los_table[unit1] = los
+			
+			return function(*args)
+		
+		# restore in the opposite order, since a LoS table may have been saved more than once, and so
+		# that each unit goes back to its original place in its hex stack
+		finally:
+			for (unit, los_table) in reversed(saved_los):
+				unit.los_table = los_table
+			for (weapon, values) in saved_weapons:
+				for (k, value) in zip(SNAPSHOT_WEAPON_FIELDS, values):
+					if hasattr(weapon, k):
+						setattr(weapon, k, value)
+			for (unit, values, stack_index) in reversed(saved_units):
+				self.MoveHexStack(unit, unit.hx, unit.hy, values[0], values[1], stack_index=stack_index)
+				for (k, value) in zip(SNAPSHOT_UNIT_FIELDS, values):
+					setattr(unit, k, value)
+	
+	
+	# move a unit from one scenario map hex stack to another, if either is on the map, inserting it at
+	# stack_index if given or else on the bottom of the stack; returns the unit's index in its old
+	# stack, or None if it wasn't moved or wasn't in a stack
+	def MoveHexStack(self, unit, hx1, hy1, hx2, hy2, stack_index=None):
+		if (hx1, hy1) == (hx2, hy2): return None
+		old_index = None
+		if (hx1, hy1) in scenario.hex_dict and unit in scenario.hex_dict[(hx1, hy1)].unit_stack:
+			old_index = scenario.hex_dict[(hx1, hy1)].unit_stack.index(unit)
+			scenario.hex_dict[(hx1, hy1)].unit_stack.remove(unit)
+		if (hx2, hy2) in scenario.hex_dict:
+			if stack_index is None:
+				scenario.hex_dict[(hx2, hy2)].unit_stack.append(unit)
+			else:
+				scenario.hex_dict[(hx2, hy2)].unit_stack.insert(stack_index, unit)
+		return old_index
+	
+	
+	# return the best chance that any of a list of attacking units would have of hitting any of a list
+	# of target units with one of its weapons, taking into account the chance of LoS to each target
+	def CalcBestAttackChance(self, attacker_list, target_list):
+		
+		def GetChances():
+			chances = []
+			for attacker in attacker_list:
+				if not attacker.alive: continue
+				for target in target_list:
+					if not target.alive: continue
+					distance = GetHexDistance(attacker.hx, attacker.hy, target.hx, target.hy)
+					for weapon in attacker.weapon_list:
+						if weapon.broken or weapon.jammed: continue
+						if 'move_or_fire' in weapon.stats and attacker.moving: continue
+						if distance > weapon.max_range: continue
+						ballistic = weapon.GetStat('ballistic_attack') is not None
+						if not ballistic and not attacker.los_table.get(target, False): continue
+						
+						# determine if a pivot or turret rotation would be required
+						pivot = False
+						turret_rotate = False
+						if weapon.GetStat('mount') is not None and (target.hx, target.hy) not in weapon.covered_hexes:
+							if weapon.GetStat('mount') == 'Turret' and attacker.turret_facing is not None and attacker.GetStat('turret') not in ['FIXED', 'FXT']:
+								turret_rotate = True
+							else:
+								pivot = True
+						
+						profile = scenario.CalcAttack(attacker, weapon, target, pivot=pivot, turret_rotate=turret_rotate)
+						if profile is None: continue
+						chances.append((attacker, target, ballistic, profile['final_chance']))
+			return chances
+		
+		best_chance = 0.0
+		for (attacker, target, ballistic, chance) in self.Run(GetChances):
+			if not ballistic:
+				chance = chance * self.GetLoSChance(attacker, target) / 100.0
+			if chance > best_chance:
+				best_chance = chance
+		return best_chance
+
+
+
 # AI: controller for enemy and player-allied units
 class AI:
 	def __init__(self, owner):
@@ -28109,6 +28774,11 @@ class AI:
 			if add_space: print('\n\n')
 			print('AI SPY: ' + text)
 		
+		# check whether the time budget for scoring possible actions has been used up
+		def OverBudget(decision_start):
+			if session.ai_time_budget is None: return False
+			return time.perf_counter() - decision_start > session.ai_time_budget
+		
 		# check for debug flags
 		if DEBUG:
 			if self.owner.owning_player == 1 and session.debug['No Enemy AI Actions']:
@@ -28147,10 +28817,16 @@ class AI:
 			
 			AISpyMsg(self.owner.unit_id + ' now acting, action #' + str(actions_taken), add_space=True)
 			
+			stage_start = time.perf_counter()
+			
+			# get shared situation snapshot and enemy units in play
+			situation = scenario.GetAISituation()
+			enemy_units = situation.GetEnemies(self.owner)
+			
 			# check for all enemies dead and do nothing if so
 			all_enemies_dead = True
-			for unit in scenario.units:
-				if unit.owning_player != self.owner.owning_player and unit.alive:
+			for unit in enemy_units:
+				if unit.alive:
 					all_enemies_dead = False
 					break
 			if all_enemies_dead:
@@ -28164,17 +28840,10 @@ class AI:
 			
 			spotted_enemies = 0
 			adjacent_enemies = 0
-			allies_on_map = 0
+			allies_on_map = situation.CountAllies(self.owner)
 			has_los_to_enemy = False
 			ac_list = []
-			for unit in scenario.units:
-				if unit == self.owner: continue
-				
-				# friendly unit
-				if unit.owning_player == self.owner.owning_player:
-					if unit.alive: allies_on_map += 1
-					continue
-				
+			for unit in enemy_units:
 				if not unit.spotted: continue
 				
 				spotted_enemies += 1
@@ -28220,8 +28889,7 @@ class AI:
 			# (re)build enemy threat list
 			threat_list = {}
 			owner_category = self.owner.GetStat('category')
-			for unit in scenario.units:
-				if unit.owning_player == self.owner.owning_player: continue
+			for unit in enemy_units:
 				if not unit.alive: continue
 				if GetHexDistance(0, 0, unit.hx, unit.hy) > 3: continue
 				if not self.owner.los_table[unit]: continue
@@ -28307,15 +28975,16 @@ class AI:
 					if len(threat_list) <= 5:
 						break
 			
+			scenario.RecordAIStage('Situation Build', stage_start)
+			
 			
 			# 1) Determine if a state change is required
 			#############################################
 			if self.state == 'Lax':
 				
 				# 1+ units in same hex are alert
-				for unit in scenario.units:
+				for unit in situation.units[self.owner.owning_player]:
 					if unit == self.owner: continue
-					if unit.owning_player != self.owner.owning_player: continue
 					if not (unit.hx == self.owner.hx and unit.hx == self.owner.hy): continue
 					if unit.ai is None: continue
 					if unit.ai.state != 'Alert': continue
@@ -28408,8 +29077,7 @@ class AI:
 						must_abandon = True
 						
 						# if there is a friendly gun tractor available, gun crew will likely wait
-						for unit in scenario.units:
-							if unit.owning_player != self.owner.owning_player: continue
+						for unit in situation.units[self.owner.owning_player]:
 							if not unit.alive: continue
 							if unit == self.owner: continue
 							if unit.GetStat('towing_capacity') is not None:
@@ -28443,10 +29111,10 @@ class AI:
 							# check for towed gun withdrawing too
 							if self.owner.towing is not None:
 								text += ' It tows away a ' + self.owner.towing.GetName()
-								self.owner.towing.DestroyMe(no_vp=True)
+								self.owner.towing.DestroyMe(no_vp=True, cause='Withdrew')
 							PlaySoundFor(self.owner, 'movement')
 							ShowMessage(text, scenario_highlight=(self.owner.hx, self.owner.hy))
-							self.owner.DestroyMe(no_vp=True)
+							self.owner.DestroyMe(no_vp=True, cause='Withdrew')
 						activation_over = True
 						continue
 				
@@ -28464,6 +29132,7 @@ class AI:
 			###############################
 			
 			action_list = []
+			decision_start = time.perf_counter()
 			
 			# Surrender - enemy only, and only as first action in activation
 			if self.owner.owning_player == 1 and not defensive_fire and 'enemy_fanatic' not in campaign.stats and actions_taken == 1:
@@ -28641,6 +29310,10 @@ class AI:
 			enemies_out_of_range = True
 			if not unit_unarmed and current_distance <= 3 and not self.owner.routed and self.state != 'Stunned' and self.attitude != 'Withdraw' and not is_limber_connected:
 				
+				stage_start = time.perf_counter()
+				attacks_evaluated = 0
+				truncated = False
+				
 				# build list of possible targets
 				target_list = []
 				for unit in scenario.units:
@@ -28686,6 +29359,11 @@ class AI:
 					
 					for target in target_list:
 						
+						if OverBudget(decision_start):
+							AISpyMsg('Time budget used up, skipping any remaining targets')
+							truncated = True
+							break
+						
 						# skip any other possible targets if this is a defensive fire attack
 						if defensive_fire:
 							if not target.is_player and target not in scenario.player_unit.squad:
@@ -28840,6 +29518,7 @@ class AI:
 									
 								profile = scenario.CalcAttack(self.owner, weapon, target,
 									pivot=pivot_req, turret_rotate=turret_rotate_req)
+								attacks_evaluated += 1
 								
 								# attack not possible
 								if profile is None:
@@ -28987,6 +29666,9 @@ class AI:
 							if len(ammo_attack_list) > 0:
 								ammo_attack_list.sort(key=lambda x:x[0], reverse=True)
 								action_list.append(ammo_attack_list[0])
+				
+				scenario.RecordAIStage('Target Selection', stage_start, candidates=attacks_evaluated,
+					truncated=truncated)
 			
 			if enemies_out_of_range:
 				AISpyMsg('No enemies in range for an attack.')
@@ -28995,6 +29677,9 @@ class AI:
 			# Move Actions
 			if not defensive_fire and self.state != 'Stunned' and unit_mobile and not self.owner.broken_down:
 				
+				stage_start = time.perf_counter()
+				moves_evaluated = 0
+				truncated = False
 				cannot_move = False
 				
 				# build list of possible destinations
@@ -29045,9 +29730,18 @@ class AI:
 					hex_list = []
 					AISpyMsg('Unit already moved/fired in a previous action.')
 				
+				# presence of enemy-side units in each map hex; only used when scoring moves for allied units
+				threat_map = situation.GetThreatMap(1)
+				
 				move_list = []
 				for (hx, hy) in hex_list:
 					
+					if OverBudget(decision_start):
+						AISpyMsg('Time budget used up, skipping any remaining move destinations')
+						truncated = True
+						break
+					moves_evaluated += 1
+					
 					# occupied by active enemy unit(s)
 					if len(scenario.hex_dict[(hx,hy)].unit_stack) > 0:
 						avoid_hex = False
@@ -29125,18 +29819,17 @@ class AI:
 						if scenario.cd_map_hex.objective is not None:
 							if scenario.cd_map_hex.objective['type'] == 'Rescue':
 								if self.owner == scenario.cd_map_hex.objective['rescue_unit']:
-									for unit in scenario.units:
-										if not unit.alive: continue
-										if unit.owning_player == 0: continue
-										score -= round(30.0 / float(GetHexDistance(unit.hx, unit.hy, hx, hy)), 2)
+									score -= round(30.0 * threat_map[(hx, hy)]['presence'], 2)
 						
 						# units may want to move toward enemy targets
 						if ('close_combat_team' in self.owner.stats or enemies_out_of_range) and adjacent_enemies == 0:
-							for unit in scenario.units:
+							# enemy units already adjacent to this one don't count
+							presence = threat_map[(hx, hy)]['presence']
+							for unit in situation.units[1]:
 								if not unit.alive: continue
-								if unit.owning_player == 0: continue
-								if GetHexDistance(unit.hx, unit.hy, self.owner.hx, self.owner.hy) == 1: continue
-								score += round(60.0 / float(GetHexDistance(unit.hx, unit.hy, hx, hy)), 1)
+								if GetHexDistance(unit.hx, unit.hy, self.owner.hx, self.owner.hy) != 1: continue
+								presence -= 1.0 / float(GetHexDistance(unit.hx, unit.hy, hx, hy))
+							score += round(60.0 * presence, 1)
 						
 					
 					# general movement modifiers
@@ -29197,9 +29890,17 @@ class AI:
 								move_list.append((score * 1.5, ['Reverse Move', (hx, hy)]))
 								
 				
+				scenario.RecordAIStage('Move Evaluation', stage_start, candidates=moves_evaluated,
+					truncated=truncated)
+				
 				# if 1+ move actions are possible, copy over the top two
 				if len(move_list) > 0:
 					move_list.sort(key=lambda x:x[0], reverse=True)
+					
+					# rescore the best moves by looking ahead at what could happen after them
+					if AI_LOOKAHEAD_DEPTH > 0 and not OverBudget(decision_start):
+						move_list = self.LookAheadMoves(move_list, enemy_units, decision_start, OverBudget)
+					
 					for entry in move_list[:2]:
 						action_list.append(entry)
 				
@@ -29558,7 +30259,7 @@ class AI:
 									self.owner.animation_cells.pop(0)
 								scenario.UpdateUnitCon()
 								scenario.UpdateScenarioDisplay()
-								Wait(15)
+								Wait(15, category='Movement')
 							self.owner.animation_cells = []
 						
 						# clear any bonus and move into new hex
@@ -29803,8 +30504,12 @@ class AI:
 								break
 							if crewman_found: break
 					
-					# do the attack!
-					result = self.owner.Attack(weapon, target)
+					# do the attack! only timed if hits are resolved without being displayed, since otherwise
+					# the time includes animations, pauses, and waiting for the player
+					stage_start = time.perf_counter()
+					result = RunInRNGStream('Combat', self.owner.Attack, weapon, target)
+					if session.batch_resolution:
+						scenario.RecordAIStage('Attack Resolution', stage_start)
 					
 					if not result:
 						AISpyMsg('ERROR: Tried to attack but it was not possible!')
@@ -29832,6 +30537,53 @@ class AI:
 	
 		# activation finished
 		AISpyMsg(self.owner.unit_id + ' is finished acting.\n')
+	
+	
+	# rescore the best moves in a sorted list of possible moves by looking ahead in snapshots of the
+	# scenario: the change in the best chance this unit would have of hitting an enemy after each move,
+	# and if looking ahead two moves, the change in the best chance any enemy would then have of hitting
+	# it; returns the rescored list, sorted
+	def LookAheadMoves(self, move_list, enemy_units, decision_start, OverBudget):
+		
+		stage_start = time.perf_counter()
+		moves_evaluated = 0
+		truncated = False
+		
+		root = ScenarioSnapshot()
+		(base_attack, base_threat) = self.GetLookaheadChances(root, enemy_units)
+		
+		new_move_list = []
+		for (score, action) in move_list:
+			if action[0] not in ['Move', 'Reverse Move'] or moves_evaluated >= AI_LOOKAHEAD_MOVES:
+				new_move_list.append((score, action))
+				continue
+			if OverBudget(decision_start):
+				truncated = True
+				new_move_list.append((score, action))
+				continue
+			moves_evaluated += 1
+			
+			(hx, hy) = action[1]
+			snapshot = root.Fork()
+			snapshot.MoveUnit(self.owner, hx, hy, reverse=(action[0] == 'Reverse Move'))
+			(attack, threat) = self.GetLookaheadChances(snapshot, enemy_units)
+			score += round(AI_LOOKAHEAD_WEIGHT * ((attack - base_attack) - (threat - base_threat)), 1)
+			new_move_list.append((score, action))
+		
+		scenario.RecordAIStage('Lookahead', stage_start, candidates=moves_evaluated, truncated=truncated)
+		
+		new_move_list.sort(key=lambda x:x[0], reverse=True)
+		return new_move_list
+	
+	
+	# return the best chance this unit would have of hitting an enemy unit in a scenario snapshot, and
+	# if looking ahead two moves, the best chance any enemy unit would have of hitting it
+	def GetLookaheadChances(self, snapshot, enemy_units):
+		attack = snapshot.CalcBestAttackChance([self.owner], enemy_units)
+		threat = 0.0
+		if AI_LOOKAHEAD_DEPTH >= 2:
+			threat = snapshot.CalcBestAttackChance(enemy_units, [self.owner])
+		return (attack, threat)
 
 
 
@@ -29962,6 +30714,8 @@ class Unit:
 		self.ap_hits_to_resolve = []		# list of unresolved AP hits
 		self.he_hits_to_resolve = []		# " HE hits
 		
+		self.attack_mod_cache = {}		# cached partial attack modifiers, cleared each turn
+		
 		for weapon in self.weapon_list:
 			weapon.selected_target = None
 			weapon.acquired_target = None
@@ -30022,6 +30776,7 @@ class Unit:
 		self.moving = False
 		self.previous_facing = self.facing
 		self.previous_turret_facing = self.turret_facing
+		self.attack_mod_cache = {}
 		
 		self.fired = False
 		for weapon in self.weapon_list:
@@ -30652,7 +31407,7 @@ class Unit:
 			elif self.owning_player == 0 or (self.owning_player == 1 and self.spotted):
 				ShowMessage(self.GetName() + ' was destroyed by a landmine.',
 					longer_pause=True, good_news=False)
-			self.DestroyMe(no_vp=True)
+			self.DestroyMe(no_vp=True, cause='Landmine')
 			return True
 		
 		roll = GetPercentileRoll()
@@ -30750,6 +31505,33 @@ class Unit:
 		return crew_list
 		
 	
+	# return a key for the parts of this unit's state that attack modifiers depend on
+	def GetAttackModKey(self):
+		crew_state = []
+		for position in self.positions_list:
+			crewman = position.crewman
+			if crewman is None: continue
+			crew_state.append((position, crewman, crewman.current_cmd, crewman.ce, crewman.alive,
+				crewman.condition, crewman.fatigue, tuple(crewman.injury.values())))
+		return (self.hx, self.hy, self.terrain, self.moving, self.facing, self.turret_facing,
+			self.previous_facing, self.previous_turret_facing, self.spotted, self.pinned,
+			self.reduced, self.deployed, self.dug_in, self.entrenched, self.fortified,
+			tuple(crew_state))
+	
+	
+	# return a cached part of an attack calculation that depends only on this unit, recalculating it
+	# with function if the unit has moved or changed status since it was cached
+	def GetAttackModPartial(self, name, function, *args):
+		key = self.GetAttackModKey()
+		if name in self.attack_mod_cache:
+			(cached_key, partials) = self.attack_mod_cache[name]
+			if cached_key == key:
+				return partials
+		partials = function(*args)
+		self.attack_mod_cache[name] = (key, partials)
+		return partials
+	
+	
 	# return a to-hit modifier given current terrain
 	def GetTEM(self):
 		
@@ -31211,7 +31993,7 @@ class Unit:
 			
 			# clear highlight
 			scenario.animation['hex_highlight'] = False
-			scenario.UpdateAnimCon()
+			RunInRNGStream('Cosmetic', scenario.UpdateAnimCon)
 	
 	# reveal this unit after being spotted
 	def SpotMe(self):
@@ -31258,6 +32040,8 @@ class Unit:
 		self.hy = hy
 		
 		scenario.units.append(self)
+		if scenario.ai_situation is not None:
+			scenario.ai_situation.AddUnit(self)
 		for map_hex in scenario.map_hexes:
 			if map_hex.hx == hx and map_hex.hy == hy:
 				map_hex.unit_stack.append(self)
@@ -31334,6 +32118,8 @@ class Unit:
 	def RemoveFromPlay(self):
 		scenario.hex_dict[(self.hx, self.hy)].unit_stack.remove(self)
 		scenario.units.remove(self)
+		if scenario.ai_situation is not None:
+			scenario.ai_situation.RemoveUnit(self)
 	
 	
 	# return the display character to use on the map viewport
@@ -31981,8 +32767,8 @@ class Unit:
 			
 			##### Attack Animation and Sound Effects #####
 			
-			# skip if in fast mode
-			if not (DEBUG and session.debug['Fast Mode']):
+			# skip if in fast mode or turbo mode
+			if not (DEBUG and session.debug['Fast Mode']) and not TurboSkip('Animations'):
 				
 				FlushKeyboardEvents()
 				
@@ -32185,7 +32971,7 @@ class Unit:
 				while not end_pause:
 					CheckForAnimationUpdate()
 					libtcod.console_flush()
-					if not GetInputEvent(): continue
+					if not GetInputEvent(context='Attack'): continue
 					
 					key_char = DeKey(chr(key.c).lower())
 					
@@ -32396,10 +33182,10 @@ class Unit:
 								if profile['result'] == 'CRITICAL HIT':
 									if target.GetStat('category') == 'Gun':
 										ShowNotification("The attack has hit the gun itself and destroys it! The crew scatters.")
-										target.DestroyMe()
+										target.DestroyMe(dest_weapon=weapon, cause='Critical Hit')
 									elif target.GetStat('class') == 'Motorcycle Team':
 										ShowNotification("The attack has hit the motorcycle itself and destroys it! The crew scatters.")
-										target.DestroyMe()
+										target.DestroyMe(dest_weapon=weapon, cause='Critical Hit')
 									else:
 										target.fp_to_resolve += 2
 							
@@ -32467,7 +33253,7 @@ class Unit:
 					chance = 80.0
 				if GetPercentileRoll() <= chance:
 					ShowMessage(self.GetName() + ' has blown itself up.', scenario_highlight=(self.hx, self.hy))
-					self.DestroyMe(no_vp=True)
+					self.DestroyMe(no_vp=True, cause='Blew Itself Up')
 			
 			# update context console in case we maintained RoF
 			scenario.UpdateContextCon()
@@ -32503,8 +33289,19 @@ class Unit:
 		return True
 	
 	
+	# check whether pending hits on this unit can be resolved without being displayed: the player unit
+	# must not be involved, and the unit must not be visible to the player
+	def CanResolveHitsQuietly(self):
+		if session.batch_resolution: return True
+		if self == scenario.player_unit: return False
+		if self.owning_player == 0 or self.spotted: return False
+		for profile in self.ap_hits_to_resolve + self.he_hits_to_resolve:
+			if profile['attacker'] == scenario.player_unit: return False
+		return True
+	
+	
 	# resolve all unresolved HE hits on this unit - vehicles only
-	def ResolveHEHits(self):
+	def ResolveHEHits(self, quiet=False):
 		if not self.alive: return
 		if len(self.he_hits_to_resolve) == 0: return
 		if self.GetStat('category') not in ['Vehicle']:
@@ -32542,7 +33339,9 @@ class Unit:
 						text += 'you.'
 					else:
 						text += profile['attacker'].GetName() + '.'
-					ShowMessage(text)
+					if not quiet:
+						ShowMessage(text)
+					scenario.LogHit(self, profile, 'IMMOBILIZED')
 					
 					# immobilze the target and skip any further immobilization checks
 					self.ImmobilizeMe()
@@ -32606,22 +33405,27 @@ class Unit:
 			fate_point_used = False
 			
 			# display attack console if player is involved
-			if profile['attacker'] == scenario.player_unit or self == scenario.player_unit:
+			if not quiet and (profile['attacker'] == scenario.player_unit or self == scenario.player_unit):
 				scenario.DisplayAttack(profile)
 				scenario.attack_con_active = True
 				scenario.UpdateScenarioDisplay()
 				
 			# do the attack roll; modifies the attack profile
-			profile = scenario.DoAttackRoll(profile)
+			if quiet:
+				profile = ResolveAttackRoll(profile)
+			else:
+				profile = scenario.DoAttackRoll(profile)
+			scenario.LogHit(self, profile, profile['result'])
 			
 			# wait if player is involved
-			if profile['attacker'] == scenario.player_unit or self == scenario.player_unit:
+			if not quiet and (profile['attacker'] == scenario.player_unit or self == scenario.player_unit):
 				scenario.UpdateScenarioDisplay()
 				WaitForContinue()
 			
 			# turn off attack console display if any
-			scenario.attack_con_active = False
-			scenario.UpdateScenarioDisplay()
+			if not quiet:
+				scenario.attack_con_active = False
+				scenario.UpdateScenarioDisplay()
 			
 			# no effect
 			if profile['result'] == 'NO EFFECT': continue
@@ -32667,7 +33471,8 @@ class Unit:
 				self.ai.state = 'Stunned'
 				scenario.UpdateUnitInfoCon()
 			
-			ShowMessage(text)
+			if not quiet:
+				ShowMessage(text)
 			
 			# don't resolve further hits if already destroyed
 			if profile['result'] == 'DESTROYED':
@@ -32678,7 +33483,7 @@ class Unit:
 			
 	
 	# resolve all unresolved AP hits on this unit
-	def ResolveAPHits(self):
+	def ResolveAPHits(self, quiet=False):
 		if not self.alive: return
 		
 		# no hits to resolve! doing fine!
@@ -32690,8 +33495,9 @@ class Unit:
 			return
 		
 		# move to top of hex stack
-		self.MoveToTopOfStack()
-		scenario.UpdateUnitCon()
+		if not quiet:
+			self.MoveToTopOfStack()
+			scenario.UpdateUnitCon()
 		
 		# handle AP hits
 		for profile in self.ap_hits_to_resolve:
@@ -32721,7 +33527,7 @@ class Unit:
 						profile['result'] == 'PENETRATED'
 						
 						# display message and attack console if player is involved
-						if profile['attacker'] == scenario.player_unit or self == scenario.player_unit:
+						if not quiet and (profile['attacker'] == scenario.player_unit or self == scenario.player_unit):
 							ShowMessage('The hit knocks out the exposed crew of the target vehicle and destroys it.')
 							scenario.DisplayAttack(profile)
 							scenario.attack_con_active = True
@@ -32742,7 +33548,7 @@ class Unit:
 					ShowTutorialSlide('scenario_player_ap_was_hit')
 				
 				# display attack console if player is involved
-				if profile['attacker'] == scenario.player_unit or self == scenario.player_unit:
+				if not quiet and (profile['attacker'] == scenario.player_unit or self == scenario.player_unit):
 					scenario.DisplayAttack(profile)
 					scenario.attack_con_active = True
 					scenario.UpdateScenarioDisplay()
@@ -32753,21 +33559,27 @@ class Unit:
 					critical_hit = True
 				
 				# do the attack roll; modifies the attack profile
-				profile = scenario.DoAttackRoll(profile)
+				if quiet:
+					profile = ResolveAttackRoll(profile)
+				else:
+					profile = scenario.DoAttackRoll(profile)
+				scenario.LogHit(self, profile, profile['result'])
 				
-				if profile['result'] == 'NO PENETRATION':
-					PlaySoundFor(None, 'armour_save')
-				elif profile['result'] == 'PENETRATED':
-					PlaySoundFor(None, 'armour_penetrated')
+				if not quiet:
+					if profile['result'] == 'NO PENETRATION':
+						PlaySoundFor(None, 'armour_save')
+					elif profile['result'] == 'PENETRATED':
+						PlaySoundFor(None, 'armour_penetrated')
 			
 				# wait if player is involved
-				if profile['attacker'] == scenario.player_unit or self == scenario.player_unit:
+				if not quiet and (profile['attacker'] == scenario.player_unit or self == scenario.player_unit):
 					scenario.UpdateScenarioDisplay()
 					WaitForContinue()
 			
 			# turn off attack console display if any
-			scenario.attack_con_active = False
-			scenario.UpdateScenarioDisplay()
+			if not quiet:
+				scenario.attack_con_active = False
+				scenario.UpdateScenarioDisplay()
 			
 			# show message for unarmoured vehicle saves
 			if profile['result'] == 'MINOR DAMAGE':
@@ -32931,7 +33743,8 @@ class Unit:
 					text += 'you.'
 				else:
 					text += profile['attacker'].GetName() + ' using ' + profile['weapon'].stats['name'] + '.'
-				ShowMessage(text)
+				if not quiet:
+					ShowMessage(text)
 				
 				# attacker was player
 				if profile['attacker'] == scenario.player_unit:
@@ -32996,7 +33809,7 @@ class Unit:
 	
 	
 	# resolve FP on this unit if any
-	def ResolveFP(self):
+	def ResolveFP(self, quiet=False):
 		if not self.alive: return
 		if self.fp_to_resolve == 0: return
 		
@@ -33006,13 +33819,14 @@ class Unit:
 			return
 		
 		# move to top of hex stack
-		self.MoveToTopOfStack()
-		scenario.UpdateUnitCon()
-		
-		if self.is_player:
-			ShowTutorialSlide('scenario_player_fp')
-		elif self.owning_player == 1:
-			ShowTutorialSlide('scenario_enemy_fp')
+		if not quiet:
+			self.MoveToTopOfStack()
+			scenario.UpdateUnitCon()
+			
+			if self.is_player:
+				ShowTutorialSlide('scenario_player_fp')
+			elif self.owning_player == 1:
+				ShowTutorialSlide('scenario_enemy_fp')
 		
 		# check for Steam achievement
 		if self.owning_player == 1 and self.fp_to_resolve >= 150:
@@ -33024,13 +33838,14 @@ class Unit:
 			text += 'you.'
 		else:
 			text += self.GetName() + '.'
-		ShowMessage(text, scenario_highlight=(self.hx, self.hy))
+		if not quiet:
+			ShowMessage(text, scenario_highlight=(self.hx, self.hy))
 		
 		# unarmoured unit
 		if self.GetStat('armour') is None:
 		
 			concealed = False
-			if self.owning_player == 1 and not self.spotted:
+			if quiet or (self.owning_player == 1 and not self.spotted):
 				concealed = True
 			
 			if not concealed:
@@ -33237,7 +34052,7 @@ class Unit:
 							libtcod.console_blit(window_con, 0, 0, 0, 0, con, WINDOW_XM, WINDOW_YM-14)
 							libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 							libtcod.console_flush()
-							Wait(15, ignore_animations=True)
+							Wait(15, ignore_animations=True, category='Rolls')
 							libtcod.console_print_ex(window_con, 13, 17, libtcod.BKGND_NONE,
 								libtcod.CENTER, '           ')
 						libtcod.console_print_ex(window_con, 13, 17, libtcod.BKGND_NONE,
@@ -33264,17 +34079,21 @@ class Unit:
 						WaitForContinue(ignore_animations=True)
 					else:
 						FlushKeyboardEvents()
-						Wait(400 + (40 * config['ArmCom2'].getint('message_pause')), allow_skip=True, ignore_animations=True)
+						Wait(400 + (40 * config['ArmCom2'].getint('message_pause')), allow_skip=True, ignore_animations=True, category='Messages')
 			
 				# pop-up message if unit was unspotted by player
-				else:
+				elif not quiet:
 					ShowMessage('Result: ' + text, scenario_highlight=(self.hx, self.hy))
 			else:
-				ShowMessage('No Effect', scenario_highlight=(self.hx, self.hy))
+				text = 'NO EFFECT'
+				if not quiet:
+					ShowMessage('No Effect', scenario_highlight=(self.hx, self.hy))
+			
+			scenario.LogHit(self, None, text, fp=self.fp_to_resolve)
 			
 			# apply effect - we wait until here so that messages don't pop up before the window is finished
 			if text == 'DESTROYED':
-				self.DestroyMe()
+				self.DestroyMe(cause='Firepower')
 			elif text == 'REDUCED':
 				self.ReduceMe()
 			elif text == 'ROUTED':
@@ -33298,7 +34117,8 @@ class Unit:
 					scenario.UpdateCrewInfoCon()
 					result = True
 			if not result:
-				ShowMessage('Your crewmen suffered no injuries from the attack.', scenario_highlight=(self.hx, self.hy))
+				if not quiet:
+					ShowMessage('Your crewmen suffered no injuries from the attack.', scenario_highlight=(self.hx, self.hy))
 			else:
 				ShowTutorialSlide('scenario_crewman_hit_by_fp')
 		
@@ -33492,7 +34312,10 @@ class Unit:
 	
 	# destroy this unit and remove it from the game
 	# if location is set, that was the location of the knock-out hit for vehicles
-	def DestroyMe(self, location=None, dest_weapon=None, no_vp=False, surrender=False, force_explosion=False, abandoned=False):
+	# dest_unit and cause are only used for analytics: the unit that destroyed this one if dest_weapon is not
+	# known, and what kind of attack or event destroyed it
+	def DestroyMe(self, location=None, dest_weapon=None, no_vp=False, surrender=False, force_explosion=False, abandoned=False,
+			dest_unit=None, cause=None):
 		
 		# check for debug flag
 		if self == scenario.player_unit and DEBUG:
@@ -33504,6 +34327,18 @@ class Unit:
 		# set flag
 		self.alive = False
 		
+		if session.analytics is not None:
+			if cause is None:
+				if surrender:
+					cause = 'Surrendered'
+				elif abandoned:
+					cause = 'Abandoned'
+				elif dest_weapon is not None:
+					cause = 'Attack'
+				else:
+					cause = 'Other'
+			session.analytics.RecordLoss(self, dest_weapon, dest_unit, cause)
+		
 		# play sound if not surrendering / no vp
 		if not (surrender or no_vp):
 			PlaySoundFor(self, 'unit_ko')
@@ -33516,6 +34351,8 @@ class Unit:
 		# remove from scenario unit list
 		if self in scenario.units:
 			scenario.units.remove(self)
+		if scenario.ai_situation is not None:
+			scenario.ai_situation.RemoveUnit(self)
 		
 		# if unit was towing or being towed, break the connection
 		if self.towed_by is not None:
@@ -34172,7 +35009,7 @@ def ShowSkillMenu(crewman):
 	while not exit_menu:
 		
 		libtcod.console_flush()
-		if not GetInputEvent(allow_repeat=True): continue
+		if not GetInputEvent(allow_repeat=True, context='Skill'): continue
 		key_char = DeKey(chr(key.c).lower())
 		
 		# exit menu
@@ -34560,7 +35397,7 @@ def ShowCrewChatter(tag, crewman, override_text=None):
 		WaitForContinue()
 	else:
 		# allow the message to be viewed by player
-		Wait(200 + (40 * config['ArmCom2'].getint('message_pause')))
+		Wait(200 + (40 * config['ArmCom2'].getint('message_pause')), category='Messages')
 	
 	FlushKeyboardEvents()
 	
@@ -34722,17 +35559,17 @@ def ShowMessage(text, longer_pause=False, portrait=None, cd_highlight=None, scen
 		else:
 			wait_time = 110
 		Wait(wait_time + (40 * config['ArmCom2'].getint('message_pause')),
-			allow_skip=True, ignore_animations=ignore_animations)
+			allow_skip=True, ignore_animations=ignore_animations, category='Messages')
 	
 	FlushKeyboardEvents()
 	
 	# clear hex highlight if any
 	if cd_highlight is not None:
 		campaign_day.animation['hex_highlight'] = False
-		campaign_day.UpdateAnimCon()
+		RunInRNGStream('Cosmetic', campaign_day.UpdateAnimCon)
 	elif scenario_highlight is not None:
 		scenario.animation['hex_highlight'] = False
-		scenario.UpdateAnimCon()
+		RunInRNGStream('Cosmetic', scenario.UpdateAnimCon)
 	
 	# add to message log
 	if campaign_day is not None and not no_log:
@@ -34780,7 +35617,7 @@ def ShowSimpleMessage(text, crewman=None):
 	if config['ArmCom2'].getboolean('message_prompt'):
 		WaitForContinue(ignore_animations=True)
 	else:
-		Wait(130 + (40 * config['ArmCom2'].getint('message_pause')), ignore_animations=True)
+		Wait(130 + (40 * config['ArmCom2'].getint('message_pause')), ignore_animations=True, category='Messages')
 	FlushKeyboardEvents()
 	if campaign_day is not None:
 		campaign_day.message_log.append(text)
@@ -34836,8 +35673,10 @@ def ShowTutorialSlide(slidename):
 	libtcod.console_flush()
 	
 	
-# get keyboard and/or mouse and/or game controller event; returns False if no new input
-def GetInputEvent(allow_repeat=False):
+# get keyboard and/or mouse and/or game controller event; returns False if no new input. context names
+# the input loop asking for input, and details holds anything about its current state that the
+# autopilot needs to choose an input
+def GetInputEvent(allow_repeat=False, context=None, details=None):
 	
 	global key, mouse
 	
@@ -34845,6 +35684,14 @@ def GetInputEvent(allow_repeat=False):
 	key.vk = 0
 	key.c = 0
 	
+	# headless play: take the next input from the autopilot, the replay log, or the input script
+	if HEADLESS:
+		if session is not None and session.autopilot is not None:
+			return session.autopilot.GetInput(context, details)
+		if session is not None and session.replay is not None:
+			return session.replay.GetInput()
+		return GetScriptedInputEvent()
+	
 	# game controller input check
 	if gamepad is not None:
 		
@@ -34936,6 +35783,8 @@ def GetInputEvent(allow_repeat=False):
 		
 		if gamepad_event:
 			session.key_down = False
+			if session.replay is not None:
+				session.replay.RecordInput(context)
 			return True
 	
 	
@@ -35016,9 +35865,218 @@ def GetInputEvent(allow_repeat=False):
 				mouse.wheel_down = True
 			new_input = True
 	
+	if new_input and session is not None and session.replay is not None:
+		session.replay.RecordInput(context)
 	return new_input
 
 
+# set the global key object from the next line of the input script for headless play; ends the game
+# once the script has been used up
+def GetScriptedInputEvent():
+	text = libtcod.NextScriptedInput()
+	if text is None:
+		print('Input script finished, exiting')
+		sys.exit()
+	SetScriptedKey(text)
+	return True
+	
+
+# set the global key object from a scripted input: either a single character, or the name of an SDL key
+def SetScriptedKey(text):
+	
+	# single character
+	if len(text) == 1:
+		key.vk = ord(text.lower())
+		key.c = ord(text.lower())
+		key.text = text.lower()
+		key.shift = text.isupper()
+	
+	# name of an SDL key
+	else:
+		key.vk = getattr(sdl2, 'SDLK_' + text.upper())
+		key.c = 0
+		key.text = ''
+		key.shift = False
+		if key.vk == sdl2.SDLK_SPACE:
+			key.c = 32
+			key.text = ' '
+	
+	if session is not None:
+		session.key_down = False
+
+
+# return a hash of the current game state, used to check that a replay is following its recording: the
+# campaign date, VP, and gameplay random number stream positions, the campaign day clock and player
+# location, and the scenario turn, phase, and unit positions
+def GetGameStateHash():
+	state = []
+	if campaign is not None:
+		state.append((campaign.today, campaign.player_vp))
+		for stream in RNG_STREAMS:
+			if stream in RNG_COSMETIC_STREAMS: continue
+			state.append(campaign.rng_streams[stream].getstate())
+	if campaign_day is not None:
+		state.append((campaign_day.day_clock, campaign_day.player_unit_location, campaign_day.day_vp))
+	if scenario is not None:
+		state.append((scenario.current_turn, scenario.phase))
+		for unit in scenario.units:
+			state.append((unit.unit_id, unit.owning_player, unit.hx, unit.hy, unit.facing, unit.alive))
+	return zlib.crc32(repr(state).encode('utf-8'))
+	
+
+# ReplayLog: records a play session to a compressed log file - the game version and settings, the seed
+# used for all random numbers, every input returned by GetInputEvent, and a hash of the game state at
+# each checkpoint - or plays back a recorded session as fast as possible without a display, checking
+# each checkpoint against the recording
+class ReplayLog:
+	def __init__(self, filename, playback=False):
+		global roll_buffer
+		self.filename = filename
+		self.playback = playback
+		self.entries = []		# recorded inputs and checkpoints, in order
+		self.next_entry = 0		# index of next entry to play back
+		self.checkpoints = 0		# number of checkpoints recorded or checked so far
+		self.mismatches = 0		# number of checkpoints that did not match the recording
+		self.start_time = time.time()
+		
+		if playback:
+			self.Load()
+			if self.header['version'] != VERSION:
+				print('WARNING: Replay was recorded in version ' + self.header['version'] + ', results may differ')
+			# percentile rolls are drawn differently with and without numpy
+			if self.header.get('numpy', False) != (numpy is not None):
+				if self.header.get('numpy', False):
+					print('WARNING: Replay was recorded with numpy, which is not available now; results will differ')
+				else:
+					print('WARNING: Replay was recorded without numpy, which is available now; results will differ')
+			for (k, value) in self.header['config'].items():
+				if k == 'sounds_enabled': continue
+				config['ArmCom2'][k] = value
+			session.batch_resolution = self.header['batch_resolution']
+		else:
+			self.header = {
+				'version' : VERSION,
+				'seed' : libtcod.random_get_int(0, 0, 2147483647),
+				'batch_resolution' : session.batch_resolution,
+				'numpy' : numpy is not None,
+				'config' : dict(config['ArmCom2'])
+			}
+			self.file = gzip.open(filename, 'wt', encoding='utf-8')
+			self.WriteEntry(self.header)
+		
+		# seed all random numbers for the session
+		seed = self.header['seed']
+		libtcod.random_restore(0, libtcod.random_new_from_seed(seed))
+		random.seed(seed)
+		roll_buffer = NewRollBuffer(seed)
+	
+	
+	# load a recorded replay log; a log whose session did not exit normally may be cut off part way
+	# through a line
+	def Load(self):
+		lines = []
+		with gzip.open(self.filename, 'rt', encoding='utf-8') as f:
+			try:
+				for line in f:
+					lines.append(line)
+			except EOFError:
+				pass
+		if len(lines) > 0 and not lines[-1].endswith('\n'):
+			lines.pop()
+		self.header = json.loads(lines[0])
+		for line in lines[1:]:
+			self.entries.append(json.loads(line))
+	
+	
+	# write one entry to the log, and flush it so that it is kept even if the game crashes
+	def WriteEntry(self, entry):
+		self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+		self.file.flush()
+	
+	
+	# record the current key, mouse, and game controller input, given to the input loop named by context
+	def RecordInput(self, context):
+		
+		# inputs that only end a pause are not recorded, since pauses are skipped during playback
+		if context == 'Wait': return
+		
+		self.WriteEntry(['i', key.vk, key.c, key.text, key.shift, mouse.cx, mouse.cy, mouse.lbutton_pressed,
+			mouse.rbutton_pressed, mouse.wheel_up, mouse.wheel_down, session.gamepad_input,
+			session.left_stick_direction, session.trigger_active])
+	
+	
+	# set the key, mouse, and game controller input to the next recorded input; called by
+	# GetInputEvent. Ends the game once all inputs have been played back
+	def GetInput(self):
+		
+		# any recorded checkpoints before this input were not reached
+		while self.next_entry < len(self.entries) and self.entries[self.next_entry][0] == 'c':
+			self.checkpoints += 1
+			self.ReportMismatch('checkpoint ' + self.entries[self.next_entry][1] + ' was not reached')
+			self.next_entry += 1
+		
+		if self.next_entry >= len(self.entries):
+			self.Finish()
+		
+		(vk, c, text, shift, cx, cy, lbutton, rbutton, wheel_up, wheel_down, gamepad_input,
+			left_stick_direction, trigger_active) = self.entries[self.next_entry][1:]
+		self.next_entry += 1
+		
+		key.vk = vk
+		key.c = c
+		key.text = text
+		key.shift = shift
+		mouse.cx = cx
+		mouse.cy = cy
+		mouse.lbutton_pressed = lbutton
+		mouse.rbutton_pressed = rbutton
+		mouse.wheel_up = wheel_up
+		mouse.wheel_down = wheel_down
+		session.gamepad_input = gamepad_input
+		session.left_stick_direction = left_stick_direction
+		session.trigger_active = trigger_active
+		session.key_down = False
+		return True
+	
+	
+	# record a hash of the current game state, or check it against the next recorded checkpoint
+	def Checkpoint(self, name):
+		self.checkpoints += 1
+		state_hash = GetGameStateHash()
+		
+		if not self.playback:
+			self.WriteEntry(['c', name, state_hash])
+			return
+		
+		if self.next_entry >= len(self.entries) or self.entries[self.next_entry][0] != 'c':
+			self.ReportMismatch('checkpoint ' + name + ' was not reached in the recording')
+			return
+		
+		(recorded_name, recorded_hash) = self.entries[self.next_entry][1:]
+		self.next_entry += 1
+		if recorded_name != name:
+			self.ReportMismatch('reached checkpoint ' + name + ' instead of ' + recorded_name)
+		elif recorded_hash != state_hash:
+			self.ReportMismatch('game state does not match recording at checkpoint ' + name)
+	
+	
+	# report a difference between playback and the recording
+	def ReportMismatch(self, text):
+		self.mismatches += 1
+		print('REPLAY MISMATCH at checkpoint ' + str(self.checkpoints) + ': ' + text)
+	
+	
+	# all recorded inputs have been played back: report the results and exit, with an error status
+	# if any checkpoints did not match
+	def Finish(self):
+		print('Replay finished: ' + str(len(self.entries)) + ' entries and ' + str(self.checkpoints) +
+			' checkpoints in ' + str(round(time.time() - self.start_time, 2)) + ' seconds, ' +
+			str(self.mismatches) + ' mismatches')
+		if self.mismatches > 0:
+			sys.exit(1)
+		sys.exit()
+	
+
 # clear all keyboard events
 def FlushKeyboardEvents():
 	exit = False
@@ -35029,8 +36087,22 @@ def FlushKeyboardEvents():
 	session.key_down = False
 
 
+# return True if turbo mode is on and pauses and animations in this category are not being kept;
+# pauses with no category are never skipped
+def TurboSkip(category):
+	if category is None: return False
+	if not config['ArmCom2'].getboolean('turbo_mode'): return False
+	return category not in [x.strip() for x in config['ArmCom2']['turbo_keep'].split(',')]
+
+
 # wait for a specified amount of miliseconds, refreshing the screen in the meantime
-def Wait(wait_time, allow_skip=False, ignore_animations=False):
+def Wait(wait_time, allow_skip=False, ignore_animations=False, category=None):
+	
+	# no screen to refresh when headless
+	if HEADLESS: return
+	
+	# pause is skipped in turbo mode
+	if TurboSkip(category): return
 	
 	# check for debug fast mode
 	if DEBUG:
@@ -35051,7 +36123,7 @@ def Wait(wait_time, allow_skip=False, ignore_animations=False):
 		if not ignore_animations:
 			CheckForAnimationUpdate()
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Wait'): continue
 		
 		if allow_skip:
 			if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
@@ -35069,7 +36141,7 @@ def WaitForContinue(allow_cancel=False, ignore_animations=False):
 		if not ignore_animations:
 			CheckForAnimationUpdate()
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Continue'): continue
 		if (key.vk in [sdl2.SDLK_BACKSPACE, sdl2.SDLK_ESCAPE] or session.gamepad_input == 1) and allow_cancel:
 			end_pause = True
 			cancel = True
@@ -35086,7 +36158,7 @@ def WaitForAttackInput(fate_point_allowed):
 	while not end_pause:
 		CheckForAnimationUpdate()
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Attack Input'): continue
 		if key.vk in [sdl2.SDLK_BACKSPACE, sdl2.SDLK_ESCAPE] or session.gamepad_input == 1:
 			return 'cancel'
 		elif key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB] or session.gamepad_input == 0:
@@ -35110,21 +36182,21 @@ def CheckForAnimationUpdate():
 	if scenario is not None:
 		if scenario.init_complete:
 			if time.time() - session.weather_anim_timer >= weather_update_timer:
-				scenario.UpdateAnimCon(weather=True)
+				RunInRNGStream('Cosmetic', scenario.UpdateAnimCon, weather=True)
 				scenario.UpdateScenarioDisplay()
 			
 			if time.time() - session.anim_timer >= anim_update_timer:
-				scenario.UpdateAnimCon()
+				RunInRNGStream('Cosmetic', scenario.UpdateAnimCon)
 				scenario.UpdateScenarioDisplay()
 		
 	elif campaign_day is not None:
 		if campaign_day.started and not campaign_day.ended:
 			if time.time() - session.weather_anim_timer >= weather_update_timer:
-				campaign_day.UpdateAnimCon(weather=True)
+				RunInRNGStream('Cosmetic', campaign_day.UpdateAnimCon, weather=True)
 				campaign_day.UpdateCDDisplay()	
 			
 			if time.time() - session.anim_timer >= anim_update_timer:
-				campaign_day.UpdateAnimCon()
+				RunInRNGStream('Cosmetic', campaign_day.UpdateAnimCon)
 				campaign_day.UpdateCDDisplay()	
 	
 	# display message console overtop if any
@@ -35389,7 +36461,110 @@ def GetFacing(attacker, target, turret_facing=False):
 
 # return a random float between 0.0 and 100.0
 def GetPercentileRoll():
-	return float(libtcod.random_get_int(0, 0, 1000)) / 10.0
+	if roll_buffer is None:
+		return float(libtcod.random_get_int(0, 0, 1000)) / 10.0
+	return roll_buffer.GetRoll()
+	
+
+# return a new roll buffer with the given seed, or None if numpy is not available, in which case
+# percentile rolls are drawn one at a time from libtcod; drawing in bulk without numpy is no faster
+def NewRollBuffer(seed):
+	if numpy is None: return None
+	return RollBuffer(seed)
+	
+
+# RollBuffer: serves percentile rolls from a block of rolls drawn in bulk from its own numpy generator;
+# rolls are 0.0 - 100.0 in steps of 0.1, the same as those drawn one at a time from libtcod. The
+# generator is only created once the first roll is needed. Buffers are long-lived, since creating
+# one costs more than drawing a few rolls from libtcod
+class RollBuffer:
+	def __init__(self, seed):
+		self.seed = seed
+		self.generator = None
+		self.block_size = ROLL_BUFFER_MIN_BLOCK
+		self.rolls = []				# rolls drawn but not yet used
+	
+	
+	# draw the next block of rolls
+	def Refill(self):
+		if self.generator is None:
+			self.generator = numpy.random.default_rng(self.seed)
+		self.rolls = (self.generator.integers(0, 1001, self.block_size) / 10.0).tolist()
+		if self.block_size < ROLL_BUFFER_MAX_BLOCK:
+			self.block_size *= 2
+	
+	
+	# return the next roll
+	def GetRoll(self):
+		if len(self.rolls) == 0:
+			self.Refill()
+		return self.rolls.pop()
+	
+
+# run a function with both the default libtcod generator and the python random module seeded
+# with the given seed, then restore both to their previous states so that the main game sequence
+# is unaffected; percentile rolls are drawn from the seeded libtcod generator, since most seeded
+# runs make only a few. Returns whatever the function returns
+def RunSeeded(seed, function, *args):
+	global roll_buffer
+	tcod_backup = libtcod.random_save(0)
+	random_backup = random.getstate()
+	roll_buffer_backup = roll_buffer
+	seeded_generator = libtcod.random_new_from_seed(seed)
+	libtcod.random_restore(0, seeded_generator)
+	random.seed(seed)
+	roll_buffer = None
+	try:
+		return function(*args)
+	finally:
+		libtcod.random_restore(0, tcod_backup)
+		random.setstate(random_backup)
+		roll_buffer = roll_buffer_backup
+		libtcod.random_delete(tcod_backup)
+		libtcod.random_delete(seeded_generator)
+
+
+# run a function with the default libtcod generator and the python random module drawing from one of
+# the campaign's random number streams, so that its rolls neither change nor are changed by those
+# made in any other part of the game; the python stream carries on from where it left off, and the
+# libtcod generator is seeded from it. Each stream keeps one percentile roll buffer for the whole
+# campaign, seeded from the stream the first time it is used. Runs the function normally if there is
+# no campaign, or if this stream is already in use; returns whatever the function returns
+def RunInRNGStream(stream, function, *args, **kwargs):
+	global roll_buffer
+	if campaign is None or session.rng_stream == stream:
+		return function(*args, **kwargs)
+	
+	rng = campaign.rng_streams[stream]
+	previous_stream = session.rng_stream
+	tcod_backup = libtcod.random_save(0)
+	random_backup = random.getstate()
+	roll_buffer_backup = roll_buffer
+	stream_generator = libtcod.random_new_from_seed(rng.getrandbits(31))
+	libtcod.random_restore(0, stream_generator)
+	if session.stream_roll_buffer_campaign is not campaign:
+		session.stream_roll_buffers = {}
+		session.stream_roll_buffer_campaign = campaign
+	if stream not in session.stream_roll_buffers:
+		session.stream_roll_buffers[stream] = NewRollBuffer(rng.getrandbits(31))
+	roll_buffer = session.stream_roll_buffers[stream]
+	random.setstate(rng.getstate())
+	session.rng_stream = stream
+	try:
+		return function(*args, **kwargs)
+	finally:
+		rng.setstate(random.getstate())
+		session.rng_stream = previous_stream
+		libtcod.random_restore(0, tcod_backup)
+		random.setstate(random_backup)
+		roll_buffer = roll_buffer_backup
+		libtcod.random_delete(tcod_backup)
+		libtcod.random_delete(stream_generator)
+
+
+# return the generation seed for a campaign day map pool key: (campaign map seed, map key, index)
+def GetCDMapSeed(pool_key):
+	return zlib.crc32(str(pool_key).encode('utf-8'))
 
 
 # return a percentage chance based on a given 2d6 score
@@ -35432,6 +36607,756 @@ def RestrictChanceNew(chance):
 	return chance
 
 
+# calculate the base AP score for a weapon, of a given unit type, firing a given ammo type at an armoured or
+# unarmoured location; returns None for AT rifles and close combat weapons, which also depend on the attacker
+# and the current date
+def CalcAPBaseScore(unit_id, unit_stats, weapon_stats, ammo_type, unarmoured_location):
+	base_score = None
+	
+	if 'custom_ap' in weapon_stats:
+		base_score = int(weapon_stats.get('custom_ap'))
+	
+	elif weapon_stats.get('type') in MG_WEAPONS:
+		calibre = weapon_stats.get('calibre')
+		if calibre is None:
+			base_score = 4
+		elif calibre in ['13', '14', '15']:
+			base_score = 5
+		else:
+			base_score = 4
+		
+	elif weapon_stats.get('name') == 'Rifles':
+		base_score = 2
+		
+	# AT rifle and close combat scores depend on the attacker or the current date
+	elif weapon_stats.get('name') == 'AT Rifle' or weapon_stats.get('type') == 'Close Combat':
+		return None
+	
+	# vehicle flame thrower
+	elif weapon_stats.get('type') == 'Flame Thrower':
+		base_score = 8
+	
+	else:
+		calibre = weapon_stats.get('calibre')
+		
+		# C/SH ammo
+		if ammo_type in ['C', 'SH']:
+			base_score = 0
+		
+		# AP ammo
+		elif ammo_type == 'AP':
+			
+			# unarmoured location
+			if unarmoured_location:
+				calibre = int(calibre)
+				if calibre <= 28:
+					base_score = 7
+				elif calibre <= 57:
+					base_score = 8
+				elif calibre <= 77:
+					base_score = 9
+				elif calibre <= 95:
+					base_score = 10
+				else:
+					base_score = 11
+			
+			# armoured location
+			else:
+				origin_nation = None
+				if 'origin_nation' in unit_stats:
+					origin_nation = unit_stats['origin_nation']
+				
+				if weapon_stats.get('long_range') is not None:
+					calibre += weapon_stats.get('long_range')
+				
+				# modded weapons
+				if 'custom_ammo_ap' in weapon_stats:
+					if 'AP' in weapon_stats['custom_ammo_ap']:
+						base_score = int(weapon_stats['custom_ammo_ap']['AP'])
+				
+				# special cases first
+				if base_score is None and calibre == '75' and ('Lee' in unit_id or 'Grant' in unit_id or 'M3S' in unit_id):
+					base_score = 13
+				
+				if base_score is None and origin_nation is not None:
+					if calibre == '75S' and origin_nation == 'Empire of Japan':
+						base_score = 12
+					elif calibre == '76L' and origin_nation == 'Soviet Union':
+						base_score = 13
+					elif calibre == '76LL' and origin_nation == 'Soviet Union':
+						base_score = 16
+					elif calibre == '90L' and origin_nation == 'Italy':
+						base_score = 20
+					
+				# all other cases
+				if base_score is None:
+					if weapon_stats.get('name') == 'AT Rifle':
+						base_score = 5
+					elif calibre in ['15', '20']:
+						base_score = 5
+					elif calibre in ['20L']:
+						base_score = 6
+					elif calibre in ['20LL', '25LL', '37S', '30']:
+						base_score = 7
+					elif calibre in ['37', '40', '47S', '57S', '70S']:
+						base_score = 8
+					elif calibre in ['37L', '57', '65S', '76S']:
+						base_score = 9
+					elif calibre in ['40L', '45L', '47', '75S']:
+						base_score = 10
+					elif calibre in ['37LL', '45LL', '47L', '50']:
+						base_score = 11
+					elif calibre in ['76', '84S']:
+						base_score = 12
+					elif calibre in ['50L', '88', '120S']:
+						base_score = 13
+					elif calibre in ['75', '105']:
+						base_score = 14
+					elif calibre in ['57L', '57LL']:
+						base_score = 15
+					elif calibre in ['75L', '76L', '85L', '150S', '152S']:
+						base_score = 17
+					elif calibre in ['80L']:
+						base_score = 18
+					elif calibre in ['77L', '200L']:
+						base_score = 19
+					elif calibre in ['88L']:
+						base_score = 20
+					elif calibre in ['90L', '105L', '150', '152', '155']:
+						base_score = 21
+					elif calibre in ['75LL', '76LL']:
+						base_score = 23
+					elif calibre in ['122L']:
+						base_score = 25
+					elif calibre in ['88LL', '100L', '120L']:
+						base_score = 27
+					elif calibre in ['150L', '155L']:
+						base_score = 28
+					elif calibre in ['140L']:
+						base_score = 32
+					elif calibre in ['128L', '170L']:
+						base_score = 33
+		
+		# APCR/APDS ammo
+		elif ammo_type in ['APCR', 'APDS']:
+			
+			# unarmoured location
+			if unarmoured_location:
+				calibre = int(calibre)
+				if calibre <= 28:
+					base_score = 7
+				elif calibre <= 57:
+					base_score = 8
+				elif calibre <= 77:
+					base_score = 9
+				elif calibre <= 95:
+					base_score = 10
+				else:
+					base_score = 11
+			
+			# armoured location
+			else:
+				
+				if weapon_stats.get('long_range') is not None:
+					calibre += weapon_stats.get('long_range')
+				
+				origin_nation = None
+				if 'origin_nation' in unit_stats:
+					origin_nation = unit_stats['origin_nation']
+				
+				if ammo_type == 'APDS':
+					
+					# modded weapons
+					if 'custom_ammo_ap' in weapon_stats:
+						if 'APDS' in weapon_stats['custom_ammo_ap']:
+							base_score = int(weapon_stats['custom_ammo_ap']['APDS'])
+					
+					if base_score is None:
+						if calibre in ['57L', '57LL']:
+							base_score = 18
+						elif calibre == '77L':
+							base_score = 19
+						elif calibre == '76LL':	
+							if origin_nation is None:
+								base_score = 25
+							else:
+								if origin_nation == 'Soviet Union':
+									base_score = 18
+								else:
+									base_score = 25
+				else:
+					
+					# modded weapons
+					if 'custom_ammo_ap' in weapon_stats:
+						if 'APCR' in weapon_stats['custom_ammo_ap']:
+							base_score = int(weapon_stats['custom_ammo_ap']['APCR'])
+					
+					if base_score is None:
+						if calibre == '37L':
+							base_score = 10
+						elif calibre in ['28LL', '45L']:
+							base_score = 12
+						elif calibre in ['45LL', '47L']:
+							base_score = 13
+						elif calibre in ['40LL', '50']:
+							base_score = 14
+						elif calibre == '76L':	
+							if origin_nation is None:
+								base_score = 20
+							else:
+								if origin_nation == 'Soviet Union':
+									base_score = 14
+								elif origin_nation == 'United States of America':
+									base_score = 22
+								else:
+									base_score = 20
+						elif calibre == '50L':
+							base_score = 17
+						elif calibre == '57LL':
+							base_score = 18
+						elif calibre in ['75', '85L']:
+							base_score = 19
+						elif calibre == '75L':
+							base_score = 20
+						elif calibre == '88L':
+							base_score = 23
+						elif calibre == '90L':
+							base_score = 27
+		
+		# HEAT ammo
+		elif ammo_type == 'HEAT':
+			
+			# unarmoured location
+			if unarmoured_location:
+				base_score = 11
+			
+			# armoured location
+			else:
+				
+				# modded weapons
+				if 'custom_ammo_ap' in weapon_stats:
+					if 'HEAT' in weapon_stats['custom_ammo_ap']:
+						base_score = int(weapon_stats['custom_ammo_ap']['HEAT'])
+				
+				if base_score is None:
+					if calibre in ['57', '65', '94']:
+						base_score = 11
+					elif calibre == '70':
+						base_score = 12
+					elif calibre in ['75', '76', '88']:
+						base_score = 13
+					elif calibre == '100':
+						base_score = 14
+					elif calibre in ['105', '114']:
+						base_score = 15
+					elif calibre == '95':
+						base_score = 16
+					elif calibre == '122':
+						base_score = 17
+					elif calibre == '150':
+						base_score = 21
+					elif calibre in ['37', '47']:
+						base_score = 26
+					elif calibre == '380':		# Sturmtiger launcher
+						base_score = 30
+		
+		# HE hit
+		elif ammo_type == 'HE':
+			
+			calibre = int(calibre)
+			
+			if unarmoured_location:
+				if calibre <= 20:
+					base_score = 6
+				elif calibre <= 30:
+					base_score = 8
+				elif calibre <= 40:
+					base_score = 9
+				elif calibre <= 50:
+					base_score = 10
+				elif calibre <= 70:
+					base_score = 12
+				elif calibre <= 80:
+					base_score = 14
+				elif calibre <= 100:
+					base_score = 16
+				elif calibre <= 120:
+					base_score = 18
+				else:
+					base_score = 20
+			
+			# armoured location
+			else:
+				
+				if calibre <= 20:
+					base_score = 3
+				elif calibre <= 30:
+					base_score = 4
+				elif calibre <= 40:
+					base_score = 5
+				elif calibre <= 50:
+					base_score = 6
+				elif calibre <= 70:
+					base_score = 7
+				elif calibre <= 80:
+					base_score = 8
+				elif calibre <= 100:
+					base_score = 10
+				elif calibre <= 120:
+					base_score = 12
+				else:
+					base_score = 16
+	
+	return base_score
+
+
+# return the base AP score for a weapon firing a given ammo type at an armoured or unarmoured location,
+# from the AP score table if possible; returns None for AT rifles and close combat weapons
+def GetAPBaseScore(weapon, ammo_type, unarmoured_location):
+	key = (weapon.unit.unit_id, weapon.stats['name'], ammo_type, unarmoured_location)
+	if key not in session.ap_base_scores:
+		session.ap_base_scores[key] = CalcAPBaseScore(weapon.unit.unit_id, weapon.unit.stats,
+			weapon.stats, ammo_type, unarmoured_location)
+	return session.ap_base_scores[key]
+
+
+# build the AP score table for every weapon and ammo type that each unit type can field; weapons
+# added during a scenario are added to the table when first used
+def BuildAPBaseScoreTable():
+	session.ap_base_scores = {}
+	for unit_id, unit_stats in session.unit_types.items():
+		if 'weapon_list' not in unit_stats: continue
+		for weapon_stats in unit_stats['weapon_list']:
+			name = weapon_stats.get('name')
+			if name is None:
+				name = GetWeaponName(weapon_stats)
+			ammo_type_list = [None]
+			if 'ammo_type_list' in weapon_stats:
+				ammo_type_list = weapon_stats['ammo_type_list']
+			for ammo_type in ammo_type_list:
+				for unarmoured_location in [False, True]:
+					session.ap_base_scores[(unit_id, name, ammo_type, unarmoured_location)] = CalcAPBaseScore(
+						unit_id, unit_stats, weapon_stats, ammo_type, unarmoured_location)
+
+
+# write the AP score table to a CSV file in the log folder, returns the filename
+def ExportAPBaseScoreTable():
+	filename = session.log_path + os.sep + 'ap_score_table_' + datetime.now().strftime("%Y-%m-%d_%H_%M_%S") + '.csv'
+	with open(filename, 'w', encoding='utf-8') as f:
+		f.write('Unit,Weapon,Ammo,Armoured Base Score,Unarmoured Base Score\n')
+		for key in sorted(session.ap_base_scores.keys(), key=lambda x: str(x)):
+			(unit_id, name, ammo_type, unarmoured_location) = key
+			if unarmoured_location: continue
+			base_score = session.ap_base_scores[key]
+			unarmoured_score = session.ap_base_scores.get((unit_id, name, ammo_type, True))
+			
+			# skip weapons and ammo types with no AP score
+			if base_score is None and unarmoured_score is None: continue
+			
+			if ammo_type is None:
+				ammo_type = ''
+			f.write('"' + unit_id + '","' + name + '",' + ammo_type + ',' + str(base_score) + ',' +
+				str(unarmoured_score) + '\n')
+	return filename
+
+
+# generate a descriptive name for a weapon that doesn't have one in its stats
+def GetWeaponName(weapon_stats):
+	if weapon_stats['type'] == 'Gun':
+		text = weapon_stats['calibre']
+		if 'long_range' in weapon_stats:
+			text += weapon_stats['long_range']
+		if 'autocannon' in weapon_stats:
+			text += 'a'
+		return text
+	
+	elif weapon_stats['type'] == 'Cannon':
+		return weapon_stats['calibre'] + 'mm Cannon'
+	
+	# high-calibre MG
+	elif weapon_stats['type'] in MG_WEAPONS and 'calibre' in weapon_stats:
+		return weapon_stats['type'] + '+'
+	
+	return weapon_stats['type']
+
+
+# return the result of an AP or HE profile whose outcome is already certain, or '' if a roll is needed
+def GetAutomaticAttackResult(profile):
+	if profile['type'] == 'ap':
+		if profile['final_chance'] == 0.0:
+			return 'NO PENETRATION'
+		elif profile['final_chance'] == 100.0:
+			return 'PENETRATED'
+	elif profile['type'] == 'he':
+		if profile['final_chance'] == 0.0:
+			return 'NO EFFECT'
+		elif profile['final_chance'] == 100.0:
+			return 'DESTROYED'
+	return ''
+
+
+# return the result of a failed HE destruction roll against an unarmoured AI vehicle, depending on
+# whether the secondary roll came up immobilized or stunned
+def GetHEEffectResult(target, immobilize):
+	if immobilize:
+		if not target.immobilized:
+			return 'IMMOBILIZED'
+	elif target.ai.state != 'Stunned':
+		return 'STUNNED'
+	return 'NO EFFECT'
+
+
+# determine the result of an attack or AP/HE profile from a percentile roll, without displaying
+# anything; records the roll, location hit, and effective FP in the profile and returns the result text
+# if preview is True, only the result text is determined: no secondary rolls are made, the location
+# hit is not set, and effective FP is not calculated for HE hits, since that can change the target
+def GetAttackRollResult(profile, roll, preview=False):
+	
+	profile['roll'] = roll
+	
+	# determine location hit on target (not always used). Don't reroll this if doing an AP or HE kill roll.
+	if 'location' not in profile and not preview:
+		if GetPercentileRoll() <= profile['target'].GetHullHitChance(profile['ballistic_attack']):
+			profile['location'] = 'Hull'
+		else:
+			profile['location'] = 'Turret'
+	
+	profile['effective_fp'] = 0
+	
+	# armour penetration roll
+	if profile['type'] == 'ap':
+		if roll >= CRITICAL_MISS:
+			result_text = 'NO PENETRATION'
+		elif roll <= CRITICAL_HIT:
+			result_text = 'PENETRATED'
+		elif roll <= profile['final_chance']:
+			result_text = 'PENETRATED'
+		else:
+			result_text = 'NO PENETRATION'
+		
+		# modify message for unarmoured targets
+		if result_text == 'NO PENETRATION' and profile['target'].GetStat('armour') is None:
+			result_text = 'MINOR DAMAGE'
+	
+	# HE destruction roll
+	elif profile['type'] == 'he':
+		if roll <= profile['final_chance']:
+			result_text = 'DESTROYED'
+		else:
+			
+			# should be an unarmoured vehicle, but just make sure
+			if profile['target'].GetStat('armour') is not None:
+				result_text = 'NO EFFECT'
+			else:
+				
+				# player target
+				if profile['target'].ai is None:
+					if not profile['target'].immobilized:
+						result_text = 'IMMOBILIZED'
+					else:
+						result_text = 'NO EFFECT'
+				
+				# AI target; previews calculate the odds of each result separately
+				elif preview:
+					raise ValueError('HE effect roll cannot be previewed')
+				else:
+					result_text = GetHEEffectResult(profile['target'], GetPercentileRoll() <= HE_IMMOBILIZE_CHANCE)
+	
+	# area fire attack
+	elif profile['type'] == 'Area Fire':
+		if roll <= profile['critical_effect']:
+			
+			# no critical effect possible if original odds were <= 3%
+			if profile['final_chance'] <= 3.0:
+				result_text = 'FULL EFFECT'
+				profile['effective_fp'] = profile['base_fp']
+			else:
+				result_text = 'CRITICAL EFFECT'
+				profile['effective_fp'] = profile['base_fp'] * 2
+		elif roll <= profile['full_effect']:
+			result_text = 'FULL EFFECT'
+			profile['effective_fp'] = profile['base_fp']
+		elif roll <= profile['final_chance']:
+			result_text = 'PARTIAL EFFECT'
+			profile['effective_fp'] = int(floor(profile['base_fp'] / 2))
+			if profile['effective_fp'] < 1:
+				profile['effective_fp'] = 1
+		else:
+			result_text = 'NO EFFECT'
+		
+		# overrun attacks get bonus FP
+		if profile['overrun']:
+			profile['effective_fp'] = profile['effective_fp'] * 2
+		
+		# unspotted targets take half FP rounded up
+		if not profile['target'].spotted:
+			profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
+		
+		# might be converted into an AP MG hit
+		if result_text in ['FULL EFFECT', 'CRITICAL EFFECT'] and profile['target'].GetStat('armour') is not None:
+			if profile['weapon'].GetStat('type') in MG_WEAPONS:
+				if result_text == 'FULL EFFECT':
+					result_text = 'HIT'
+				else:
+					result_text = 'CRITICAL HIT'
+			
+			# rifle weapons can result in an AP check if within 1 hex from target; compatibility check here for 1.2.13
+			elif profile['weapon'].GetStat('type') in RIFLE_WEAPONS and 'distance' in profile:
+				if profile['distance'] <= 1:
+					if result_text == 'FULL EFFECT':
+						result_text = 'HIT'
+					else:
+						result_text = 'CRITICAL HIT'
+	
+	# vehicle flame thrower attack
+	elif profile['type'] == 'Flame Thrower':
+		if roll <= profile['full_effect']:
+			result_text = 'FULL EFFECT'
+			profile['effective_fp'] = profile['base_fp']
+		elif roll <= profile['final_chance']:
+			result_text = 'PARTIAL EFFECT'
+			profile['effective_fp'] = int(floor(profile['base_fp'] / 2))
+			if profile['effective_fp'] < 1:
+				profile['effective_fp'] = 1
+		else:
+			result_text = 'NO EFFECT'
+		
+		# overrun attacks get bonus FP
+		if profile['overrun']:
+			profile['effective_fp'] = profile['effective_fp'] * 2
+		
+		# unspotted targets take half FP rounded up
+		if not profile['target'].spotted:
+			profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
+		
+		# might be converted into an AP hit
+		if result_text in ['FULL EFFECT', 'CRITICAL EFFECT']:
+			if profile['target'].GetStat('armour') is not None:
+				if result_text == 'FULL EFFECT':
+					result_text = 'HIT'
+
+	# point fire or close combat attack
+	else:
+		
+		if roll >= CRITICAL_MISS:
+			result_text = 'MISS'
+		
+		elif roll <= profile['critical_hit'] and profile['ammo_type'] not in ['Smoke', 'WP']:
+			
+			# make sure that original roll was a success
+			if roll > profile['final_chance']:
+				result_text = 'MISS'
+			else:
+				# no critical hit possible if original odds were <= 3%
+				if profile['final_chance'] <= 3.0:
+					result_text = 'HIT'
+				else:
+					result_text = 'CRITICAL HIT'
+		
+		elif profile['ammo_type'] == 'HE':
+			if roll <= profile['full_effect']:
+				result_text = 'HIT'
+			elif roll <= profile['final_chance']:
+				result_text = 'PARTIAL HIT'
+			else:
+				result_text = 'MISS'
+		
+		elif roll <= profile['final_chance']:
+			result_text = 'HIT'
+		else:
+			result_text = 'MISS'
+		
+		# calculate effective FP
+		if result_text in ['HIT', 'CRITICAL HIT', 'PARTIAL HIT']:
+			
+			if profile['type'] == 'Close Combat':
+				profile['effective_fp'] = int(profile['weapon'].GetStat('fp'))
+				if result_text == 'CRITICAL HIT':
+					profile['effective_fp'] = profile['effective_fp'] * 2
+			
+			elif profile['type'] == 'Point Fire':
+				if profile['ammo_type'] == 'WP':
+					profile['effective_fp'] = WP_FP
+				elif profile['ammo_type'] in ['C', 'SH']:
+					calibre = int(profile['weapon'].GetStat('calibre'))
+					if calibre <= 37:
+						profile['effective_fp'] = 12
+					elif calibre <= 75:
+						profile['effective_fp'] = 20
+					else:
+						profile['effective_fp'] = 24
+				elif profile['target'].GetStat('category') in ['Infantry', 'Cavalry', 'Gun']:
+					if profile['ammo_type'] in ['HE', 'HEAT']:
+						# set the result now so that the HE FP is calculated correctly
+						if not preview:
+							profile['result'] = result_text
+							profile['attacker'].CalcHEEffectiveFP(profile)
+					elif profile['ammo_type'] in AP_AMMO_TYPES:
+						profile['effective_fp'] = 1
+				elif not preview:
+					if profile['ammo_type'] in ['HE', 'HEAT']:
+						profile['result'] = result_text
+						profile['attacker'].CalcHEEffectiveFP(profile)
+			
+			# unspotted targets take half FP rounded up
+			if not profile['target'].spotted:
+				profile['effective_fp'] = ceil(profile['effective_fp'] * 0.5)
+	
+	# checks for HD target
+	if 'hd_mod' in profile:
+		
+		# if final roll failed and was within the HD save modifier, change message to reflect that it was a HD save
+		if result_text == 'MISS':
+			if 'full_effect' in profile:
+				if roll + profile['hd_mod'] >= profile['full_effect']: 
+					result_text = 'HULL DOWN SAVED'
+			elif 'final_chance' in profile:
+				if roll + profile['hd_mod'] >= profile['final_chance']:
+					result_text = 'HULL DOWN SAVED'
+		
+		# if final roll passed and target was HD, roll to see if hit location is changed to turret
+		elif result_text in ['HIT', 'CRITICAL HIT'] and not preview and profile['location'] == 'Hull':
+			if GetPercentileRoll() >= profile['hd_mod']:
+				profile['location'] = 'Turret'
+	
+	return result_text
+
+
+# check whether the weapon in an attack profile maintains its rate of fire, returns True if so
+def CheckAttackRoF(profile):
+	profile['weapon'].maintained_rof = False
+	if profile['type'] in ['ap', 'he'] or profile['immobilize'] or profile['defensive_fire']:
+		return False
+	chance = profile['weapon'].GetRoFChance()
+	if chance > 0.0:
+		if GetPercentileRoll() <= chance:
+			profile['weapon'].maintained_rof = True
+			profile['weapon'].rof_shots += 1
+	return profile['weapon'].maintained_rof
+
+
+# roll for and resolve an attack or AP/HE profile without any display or animation, for when
+# the outcome is needed at full speed; returns the modified profile
+def ResolveAttackRoll(profile):
+	result_text = GetAutomaticAttackResult(profile)
+	roll = None
+	if result_text == '':
+		roll = GetPercentileRoll()
+		result_text = GetAttackRollResult(profile, roll)
+	profile['result'] = result_text
+	if session.analytics is not None:
+		session.analytics.RecordShot(profile, roll)
+	CheckAttackRoF(profile)
+	return profile
+
+
+# return the percentage chance that a percentile roll will be equal to or less than a given score
+def GetPercentileRollOdds(score):
+	rolls = int(floor(score * 10.0 + 0.001)) + 1
+	return float(min(max(rolls, 0), 1001)) * 100.0 / 1001.0
+
+
+# calculate the chance of each possible result of the roll for an attack or AP/HE profile, returns a
+# dictionary of result text and percentage chance; the result can only change where the roll crosses
+# one of the profile's thresholds, so only one roll from each range between them needs to be resolved.
+# Makes no rolls and does not change the profile or its target
+def CalcAttackRollOdds(profile):
+	result_text = GetAutomaticAttackResult(profile)
+	if result_text != '':
+		return {result_text : 100.0}
+	
+	thresholds = [CRITICAL_HIT, CRITICAL_MISS, profile['final_chance']]
+	for k in ['critical_hit', 'full_effect', 'critical_effect']:
+		if k in profile:
+			thresholds.append(profile[k])
+	if 'hd_mod' in profile:
+		for score in thresholds[:]:
+			thresholds.append(score - profile['hd_mod'])
+	
+	# build a sorted list of where each range of rolls starts, in tenths of a percent
+	boundaries = [0, 1001]
+	for score in thresholds:
+		i = int(floor(score * 10.0 + 0.001))
+		for boundary in [i, i+1]:
+			if 0 < boundary < 1001 and boundary not in boundaries:
+				boundaries.append(boundary)
+	boundaries.sort()
+	
+	# a failed HE roll against an unarmoured AI vehicle leads to a secondary roll for its effect
+	he_effect_odds = None
+	if profile['type'] == 'he' and profile['target'].GetStat('armour') is None and profile['target'].ai is not None:
+		immobilize_chance = GetPercentileRollOdds(HE_IMMOBILIZE_CHANCE)
+		he_effect_odds = [(GetHEEffectResult(profile['target'], True), immobilize_chance),
+			(GetHEEffectResult(profile['target'], False), 100.0 - immobilize_chance)]
+	
+	odds = {}
+	for i in range(len(boundaries) - 1):
+		roll = float(boundaries[i]) / 10.0
+		range_chance = float(boundaries[i+1] - boundaries[i]) * 100.0 / 1001.0
+		if he_effect_odds is not None and roll > profile['final_chance']:
+			result_odds = he_effect_odds
+		else:
+			result_odds = [(GetAttackRollResult(profile.copy(), roll, preview=True), 100.0)]
+		for (result_text, chance) in result_odds:
+			if result_text not in odds:
+				odds[result_text] = 0.0
+			odds[result_text] += range_chance * chance / 100.0
+	return odds
+
+
+# calculate the chance of each final outcome of an attack profile, following any hit that would lead to
+# an armour penetration roll through to the result of that roll; returns a dictionary of result text
+# and percentage chance. Secondary rolls are accounted for by their odds rather than rolled, so this
+# makes no rolls and does not change the game state
+def CalcAttackOutcomes(profile):
+	
+	# check whether a given attack result would lead to an AP roll on the target
+	def CausesAPRoll(result_text):
+		if result_text not in ['HIT', 'CRITICAL HIT']: return False
+		if profile['target'].GetStat('category') in ['Infantry', 'Cavalry', 'Gun']: return False
+		if profile['ammo_type'] in ['Smoke', 'WP', 'C', 'SH']: return False
+		if profile['ballistic_attack'] and result_text != 'CRITICAL HIT': return False
+		if profile['target'].GetStat('armour') is None:
+			if profile['type'] != 'Point Fire' or profile['ammo_type'] not in AP_AMMO_TYPES:
+				return False
+		return True
+	
+	# chance of hitting the hull, which may be changed to the turret if the target is HD
+	hull_chance = GetPercentileRollOdds(profile['target'].GetHullHitChance(profile['ballistic_attack']))
+	if 'hd_mod' in profile:
+		hull_chance = hull_chance * GetPercentileRollOdds(profile['hd_mod'] - 0.05) / 100.0
+	location_odds = [('Hull', hull_chance), ('Turret', 100.0 - hull_chance)]
+	
+	# chance of a Demolition Charge or Molotov being placed on the top armour
+	placement_odds = [(None, 100.0)]
+	if profile['weapon'].GetStat('name') in TOP_ARMOUR_PLACEMENT_ODDS:
+		top_chance = 100.0 / float(TOP_ARMOUR_PLACEMENT_ODDS[profile['weapon'].GetStat('name')])
+		placement_odds = [(True, top_chance), (False, 100.0 - top_chance)]
+	
+	outcomes = {}
+	for result_text, chance in CalcAttackRollOdds(profile).items():
+		
+		if not CausesAPRoll(result_text):
+			if result_text not in outcomes:
+				outcomes[result_text] = 0.0
+			outcomes[result_text] += chance
+			continue
+		
+		for (location, location_chance) in location_odds:
+			if location_chance <= 0.0: continue
+			for (top_armour_placement, placement_chance) in placement_odds:
+				ap_profile = profile.copy()
+				ap_profile['result'] = result_text
+				ap_profile['location'] = location
+				ap_profile = scenario.CalcAP(ap_profile, top_armour_placement=top_armour_placement)
+				for ap_result, ap_chance in CalcAttackRollOdds(ap_profile).items():
+					if ap_result not in outcomes:
+						outcomes[ap_result] = 0.0
+					outcomes[ap_result] += chance * location_chance * placement_chance * ap_chance / 1000000.0
+	
+	return outcomes
+
+
 # save the current campaign to a backup
 def BackupGame():
 	if DEBUG:
@@ -35458,6 +37383,9 @@ def SaveGame():
 	if DEBUG:
 		if session.debug['Suspend Save']: return
 	
+	# simulated campaigns are never saved
+	if session.autopilot is not None: return
+	
 	path = SAVEPATH + campaign.filename + os.sep
 	if not os.path.isdir(path):
 		os.mkdir(path)
@@ -35488,6 +37416,15 @@ def LoadGame(directory):
 	# backward compatibility checks
 	if not hasattr(campaign, 'enemies_destroyed'):
 		campaign.enemies_destroyed = {}
+	if not hasattr(campaign, 'tanks_lost'):
+		campaign.tanks_lost = 0
+		campaign.crew_kia = 0
+	if not hasattr(campaign, 'cd_map_seed'):
+		campaign.cd_map_seed = libtcod.random_get_int(0, 0, 2147483647)
+		campaign.cd_maps_used = {}
+	if not hasattr(campaign, 'rng_streams'):
+		campaign.seed = libtcod.random_get_int(0, 0, 2147483647)
+		campaign.InitRNGStreams()
 	if scenario is not None:
 		if scenario.player_unit is not None:
 			for position in scenario.player_unit.positions_list:
@@ -35500,6 +37437,31 @@ def LoadGame(directory):
 				scenario.BuildRRManagementArray()
 			if not hasattr(scenario, 'player_attacking'):
 				scenario.player_attacking = True
+			for unit in scenario.units:
+				if not hasattr(unit, 'attack_mod_cache'):
+					unit.attack_mod_cache = {}
+			if not hasattr(scenario, 'hit_log'):
+				scenario.hit_log = []
+			if not hasattr(scenario, 'rof_cache_hits'):
+				scenario.rof_cache_hits = 0
+				scenario.rof_cache_misses = 0
+			if not hasattr(scenario, 'ai_situation'):
+				scenario.ai_situation = None
+			if not hasattr(scenario, 'ai_profile'):
+				scenario.ai_profile = {}
+			if not hasattr(scenario, 'timings'):
+				scenario.timings = {}
+				scenario.timed_phase = None
+				scenario.phase_start = 0.0
+				scenario.turn_start = 0.0
+			for unit in scenario.units:
+				for weapon in unit.weapon_list:
+					if not hasattr(weapon, 'rof_chance_cache'):
+						weapon.rof_chance_cache = None
+	if campaign.player_unit is not None:
+		for weapon in campaign.player_unit.weapon_list:
+			if not hasattr(weapon, 'rof_chance_cache'):
+				weapon.rof_chance_cache = None
 
 
 # check the saved game to see if it is compatible with the current game version: Semantic Versioning https://semver.org/
@@ -35549,6 +37511,8 @@ def LoadCFG():
 		'message_pause',
 		'message_prompt',
 		'animation_speed',
+		'turbo_mode',
+		'turbo_keep',
 		'keyboard',
 		'glossary',
 		'active_controller'
@@ -35608,6 +37572,17 @@ def LoadCFG():
 					with open(DATAPATH + 'armcom2.cfg', 'w', encoding='utf8') as configfile:
 						config.write(configfile)
 					continue
+				
+				if k == 'turbo_mode' and k not in config['ArmCom2']:
+					config['ArmCom2']['turbo_mode'] = 'false'
+					config['ArmCom2']['turbo_keep'] = TURBO_DEFAULT_KEEP
+					SaveCFG()
+					continue
+				
+				if k == 'turbo_keep' and k not in config['ArmCom2']:
+					config['ArmCom2']['turbo_keep'] = TURBO_DEFAULT_KEEP
+					SaveCFG()
+					continue
 
 				if k not in config['ArmCom2']:
 					raise Exception('Missing config key: ' + k)
@@ -35636,6 +37611,8 @@ def LoadCFG():
 		'message_pause' : '1',
 		'message_prompt' : 'false',
 		'animation_speed' : '1',
+		'turbo_mode' : 'false',
+		'turbo_keep' : TURBO_DEFAULT_KEEP,
 		'keyboard' : '0',
 		'glossary' : 'English',
 		'active_controller' : '0'
@@ -35688,7 +37665,7 @@ def ShowNotification(text, confirm=False, add_pause=False, simple_yn=False):
 			'...')
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 		libtcod.console_flush()
-		Wait(200, ignore_animations=True)
+		Wait(200, ignore_animations=True, category='Messages')
 	
 	# if asking for confirmation, display yes/no choices, otherwise display a simple message
 	if gamepad is not None:
@@ -35723,7 +37700,7 @@ def ShowNotification(text, confirm=False, add_pause=False, simple_yn=False):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Notification', details={'confirm' : confirm}): continue
 		key_char = chr(key.c).lower()
 		if confirm:
 			if key_char in ['y', 'n'] or session.gamepad_input in [0, 1]:
@@ -35830,7 +37807,7 @@ def ShowSwapPositionMenu(spotting_phase=False):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Swap Position'): continue
 		
 		# continue
 		if key.vk in [sdl2.SDLK_RETURN, sdl2.SDLK_KP_ENTER, sdl2.SDLK_TAB, sdl2.SDLK_ESCAPE] or session.gamepad_input == 0:
@@ -36325,9 +38302,9 @@ def ShowGameMenu():
 		
 		# allow key repeating if we are scrolling through the glossary or message log
 		if 0 < session.active_menu_tab < 3:
-			if not GetInputEvent(allow_repeat=True): continue
+			if not GetInputEvent(allow_repeat=True, context='Game Menu'): continue
 		else:
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Game Menu'): continue
 		
 		# change active menu tab
 		if key.vk == sdl2.SDLK_ESCAPE and session.active_menu_tab != 0:
@@ -36614,6 +38591,12 @@ def DisplayGameOptions(console, x, y, skip_esc=False):
 		elif option_text == 'Animation Speed':
 			text = ['Fast', 'Normal', 'Slow'][config['ArmCom2'].getint('animation_speed')]
 		
+		elif option_text == 'Turbo Mode':
+			if config['ArmCom2'].getboolean('turbo_mode'):
+				text = 'ON'
+			else:
+				text = 'OFF'
+		
 		elif option_text == 'Unit Stack Display':
 			if config['ArmCom2'].getboolean('unit_stack_display'):
 				text = 'ON'
@@ -36808,6 +38791,13 @@ def ChangeGameSettings(main_menu=False):
 			i += 1
 		config['ArmCom2']['animation_speed'] = str(i)
 	
+	# toggle turbo mode
+	elif selected_option == 'Turbo Mode':
+		if config['ArmCom2'].getboolean('turbo_mode'):
+			config['ArmCom2']['turbo_mode'] = 'false'
+		else:
+			config['ArmCom2']['turbo_mode'] = 'true'
+	
 	# toggle unit stack display
 	elif selected_option == 'Unit Stack Display':
 		if config.getboolean('ArmCom2', 'unit_stack_display'):
@@ -37023,7 +39013,7 @@ def ShowTextInputMenu(prompt, original_text, max_length, string_list):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Text Input'): continue
 		
 		# ignore shift key being pressed
 		if key.vk in [sdl2.SDLK_LSHIFT, sdl2.SDLK_RSHIFT]:
@@ -37214,7 +39204,7 @@ def GetOption(option_list, menu_title=None):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Option'): continue
 		
 		if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
 			exit_menu = True
@@ -37238,6 +39228,131 @@ def GetOption(option_list, menu_title=None):
 	return option
 	
 
+# generate a number of campaign day maps for every region and mission type, using a copy of
+# the current campaign day for all other settings, and write the time taken for each to a file
+# in the log folder; returns the filename
+def BenchmarkCDMapGeneration(maps_per_type):
+	
+	global campaign_day
+	
+	current_campaign_day = campaign_day
+	current_region = campaign.stats['region']
+	
+	filename = session.log_path + os.sep + 'cd_map_benchmark_' + datetime.now().strftime("%Y-%m-%d_%H_%M_%S") + '.txt'
+	
+	try:
+		with open(filename, 'w', encoding='utf-8') as f:
+			f.write('ArmCom2 CD Map Generation Benchmark (' + VERSION + '), ' + str(maps_per_type) + ' maps per type\n\n')
+			f.write('Region,Mission,Total Seconds,Map ms,Capture VP ms\n')
+			
+			for region in session.regions.keys():
+				campaign.stats['region'] = region
+				for mission in MISSION_DESC.keys():
+					
+					# set up a copy of the current day for this mission; it will hold each new map in turn
+					campaign_day = copy(current_campaign_day)
+					campaign_day.mission = mission
+					campaign_day.rattenkrieg = mission in RATTENKRIEG_MISSIONS
+					
+					map_time = 0.0
+					vp_time = 0.0
+					for i in range(maps_per_type):
+						campaign_day.coastal_map = None
+						start_time = time.perf_counter()
+						campaign_day.GenerateCDMap(use_pool=False)
+						map_time += time.perf_counter() - start_time
+						
+						start_time = time.perf_counter()
+						for (hx, hy) in CAMPAIGN_DAY_HEXES:
+							campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
+						vp_time += time.perf_counter() - start_time
+					
+					f.write(region + ',' + mission + ',' + str(round(map_time + vp_time, 2)) + ',' +
+						str(round(map_time * 1000.0 / maps_per_type, 3)) + ',' +
+						str(round(vp_time * 1000.0 / maps_per_type, 3)) + '\n')
+	
+	# restore the current campaign day and region
+	finally:
+		campaign_day = current_campaign_day
+		campaign.stats['region'] = current_region
+	
+	return filename
+	
+
+# make a number of percentile rolls one at a time from libtcod and from a roll buffer, and write the
+# time taken and the spread of rolls for each to a file in the log folder. Rolls are also made a few
+# at a time, as they are in the game's random number stream entries, from libtcod, from a new roll
+# buffer for each entry, and from one roll buffer kept for all entries; returns the filename
+def BenchmarkPercentileRolls(num_rolls, entry_rolls):
+	
+	num_entries = num_rolls // entry_rolls
+	
+	# roll one at a time from the default libtcod generator
+	def RollUnbuffered():
+		return [float(libtcod.random_get_int(0, 0, 1000)) / 10.0 for i in range(num_rolls)]
+	
+	# roll from a new roll buffer
+	def RollBuffered():
+		buffer = RollBuffer(libtcod.random_get_int(0, 0, 2147483647))
+		return [buffer.GetRoll() for i in range(num_rolls)]
+	
+	# roll a few at a time from libtcod
+	def EntriesUnbuffered():
+		rolls = []
+		for i in range(num_entries):
+			for j in range(entry_rolls):
+				rolls.append(float(libtcod.random_get_int(0, 0, 1000)) / 10.0)
+		return rolls
+	
+	# roll a few at a time from a new roll buffer for each entry
+	def EntriesNewBuffer():
+		rolls = []
+		for i in range(num_entries):
+			buffer = RollBuffer(libtcod.random_get_int(0, 0, 2147483647))
+			for j in range(entry_rolls):
+				rolls.append(buffer.GetRoll())
+		return rolls
+	
+	# roll a few at a time from one roll buffer kept for all entries
+	def EntriesKeptBuffer():
+		rolls = []
+		buffer = RollBuffer(libtcod.random_get_int(0, 0, 2147483647))
+		for i in range(num_entries):
+			for j in range(entry_rolls):
+				rolls.append(buffer.GetRoll())
+		return rolls
+	
+	bulk_methods = [('libtcod', RollUnbuffered)]
+	entry_methods = [('libtcod', EntriesUnbuffered)]
+	if numpy is not None:
+		bulk_methods.append(('Roll Buffer', RollBuffered))
+		entry_methods.append(('New Roll Buffer per Entry', EntriesNewBuffer))
+		entry_methods.append(('Roll Buffer Kept for All Entries', EntriesKeptBuffer))
+	
+	filename = session.log_path + os.sep + 'roll_benchmark_' + datetime.now().strftime("%Y-%m-%d_%H_%M_%S") + '.txt'
+	
+	with open(filename, 'w', encoding='utf-8') as f:
+		f.write('ArmCom2 Percentile Roll Benchmark (' + VERSION + '), ' + str(num_rolls) + ' rolls\n')
+		if numpy is None:
+			f.write('numpy not available, rolls are always drawn from libtcod\n')
+		
+		for (title, method_list) in [('All at Once', bulk_methods),
+				(str(num_entries) + ' Entries of ' + str(entry_rolls) + ' Rolls', entry_methods)]:
+			f.write('\n' + title + '\n')
+			f.write('Method,Total Seconds,Rolls per Second,Min,Max,Mean,Distinct Values\n')
+			
+			for (method, function) in method_list:
+				start_time = time.perf_counter()
+				rolls = function()
+				total_time = time.perf_counter() - start_time
+				
+				f.write(method + ',' + str(round(total_time, 3)) + ',' + str(int(len(rolls) / total_time)) + ',' +
+					str(min(rolls)) + ',' + str(max(rolls)) + ',' + str(round(sum(rolls) / len(rolls), 3)) + ',' +
+					str(len(set(rolls))) + '\n')
+	
+	return filename
+
+
 # display the debug menu, not enabled in distribution versions
 def ShowDebugMenu():
 	
@@ -37270,7 +39385,7 @@ def ShowDebugMenu():
 		y = 8
 		libtcod.console_set_default_foreground(con, ACTION_KEY_COL)
 		for xm in range(len(DEBUG_OPTIONS)):
-			libtcod.console_print(con, x, y+(xm*2), str(xm+1))
+			libtcod.console_print(con, x, y+(xm*2), DEBUG_OPTION_KEYS[xm])
 		
 		libtcod.console_set_default_foreground(con, libtcod.light_grey)
 		for text in DEBUG_OPTIONS:
@@ -37303,7 +39418,7 @@ def ShowDebugMenu():
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Debug Menu'): continue
 		
 		if key.vk == sdl2.SDLK_ESCAPE:
 			exit_menu = True
@@ -37326,10 +39441,7 @@ def ShowDebugMenu():
 			continue
 		
 		# debug menu option
-		if key_char == '0':
-			num = 9
-		else:
-			num = ord(key_char) - 49
+		num = DEBUG_OPTION_KEYS.find(key_char)
 		if num < 0 or num > len(DEBUG_OPTIONS)-1: continue
 		
 		text = DEBUG_OPTIONS[num]
@@ -37347,7 +39459,7 @@ def ShowDebugMenu():
 			if scenario is None: continue
 			for nation in campaign.current_week['enemy_nations']:
 				for unit_id in campaign.stats['enemy_unit_list'][nation]:
-					scenario.SpawnEnemyUnits(reinforcement=True, nation=nation, unit_id=unit_id)
+					RunInRNGStream('Spawn', scenario.SpawnEnemyUnits, reinforcement=True, nation=nation, unit_id=unit_id)
 					scenario.UpdateUnitCon()
 					scenario.UpdateScenarioDisplay()
 			exit_menu = True
@@ -37358,7 +39470,7 @@ def ShowDebugMenu():
 			if nation is None: return
 			unit_id = GetOption(campaign.stats['enemy_unit_list'][nation], menu_title='Choose Unit')
 			if unit_id is None: return
-			scenario.SpawnEnemyUnits(reinforcement=True, nation=nation, unit_id=unit_id, location=(-1,0))
+			RunInRNGStream('Spawn', scenario.SpawnEnemyUnits, reinforcement=True, nation=nation, unit_id=unit_id, location=(-1,0))
 			scenario.UpdateUnitCon()
 			scenario.UpdateScenarioDisplay()
 			ShowMessage('Spawned an enemy ' + unit_id)
@@ -37377,7 +39489,7 @@ def ShowDebugMenu():
 			for unit in scenario.units:
 				if unit.unit_id == unit_id and unit.owning_player == 1:
 					ShowMessage('Destroyed an enemy ' + unit_id)
-					unit.DestroyMe(no_vp=True)
+					unit.DestroyMe(no_vp=True, cause='Debug')
 					break
 			exit_menu = True
 		
@@ -37454,10 +39566,10 @@ def ShowDebugMenu():
 		
 		elif text == 'Regenerate Weather':
 			if campaign_day is None: continue
-			campaign_day.GenerateWeather()
+			RunInRNGStream('Weather', campaign_day.GenerateWeather)
 			ShowMessage('New weather conditions generated')
 			DisplayWeatherInfo(cd_weather_con)
-			campaign_day.InitAnimations()
+			RunInRNGStream('Cosmetic', campaign_day.InitAnimations)
 			exit_menu = True
 		
 		elif text == 'Promotion Check':
@@ -37473,6 +39585,56 @@ def ShowDebugMenu():
 			session.ModifySteamStat(steam_stat, 1)
 			ShowMessage('Increased ' + steam_stat + ' by one')
 			exit_menu = True
+		
+		elif text == 'Benchmark CD Map Generation':
+			if campaign_day is None: continue
+			option_list = ['100', '1000', str(CD_MAP_BENCHMARK_MAPS)]
+			maps_per_type = GetOption(option_list, menu_title='Maps per Region and Mission')
+			if maps_per_type is None: continue
+			DisplayLoadingMsg()
+			filename = BenchmarkCDMapGeneration(int(maps_per_type))
+			ShowMessage('Benchmark results saved to ' + filename)
+			exit_menu = True
+		
+		elif text == 'Export AP Score Table':
+			if len(session.ap_base_scores) == 0:
+				BuildAPBaseScoreTable()
+			filename = ExportAPBaseScoreTable()
+			ShowMessage('AP score table saved to ' + filename)
+			exit_menu = True
+		
+		elif text == 'Toggle Threat Map':
+			session.debug['Show Threat Map'] = not session.debug.get('Show Threat Map', False)
+			if scenario is not None:
+				scenario.UpdateGuiCon()
+				scenario.UpdateScenarioDisplay()
+			exit_menu = True
+		
+		elif text == 'Benchmark Percentile Rolls':
+			DisplayLoadingMsg()
+			filename = BenchmarkPercentileRolls(PERCENTILE_ROLL_BENCHMARK_ROLLS, PERCENTILE_ROLL_BENCHMARK_ENTRY_ROLLS)
+			ShowMessage('Benchmark results saved to ' + filename)
+			exit_menu = True
+		
+		elif text == 'Toggle AI Profiling':
+			session.debug['AI Profiling'] = not session.debug.get('AI Profiling', False)
+			if session.debug['AI Profiling']:
+				ShowMessage('AI decision timings will be saved to the logs folder at the end of each scenario')
+			else:
+				ShowMessage('AI profiling turned off')
+			exit_menu = True
+		
+		elif text == 'Set AI Time Budget':
+			option_list = ['No Limit', '0.01', '0.05', '0.1', '0.5', '1.0']
+			budget = GetOption(option_list, menu_title='AI Decision Time Budget (seconds)')
+			if budget is None: continue
+			if budget == 'No Limit':
+				session.ai_time_budget = None
+				ShowMessage('AI decision time budget removed')
+			else:
+				session.ai_time_budget = float(budget)
+				ShowMessage('AI decision time budget set to ' + budget + ' seconds')
+			exit_menu = True
 	
 	# re-draw original root console
 	libtcod.console_blit(temp_con, 0, 0, 0, 0, 0, 0, 0)
@@ -37753,7 +39915,7 @@ def LoadCampaignMenu(continue_most_recent):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Load Campaign'): continue
 		
 		# return to main menu without loading a game
 		if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
@@ -37938,7 +40100,7 @@ def ShowRecordsMenu():
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Records'): continue
 		key_char = DeKey(chr(key.c).lower())
 		
 		# return to main menu
@@ -38034,7 +40196,7 @@ def DisplayCampaignRecord(data, final_report=False):
 	def BlitAndWait():
 		if DEBUG or not final_report: return
 		libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-		Wait(20, ignore_animations=True)
+		Wait(20, ignore_animations=True, category='Transitions')
 	
 	def UpdateRecordScreen():
 		
@@ -38048,7 +40210,7 @@ def DisplayCampaignRecord(data, final_report=False):
 				libtcod.console_put_char(con, x1, y, char)
 				x1 += 1
 				libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
-				Wait(2, ignore_animations=True)
+				Wait(2, ignore_animations=True, category='Transitions')
 		
 		# draw background image
 		libtcod.console_blit(bg_con, 0, 0, 0, 0, con, 0, 0)
@@ -38225,7 +40387,7 @@ def DisplayCampaignRecord(data, final_report=False):
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Campaign Record'): continue
 		
 		# exit menu
 		if (final_report and (key.vk == sdl2.SDLK_TAB or session.gamepad_input == 0)) or (not final_report and (key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1)):
@@ -38310,7 +40472,7 @@ def ShowMemorial():
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Memorial'): continue
 		
 		# return to campaign records menu
 		if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
@@ -38760,7 +40922,7 @@ def ShowModsMenu():
 	exit_menu = False
 	while not exit_menu:
 		libtcod.console_flush()
-		if not GetInputEvent(allow_repeat=True): continue
+		if not GetInputEvent(allow_repeat=True, context='Mods'): continue
 		key_char = DeKey(chr(key.c).lower())
 
 		# return to main menu / mod menu
@@ -38883,7 +41045,7 @@ def ShowModsMenu():
 				UpdateModsMenuScreen()
 				while session.key_down:
 					libtcod.console_flush()
-					GetInputEvent(allow_repeat=True)
+					GetInputEvent(allow_repeat=True, context='Mods')
 				overlay_basic_portrait = False
 				UpdateModsMenuScreen()
 				continue
@@ -39317,8 +41479,6 @@ def ContinueCampaign():
 	campaign_day = CampaignDay()
 	for (hx, hy) in CAMPAIGN_DAY_HEXES:
 		campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
-	campaign_day.GenerateRoads()
-	campaign_day.GenerateRivers()
 	
 	# check for updated portrait variants for the new campaign
 	campaign.UpdatePortraitVariant()
@@ -39476,7 +41636,7 @@ def UnitGallery():
 		exit_menu = False
 		while not exit_menu:
 			libtcod.console_flush()
-			if not GetInputEvent(): continue
+			if not GetInputEvent(context='Unit Roster'): continue
 			if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
 				exit_menu = True
 				continue
@@ -39883,7 +42043,7 @@ def UnitGallery():
 	exit_loop = False
 	while not exit_loop:
 		libtcod.console_flush()
-		if not GetInputEvent(allow_repeat=True): continue
+		if not GetInputEvent(allow_repeat=True, context='Unit Gallery'): continue
 		
 		# filter sub-menu active
 		if filter_window_active:
@@ -40533,7 +42693,7 @@ def DisplayAcknowledgments():
 	exit_loop = False
 	while not exit_loop:
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Acknowledgments'): continue
 		if key.vk == sdl2.SDLK_ESCAPE or session.gamepad_input == 1:
 			return
 	
@@ -40661,7 +42821,7 @@ def PlaySound(sound_name):
 			session.missing_sound_displayed = True
 			print('WARNING: Sound effect file(s) missing for: ' + sound_name + '; this warning will only be displayed once per session')
 		return
-	filename = choice(session.sound_effects[sound_name])
+	filename = session.sound_rng.choice(session.sound_effects[sound_name])
 	sample = mixer.Mix_LoadWAV((filename).encode('ascii'))
 	mixer.Mix_PlayChannel(-1, sample, 0)
 
@@ -40904,14 +43064,15 @@ def DisplayButton(console, x, y, button):
 #                                   Main Menu Stuff                                      #
 ##########################################################################################
 
-# start a new campaign
-def StartNewCampaign():
+# start a new campaign; if auto_start is set, start the campaign with this full path without showing the
+# campaign selection menu
+def StartNewCampaign(auto_start=None):
 	
 	global campaign, campaign_day, scenario, session
 	
 	# create a new campaign object and allow player to select a campaign
 	campaign = Campaign()
-	if not campaign.CampaignSelectionMenu():
+	if not campaign.CampaignSelectionMenu(auto_start=auto_start):
 		return False
 	
 	# show campaign options menu
@@ -40942,8 +43103,6 @@ def StartNewCampaign():
 	campaign_day = CampaignDay()
 	for (hx, hy) in CAMPAIGN_DAY_HEXES:
 		campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
-	campaign_day.GenerateRoads()
-	campaign_day.GenerateRivers()
 	campaign.AddJournal('Start of day')
 	
 	campaign.ShowStartOfDay()
@@ -40961,7 +43120,7 @@ def DoTutorial():
 	
 	libtcod.console_blit(LoadXP('training_1.xp'), 0, 0, 0, 0, 0, window_x+12, window_y+3)
 	libtcod.console_flush()
-	Wait(300, ignore_animations=False)
+	Wait(300, ignore_animations=False, category='Transitions')
 	campaign = Campaign()
 	campaign.CampaignSelectionMenu(auto_start=CAMPAIGNPATH + 'introduction.json')
 	libtcod.console_clear(0)
@@ -40985,14 +43144,895 @@ def DoTutorial():
 	campaign_day = CampaignDay()
 	for (hx, hy) in CAMPAIGN_DAY_HEXES:
 		campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
-	campaign_day.GenerateRoads()
-	campaign_day.GenerateRivers()
 	campaign.AddJournal('Start of day')
 	campaign.ShowStartOfDay()
 	scenario = None
 	return True
 	
 
+# AutoPilot: makes the player's decisions in a simulated campaign by giving the same key inputs that a
+# player would; each input loop names itself when it asks for input
+class AutoPilot:
+	def __init__(self):
+		self.inputs = 0			# number of inputs given so far
+		self.last_context = None	# input loop given the most recent input
+		self.repeats = 0		# number of inputs given in a row to that input loop
+		self.campaign_chosen = False	# a random campaign has been chosen in the campaign selection menu
+		self.loaded_guns = []		# guns given a default ammo load in the current ammo loading menu
+		self.return_clock = None	# campaign day time of the most recent attempt to return to base
+		self.fired_weapons = []		# weapons that have fired or been passed over this shooting phase
+		self.turret_rotations = 0	# number of turret rotations this shooting phase
+	
+	
+	# set the global key object to the next input for the input loop named by context; called by
+	# GetInputEvent
+	def GetInput(self, context, details):
+		if context is None:
+			raise Exception('Autopilot asked for input by an input loop with no context')
+		self.inputs += 1
+		if self.inputs > AUTOPILOT_MAX_INPUTS:
+			raise Exception('Autopilot input limit reached in ' + context)
+		if context == self.last_context:
+			self.repeats += 1
+		else:
+			self.last_context = context
+			self.repeats = 1
+		SetScriptedKey(self.ChooseInput(context, details))
+		return True
+	
+	
+	# return the input to give to the input loop named by context, given the details it passed on
+	def ChooseInput(self, context, details):
+		
+		if context == 'Scenario':
+			return self.ChooseScenarioInput()
+		
+		elif context == 'Campaign Day':
+			return self.ChooseCampaignDayInput()
+		
+		# start the next combat day, or proceed to the next day
+		elif context == 'Campaign Calendar':
+			if campaign.active_calendar_menu != 1:
+				return '1'
+			return 'RETURN'
+		
+		elif context == 'Ammo Reload':
+			return self.ChooseAmmoLoadInput(details['weapon'], details['gun_list'])
+		
+		# always confirm
+		elif context == 'Notification':
+			if details['confirm']:
+				return 'y'
+			return self.ContinueInput(context)
+		
+		# choose a random campaign, then start it
+		elif context == 'Campaign Selection':
+			if not self.campaign_chosen:
+				self.campaign_chosen = True
+				return 'r'
+			return 'RETURN'
+		
+		# choose a random vehicle model
+		elif context == 'Tank Selection':
+			return 'r'
+		
+		elif context == 'Bail Out':
+			return 'SPACE'
+		
+		elif context == 'Assign Positions':
+			return 'RETURN'
+		
+		# any other menu or message: continue
+		return self.ContinueInput(context)
+	
+	
+	# return the input to continue past a menu or message, giving up if the same one has asked for
+	# input too many times in a row
+	def ContinueInput(self, context):
+		if self.repeats > AUTOPILOT_MAX_REPEATS:
+			raise Exception('Autopilot unable to continue past ' + context)
+		return 'TAB'
+	
+	
+	# load the default ammo load into each gun in turn, then proceed
+	def ChooseAmmoLoadInput(self, weapon, gun_list):
+		if weapon not in self.loaded_guns:
+			self.loaded_guns.append(weapon)
+			return EnKey('x')
+		for gun in gun_list:
+			if gun not in self.loaded_guns:
+				return EnKey('q')
+		self.loaded_guns = []
+		return 'TAB'
+	
+	
+	# return True if the player vehicle should return to base: the same conditions that allow a free return
+	def PlayerShouldReturn(self):
+		unit = campaign.player_unit
+		if unit.ko_hit or unit.immobilized:
+			return True
+		for weapon in unit.weapon_list:
+			if weapon.broken:
+				if weapon.GetStat('type') == 'Gun' or len(unit.weapon_list) == 1:
+					return True
+		for position in unit.positions_list:
+			if position.crewman is None:
+				return True
+			if not position.crewman.alive:
+				return True
+		return False
+	
+	
+	# return the direction of the adjacent zone closest to an enemy-held zone, or None if there are no
+	# enemy-held zones left or no zone can be travelled to
+	def ChooseTravelDirection(self):
+		
+		enemy_zones = []
+		for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			map_hex = campaign_day.map_hexes[(hx,hy)]
+			if map_hex.controlled_by != 1: continue
+			if 'impassible' in CD_TERRAIN_TYPES[map_hex.terrain_type]: continue
+			enemy_zones.append((hx, hy))
+		if len(enemy_zones) == 0: return None
+		
+		(hx1, hy1) = campaign_day.player_unit_location
+		best_direction = None
+		best_score = None
+		for direction in range(6):
+			(hx2, hy2) = campaign_day.GetAdjacentCDHex(hx1, hy1, direction)
+			if (hx2, hy2) not in campaign_day.map_hexes: continue
+			if campaign_day.CheckTravel(hx1, hy1, hx2, hy2) != '': continue
+			
+			score = 0 - (min([GetHexDistance(hx2, hy2, hx, hy) for (hx, hy) in enemy_zones]) * 10)
+			if campaign_day.map_hexes[(hx2,hy2)].objective is not None:
+				score += 5
+			
+			if best_score is None or score > best_score:
+				best_direction = direction
+				best_score = score
+		
+		return best_direction
+	
+	
+	# campaign day: return to base if the player vehicle can no longer fight, otherwise travel toward
+	# the nearest enemy-held zone, or wait if there is none
+	def ChooseCampaignDayInput(self):
+		
+		if campaign_day.active_menu != 3:
+			return '3'
+		
+		# don't try to return again if it wasn't possible at this time
+		clock = (campaign_day.day_clock['hour'], campaign_day.day_clock['minute'])
+		if clock != self.return_clock and self.PlayerShouldReturn():
+			self.return_clock = clock
+			return EnKey('i')
+		
+		direction = self.ChooseTravelDirection()
+		if direction is None:
+			return EnKey('w')
+		if campaign_day.selected_direction != direction:
+			return EnKey(DIRECTION_KEYS[direction])
+		return 'RETURN'
+	
+	
+	# scenario: set crew commands in the command phase, attack in the shooting phase, and otherwise
+	# proceed to the next phase
+	def ChooseScenarioInput(self):
+		
+		if scenario.active_player != 0:
+			return 'SPACE'
+		
+		if scenario.phase != PHASE_SHOOTING:
+			self.fired_weapons = []
+			self.turret_rotations = 0
+		
+		if scenario.phase == PHASE_COMMAND:
+			self.SetCrewCommands()
+		
+		elif scenario.phase == PHASE_SHOOTING:
+			text = self.ChooseShootingInput()
+			if text is not None:
+				return text
+		
+		return 'SPACE'
+	
+	
+	# give each crewman the first command in AUTOPILOT_CREW_COMMANDS that they can take and that is
+	# still needed; commanders choose last, so that they only operate a gun if no one else can
+	def SetCrewCommands(self):
+		
+		unit = scenario.player_unit
+		
+		# number of crewmen needed on each command
+		needed = {'Operate Gun' : 0, 'Reload' : 0, 'Direct Fire' : 1, 'Operate MG' : 0}
+		for weapon in unit.weapon_list:
+			if weapon.GetStat('type') == 'Gun':
+				needed['Operate Gun'] += 1
+				needed['Reload'] += 1
+			elif weapon.GetStat('type') in MG_WEAPONS:
+				needed['Operate MG'] += 1
+		
+		for position in sorted(unit.positions_list, key=lambda x: x.name in COMMANDER_POSITIONS):
+			crewman = position.crewman
+			if crewman is None: continue
+			if not crewman.alive: continue
+			for command in AUTOPILOT_CREW_COMMANDS:
+				if needed[command] == 0: continue
+				if command not in crewman.cmd_list: continue
+				needed[command] -= 1
+				if crewman.current_cmd != command:
+					crewman.current_cmd = command
+					position.UpdateVisibleHexes()
+				break
+	
+	
+	# return a score for a possible player attack, or None if the attack is not possible; scored in the
+	# same way as attacks by AI units, but without the random element
+	def ScoreAttack(self, weapon, target, ammo_type):
+		
+		if ammo_type != '':
+			weapon.ammo_type = ammo_type
+		if scenario.CheckAttack(scenario.player_unit, weapon, target) != '':
+			return None
+		profile = scenario.CalcAttack(scenario.player_unit, weapon, target)
+		if profile is None:
+			return None
+		
+		score = profile['final_chance']
+		
+		# apply the better of the hull and turret penetration chances, assuming best case for ballistic attacks
+		if (weapon.GetStat('type') in ['Gun', 'AT Rifle', 'Close Combat'] or weapon.GetStat('type') in MG_WEAPONS) and target.GetStat('armour') is not None:
+			if profile['ballistic_attack']:
+				profile['result'] = 'CRITICAL HIT'
+			profile['location'] = 'Hull'
+			hull_chance = scenario.CalcAP(profile)['final_chance']
+			profile['location'] = 'Turret'
+			turret_chance = scenario.CalcAP(profile)['final_chance']
+			score = score * (max(hull_chance, turret_chance) / 75.0 * 2.0)
+		if (ammo_type in AP_AMMO_TYPES or ammo_type == 'HEAT') and target.GetStat('armour') is None:
+			score -= 25.0
+		if ammo_type == 'HE' and target.GetStat('armour') is not None:
+			score -= 20.0
+		return score
+	
+	
+	# choose the best attack with a weapon that hasn't fired yet this phase, and fire it; if there is
+	# none, try to rotate the turret toward the nearest spotted enemy unit
+	def ChooseShootingInput(self):
+		
+		best_attack = None
+		best_score = 0.0
+		for weapon in scenario.player_unit.weapon_list:
+			if weapon in self.fired_weapons: continue
+			if weapon.broken or weapon.jammed: continue
+			
+			ammo_type_list = ['']
+			if weapon.GetStat('type') == 'Gun' and 'ammo_type_list' in weapon.stats:
+				ammo_type_list = []
+				for ammo_type in weapon.stats['ammo_type_list']:
+					if ammo_type in ['Smoke', 'WP']: continue
+					if weapon.ready_rack[ammo_type] == 0 and weapon.ammo_stores[ammo_type] == 0:
+						continue
+					ammo_type_list.append(ammo_type)
+			
+			current_ammo_type = weapon.ammo_type
+			for target in weapon.weapon_target_list:
+				if target.owning_player != 1: continue
+				for ammo_type in ammo_type_list:
+					score = self.ScoreAttack(weapon, target, ammo_type)
+					if score is None: continue
+					if score <= best_score: continue
+					best_attack = (weapon, target, ammo_type)
+					best_score = score
+			weapon.ammo_type = current_ammo_type
+		
+		if best_attack is None:
+			return self.ChooseTurretRotation()
+		
+		(weapon, target, ammo_type) = best_attack
+		self.fired_weapons.append(weapon)
+		scenario.selected_weapon = weapon
+		if ammo_type != '':
+			weapon.ammo_type = ammo_type
+		weapon.selected_target = target
+		return EnKey('f')
+	
+	
+	# return the input to rotate the player turret one step toward the nearest spotted enemy unit, or None
+	def ChooseTurretRotation(self):
+		
+		unit = scenario.player_unit
+		if unit.turret_facing is None: return None
+		if self.turret_rotations >= 3: return None
+		
+		closest_target = None
+		closest_distance = 4
+		for target in scenario.units:
+			if target.owning_player != 1: continue
+			if not target.alive or not target.spotted: continue
+			distance = GetHexDistance(0, 0, target.hx, target.hy)
+			if distance == 0 or distance >= closest_distance: continue
+			closest_target = target
+			closest_distance = distance
+		if closest_target is None: return None
+		
+		direction = GetDirectionToward(0, 0, closest_target.hx, closest_target.hy)
+		if direction == unit.turret_facing: return None
+		self.turret_rotations += 1
+		if ConstrainDir(direction - unit.turret_facing) <= 3:
+			return EnKey('e')
+		return EnKey('q')
+	
+
+# return the full path of a campaign file given its filename, with or without the .json extension, or
+# None if it is not found
+def GetCampaignPath(campaign_file):
+	for filename in session.campaign_list:
+		if filename.split(os.sep)[-1] in [campaign_file, campaign_file + '.json']:
+			return filename
+	return None
+
+
+# play one complete new campaign under the autopilot, using the campaign file with this full path, or
+# a random campaign if None
+def PlaySimulatedCampaign(campaign_path):
+	if not StartNewCampaign(auto_start=campaign_path):
+		raise Exception('Unable to start a new campaign')
+	campaign.DoCampaignCalendarLoop()
+	
+
+# worker process function: simulate one campaign with its own seed, and return a summary record with
+# the fields in SIMULATION_FIELDS, plus the rows of each analytics table if analytics are being collected
+def SimulateCampaign(args):
+	
+	global campaign, campaign_day, scenario
+	
+	(run, seed, campaign_path, analytics) = args
+	campaign = None
+	campaign_day = None
+	scenario = None
+	session.autopilot = AutoPilot()
+	if analytics:
+		session.analytics = CampaignAnalytics(run)
+	start_time = time.time()
+	
+	try:
+		RunSeeded(seed, PlaySimulatedCampaign, campaign_path)
+		if campaign.player_oob:
+			result = 'Out of Action'
+		else:
+			result = 'Completed'
+	except Exception as e:
+		traceback.print_exc()
+		result = 'Error: ' + str(e)
+	
+	session.autopilot = None
+	tables = None
+	if session.analytics is not None:
+		tables = session.analytics.tables
+		session.analytics = None
+	
+	record = [run, seed, '', '', result, 0, 0, 0, 0, 0, round(time.time() - start_time, 1)]
+	if campaign is not None and campaign.player_unit is not None:
+		record[2] = campaign.stats['name']
+		record[3] = campaign.player_unit.unit_id
+		record[5] = campaign.player_vp
+		record[6] = campaign.combat_days
+		record[7] = campaign.tanks_lost
+		record[8] = campaign.crew_kia
+		record[9] = sum(campaign.enemies_destroyed.values())
+	return (record, tables)
+	
+
+# simulate a number of complete campaigns under the autopilot, spread over a pool of worker processes,
+# and save a summary of each to a CSV file in the log folder; each campaign is played with the base seed
+# plus its run number minus one, so any one of them can be played again on its own. If analytics is True,
+# every shot, unit loss, and engagement is also exported to a new folder in the log folder and summarized
+# once all campaigns are finished
+def RunCampaignSimulator(num_runs, campaign_file, workers, base_seed, analytics=False):
+	
+	# find the full path of the campaign file if one was given
+	campaign_path = None
+	if campaign_file is not None:
+		campaign_path = GetCampaignPath(campaign_file)
+		if campaign_path is None:
+			print('ERROR: Campaign file not found: ' + campaign_file)
+			return
+	
+	args_list = []
+	for run in range(num_runs):
+		args_list.append((run + 1, base_seed + run, campaign_path, analytics))
+	
+	print('Simulating ' + str(num_runs) + ' campaigns with ' + str(workers) + ' worker processes, base seed ' +
+		str(base_seed))
+	start_time = time.time()
+	
+	pool = None
+	if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+		pool = multiprocessing.get_context('fork').Pool(workers)
+		results = pool.imap(SimulateCampaign, args_list)
+	else:
+		results = map(SimulateCampaign, args_list)
+	
+	timestamp = datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
+	
+	# rows from each campaign are written out as they arrive, so memory use does not grow with the
+	# number of campaigns
+	writers = {}
+	if analytics:
+		analytics_path = session.log_path + os.sep + 'analytics_' + timestamp
+		os.mkdir(analytics_path)
+		for table in ANALYTICS_FIELDS:
+			writers[table] = AnalyticsWriter(analytics_path, table)
+	
+	filename = session.log_path + os.sep + 'campaign_simulation_' + timestamp + '.csv'
+	with open(filename, 'w', encoding='utf-8') as f:
+		f.write(','.join(SIMULATION_FIELDS) + '\n')
+		for (record, tables) in results:
+			if tables is not None:
+				for (table, rows) in tables.items():
+					writers[table].AddRows(rows)
+			f.write(','.join([str(record[0]), str(record[1]), '"' + record[2] + '"', record[3], record[4]] +
+				[str(x) for x in record[5:]]) + '\n')
+			f.flush()
+			print('Run ' + str(record[0]) + '/' + str(num_runs) + ': ' + record[4] + ', ' + str(record[5]) +
+				' VP, ' + str(record[6]) + ' days')
+	
+	if pool is not None:
+		pool.close()
+		pool.join()
+	
+	print('Finished in ' + str(round(time.time() - start_time, 1)) + ' seconds, summary saved to ' + filename)
+	
+	if analytics:
+		for writer in writers.values():
+			writer.Close()
+		AggregateAnalytics(analytics_path)
+	
+
+# start a new campaign under the autopilot and play one engagement set up from an arena definition, with
+# the player unit driven by the autopilot and all other units on both sides by the AI
+def PlayArenaEngagement(arena):
+	
+	global campaign_day, scenario
+	
+	if not StartNewCampaign(auto_start=arena['campaign_path']):
+		raise Exception('Unable to start a new campaign')
+	
+	# move the campaign on to the given date and its calendar week
+	if 'date' in arena:
+		if arena['date'] < campaign.today:
+			raise Exception('Date ' + arena['date'] + ' is before the start of the campaign')
+		campaign.today = arena['date']
+		campaign.CheckForNewWeek(skip_stat=True)
+	
+	# replace the player unit if one was given
+	if 'player_unit' in arena:
+		campaign.player_unit = Unit(arena['player_unit'], is_player=True)
+		campaign.player_unit.nation = campaign.stats['player_nation']
+		campaign.player_unit.GenerateNewPersonnel()
+		campaign.player_unit.ClearGunAmmo()
+	
+	# set up the player unit and start a new campaign day again, so that weapons, weather, and enemy
+	# units all come from the new date and week
+	if 'date' in arena or 'player_unit' in arena:
+		campaign.DoPostInitChecks()
+		campaign_day = CampaignDay()
+		for (hx, hy) in CAMPAIGN_DAY_HEXES:
+			campaign_day.map_hexes[(hx,hy)].CalcCaptureVP()
+	
+	for (k, value) in arena.get('weather', {}).items():
+		campaign_day.weather[k] = value
+	
+	campaign_day.AmmoReloadMenu()
+	campaign_day.started = True
+	
+	# friendly units join the player squad
+	campaign_day.player_squad = []
+	for unit_id in arena.get('friendly_units', []):
+		unit = Unit(unit_id)
+		unit.nation = campaign.player_unit.nation
+		campaign_day.player_squad.append(unit)
+		unit.ai = AI(unit)
+		unit.ai.Reset(squadmember=True)
+		unit.GenerateNewPersonnel()
+	
+	# set up the zone to be fought in, with the enemy units to be spawned there
+	map_hex = campaign_day.map_hexes[campaign_day.player_unit_location]
+	map_hex.terrain_type = arena['terrain']
+	map_hex.objective = None
+	enemy_nation = arena.get('enemy_nation', campaign.stats['enemy_nations'][0])
+	map_hex.enemy_units = []
+	for unit_id in arena['enemy_units']:
+		map_hex.enemy_units.append((enemy_nation, unit_id))
+	
+	scenario = Scenario(map_hex)
+	scenario.DoScenarioLoop()
+	
+
+# worker process function: play one arena engagement with its own seed, and return a record with the
+# fields in ARENA_FIELDS plus the engagement's phase, turn, activation, and AI stage timings
+def SimulateArenaEngagement(args):
+	
+	global campaign, campaign_day, scenario
+	
+	(engagement, seed, arena) = args
+	campaign = None
+	campaign_day = None
+	scenario = None
+	session.autopilot = AutoPilot()
+	start_time = time.time()
+	
+	try:
+		RunSeeded(seed, PlayArenaEngagement, arena)
+		result = None
+	except Exception as e:
+		traceback.print_exc()
+		result = 'Error: ' + str(e)
+	
+	session.autopilot = None
+	
+	record = [engagement, seed, result, 0, 0, 0, 0, round(time.time() - start_time, 2)]
+	timings = {}
+	if scenario is not None:
+		enemies_left = 0
+		for unit in scenario.units:
+			if unit.owning_player == 1 and unit.alive:
+				enemies_left += 1
+		if result is None:
+			if not scenario.player_unit.alive:
+				result = 'Player Destroyed'
+			elif enemies_left == 0:
+				result = 'Enemy Destroyed'
+			else:
+				result = 'Other'
+		record[2] = result
+		record[3] = scenario.current_turn
+		if scenario.player_unit.alive:
+			record[4] = 1
+		record[5] = sum(campaign_day.enemies_destroyed.values())
+		# destroyed squad members are removed from the player squad
+		if scenario.player_unit.squad is not None:
+			record[6] = len(arena.get('friendly_units', [])) - len(scenario.player_unit.squad)
+		
+		for (name, (calls, total, max_time)) in scenario.timings.items():
+			timings[name] = [calls, total, max_time]
+		for (stage, (calls, total, max_time, candidates, truncated)) in scenario.ai_profile.items():
+			timings['AI: ' + stage] = [calls, total, max_time]
+	return (record, timings)
+	
+
+# play a number of AI-versus-AI engagements set up from an arena definition file, spread over a pool of
+# worker processes, and save the outcome of each to a CSV file in the log folder, plus a summary of
+# outcomes and of the time taken by each phase, turn, unit activation, and AI decision stage. Each
+# engagement is played with the base seed plus its number minus one, so results can be compared
+# between versions of the game
+def RunArena(arena_file, num_engagements, workers, base_seed):
+	
+	with open(arena_file, encoding='utf8') as f:
+		arena = json.load(f)
+	
+	# check the arena definition
+	arena['campaign_path'] = None
+	if 'campaign' in arena:
+		arena['campaign_path'] = GetCampaignPath(arena['campaign'])
+		if arena['campaign_path'] is None:
+			print('ERROR: Campaign file not found: ' + arena['campaign'])
+			return
+	if arena.get('terrain') not in CD_TERRAIN_TYPES:
+		print('ERROR: Unknown zone terrain type: ' + str(arena.get('terrain')))
+		return
+	for unit_id in [arena.get('player_unit')] + arena.get('friendly_units', []) + arena.get('enemy_units', []):
+		if unit_id is None: continue
+		if unit_id not in session.unit_types:
+			print('ERROR: Unknown unit type: ' + unit_id)
+			return
+	if len(arena.get('enemy_units', [])) == 0:
+		print('ERROR: No enemy units given')
+		return
+	if num_engagements is None:
+		num_engagements = arena.get('engagements', 10)
+	
+	args_list = []
+	for engagement in range(num_engagements):
+		args_list.append((engagement + 1, base_seed + engagement, arena))
+	
+	print('Playing ' + str(num_engagements) + ' arena engagements with ' + str(workers) + ' worker processes, base seed ' +
+		str(base_seed))
+	start_time = time.time()
+	
+	pool = None
+	if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+		pool = multiprocessing.get_context('fork').Pool(workers)
+		results = pool.imap(SimulateArenaEngagement, args_list)
+	else:
+		results = map(SimulateArenaEngagement, args_list)
+	
+	# outcome totals: number of each result, and totals of the other fields
+	result_counts = {}
+	totals = [0, 0, 0, 0, 0.0]
+	timings = {}
+	
+	timestamp = datetime.now().strftime("%Y-%m-%d_%H_%M_%S")
+	filename = session.log_path + os.sep + 'arena_' + timestamp + '.csv'
+	with open(filename, 'w', encoding='utf-8') as f:
+		f.write(','.join(ARENA_FIELDS) + '\n')
+		for (record, engagement_timings) in results:
+			f.write(','.join([str(x) for x in record]) + '\n')
+			f.flush()
+			print('Engagement ' + str(record[0]) + '/' + str(num_engagements) + ': ' + record[2] + ', ' +
+				str(record[3]) + ' turns')
+			
+			result_counts[record[2]] = result_counts.get(record[2], 0) + 1
+			for i in range(5):
+				totals[i] += record[i+3]
+			for (name, (calls, total, max_time)) in engagement_timings.items():
+				if name not in timings:
+					timings[name] = [0, 0.0, 0.0]
+				timings[name][0] += calls
+				timings[name][1] += total
+				if max_time > timings[name][2]:
+					timings[name][2] = max_time
+	
+	if pool is not None:
+		pool.close()
+		pool.join()
+	
+	total_time = time.time() - start_time
+	
+	summary_filename = session.log_path + os.sep + 'arena_' + timestamp + '.txt'
+	with open(summary_filename, 'w', encoding='utf-8') as f:
+		f.write('ArmCom2 Arena Benchmark (' + VERSION + '), ' + arena_file + ', ' + str(num_engagements) +
+			' engagements, ' + str(workers) + ' workers, base seed ' + str(base_seed) + '\n')
+		f.write('Total ' + str(round(total_time, 1)) + ' seconds, ' +
+			str(round(num_engagements / total_time, 3)) + ' engagements per second\n\n')
+		
+		f.write('Result,Engagements,Percent\n')
+		for (result, count) in sorted(result_counts.items()):
+			f.write(result + ',' + str(count) + ',' + str(round(count * 100.0 / num_engagements, 1)) + '\n')
+		f.write('\nMean Turns,Player Survival Rate,Mean Enemy Losses,Mean Friendly Losses,Mean Seconds\n')
+		f.write(str(round(totals[0] / num_engagements, 2)) + ',' + str(round(totals[1] * 100.0 / num_engagements, 1)) +
+			',' + str(round(totals[2] / num_engagements, 2)) + ',' + str(round(totals[3] / num_engagements, 2)) +
+			',' + str(round(totals[4] / num_engagements, 2)) + '\n')
+		
+		f.write('\nTiming,Calls,Total Seconds,Mean ms,Max ms\n')
+		for (name, (calls, total, max_time)) in sorted(timings.items()):
+			f.write(name + ',' + str(calls) + ',' + str(round(total, 3)) + ',' +
+				str(round(total * 1000.0 / calls, 3)) + ',' + str(round(max_time * 1000.0, 3)) + '\n')
+	
+	print('Finished in ' + str(round(total_time, 1)) + ' seconds, results saved to ' + filename + ' and ' +
+		summary_filename)
+	
+
+# CampaignAnalytics: collects a row for each shot, unit loss, and engagement in one simulated campaign,
+# with the fields in ANALYTICS_FIELDS; returned to the simulator once the campaign is finished
+class CampaignAnalytics:
+	def __init__(self, run):
+		self.run = run
+		self.engagement = 1			# number of the current engagement
+		self.tables = {}			# rows for each table so far
+		for table in ANALYTICS_FIELDS:
+			self.tables[table] = []
+		self.losses = [0, 0]			# units lost by each side in the current engagement
+		self.shots = 0				# shots made in the current engagement
+	
+	
+	# add a row to a table, beginning with the run and engagement numbers
+	def AddRow(self, table, row):
+		self.tables[table].append([self.run, self.engagement] + row)
+	
+	
+	# record the outcome of a resolved attack or AP/HE roll; roll is None if the outcome was automatic
+	def RecordShot(self, profile, roll):
+		attacker = profile['attacker']
+		target = profile['target']
+		distance = profile.get('distance')
+		if distance is None:
+			distance = GetHexDistance(attacker.hx, attacker.hy, target.hx, target.hy)
+		self.shots += 1
+		self.AddRow('shots', [campaign.today, scenario.current_turn, attacker.unit_id,
+			attacker.owning_player, profile['weapon'].GetStat('name'), profile['ammo_type'], profile['type'],
+			target.unit_id, target.owning_player, distance, profile.get('final_chance'), roll,
+			profile['result']])
+	
+	
+	# record a unit being destroyed or leaving play, what caused it, and the unit and weapon that
+	# destroyed it if known
+	def RecordLoss(self, unit, dest_weapon, dest_unit, cause):
+		if cause != 'Withdrew':
+			self.losses[unit.owning_player] += 1
+		destroyed_by = None
+		weapon_name = None
+		if dest_weapon is not None:
+			destroyed_by = dest_weapon.unit.unit_id
+			weapon_name = dest_weapon.GetStat('name')
+		elif dest_unit is not None:
+			destroyed_by = dest_unit.unit_id
+		self.AddRow('losses', [campaign.today, scenario.current_turn, unit.unit_id, unit.owning_player,
+			unit.GetStat('category'), destroyed_by, weapon_name, cause])
+	
+	
+	# record the end of the current engagement, and start the next one
+	def EndEngagement(self):
+		player_survived = 0
+		if campaign.player_unit.alive:
+			player_survived = 1
+		self.AddRow('engagements', [campaign.today, campaign.player_unit.unit_id, scenario.current_turn,
+			player_survived, self.losses[1], self.losses[0], self.shots])
+		self.engagement += 1
+		self.losses = [0, 0]
+		self.shots = 0
+	
+
+# AnalyticsWriter: writes the rows of one analytics table to a file in a folder, a batch at a time: a
+# parquet file if pyarrow is available, otherwise a CSV file
+class AnalyticsWriter:
+	def __init__(self, path, table):
+		self.fields = ANALYTICS_FIELDS[table]
+		self.rows = []				# rows not yet written
+		
+		if pyarrow is not None:
+			types = {'int' : pyarrow.int64(), 'float' : pyarrow.float64(), 'str' : pyarrow.string()}
+			self.schema = pyarrow.schema([(name, types[field_type]) for (name, field_type) in self.fields])
+			self.filename = path + os.sep + table + '.parquet'
+			self.parquet_writer = pyarrow.parquet.ParquetWriter(self.filename, self.schema)
+		else:
+			self.filename = path + os.sep + table + '.csv'
+			self.file = open(self.filename, 'w', encoding='utf-8', newline='')
+			self.csv_writer = csv.writer(self.file)
+			self.csv_writer.writerow([name for (name, field_type) in self.fields])
+	
+	
+	# add rows to be written, writing out a batch if enough are waiting
+	def AddRows(self, rows):
+		self.rows.extend(rows)
+		if len(self.rows) >= ANALYTICS_BATCH_ROWS:
+			self.Flush()
+	
+	
+	# write out all waiting rows
+	def Flush(self):
+		if len(self.rows) == 0: return
+		if pyarrow is not None:
+			columns = []
+			for i in range(len(self.fields)):
+				columns.append(pyarrow.array([row[i] for row in self.rows], type=self.schema.field(i).type))
+			self.parquet_writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+		else:
+			self.csv_writer.writerows(self.rows)
+			self.file.flush()
+		self.rows = []
+	
+	
+	# write out all waiting rows and close the file
+	def Close(self):
+		self.Flush()
+		if pyarrow is not None:
+			self.parquet_writer.close()
+		else:
+			self.file.close()
+	
+
+# read the rows of one analytics table from a folder one at a time, as dictionaries of field names and
+# values; values read from a CSV file are strings
+def ReadAnalyticsTable(path, table):
+	filename = path + os.sep + table + '.parquet'
+	if os.path.exists(filename):
+		for batch in pyarrow.parquet.ParquetFile(filename).iter_batches(batch_size=ANALYTICS_BATCH_ROWS):
+			for row in batch.to_pylist():
+				yield row
+		return
+	with open(path + os.sep + table + '.csv', 'r', encoding='utf-8', newline='') as f:
+		for row in csv.DictReader(f):
+			yield row
+	
+
+# summarize the analytics tables in a folder, reading one row at a time, and save the results to CSV
+# files in the same folder: the kills and losses of each unit type, the losses from each cause, the
+# armour penetration rate at each range, and the survival curve of player tanks by number of
+# engagements fought
+def AggregateAnalytics(path):
+	
+	if os.path.exists(path + os.sep + 'shots.parquet') and pyarrow is None:
+		print('ERROR: pyarrow is needed to read the analytics in ' + path)
+		return
+	
+	# kills and losses of each unit type, and losses from each cause; losses that can't be credited
+	# to the unit that caused them, eg. from firepower which may come from several units, are counted
+	# as unattributed. Units that withdrew are not counted as losses
+	kills = {}
+	losses = {}
+	unattributed = {}
+	causes = {}
+	for row in ReadAnalyticsTable(path, 'losses'):
+		cause = row.get('Cause')
+		if cause in [None, '']:
+			cause = 'Unknown'
+		if cause == 'Withdrew': continue
+		unit_id = row['Unit']
+		losses[unit_id] = losses.get(unit_id, 0) + 1
+		if cause not in causes:
+			causes[cause] = [0, 0]
+		causes[cause][0] += 1
+		if row['Destroyed By'] not in [None, '']:
+			kills[row['Destroyed By']] = kills.get(row['Destroyed By'], 0) + 1
+			causes[cause][1] += 1
+		else:
+			unattributed[unit_id] = unattributed.get(unit_id, 0) + 1
+	
+	with open(path + os.sep + 'kill_ratios.csv', 'w', encoding='utf-8', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['Unit', 'Kills', 'Losses', 'Unattributed Losses', 'Kill Ratio'])
+		for unit_id in sorted(set(kills) | set(losses)):
+			ratio = None
+			if losses.get(unit_id, 0) > 0:
+				ratio = round(kills.get(unit_id, 0) / losses[unit_id], 3)
+			writer.writerow([unit_id, kills.get(unit_id, 0), losses.get(unit_id, 0), unattributed.get(unit_id, 0),
+				ratio])
+	
+	with open(path + os.sep + 'loss_causes.csv', 'w', encoding='utf-8', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['Cause', 'Losses', 'Attributed', 'Unattributed'])
+		for cause in sorted(causes):
+			(total, attributed) = causes[cause]
+			writer.writerow([cause, total, attributed, total - attributed])
+	
+	# number of AP rolls, penetrations, and total chance of penetration at each range
+	penetration = {}
+	for row in ReadAnalyticsTable(path, 'shots'):
+		if row['Attack Type'] != 'ap': continue
+		distance = int(row['Range'])
+		if distance not in penetration:
+			penetration[distance] = [0, 0, 0.0]
+		penetration[distance][0] += 1
+		if row['Result'] == 'PENETRATED':
+			penetration[distance][1] += 1
+		if row['Chance'] not in [None, '']:
+			penetration[distance][2] += float(row['Chance'])
+	
+	with open(path + os.sep + 'penetration_by_range.csv', 'w', encoding='utf-8', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['Range', 'AP Rolls', 'Penetrated', 'Penetration Rate', 'Mean Chance'])
+		for distance in sorted(penetration):
+			(rolls, penetrated, total_chance) = penetration[distance]
+			writer.writerow([distance, rolls, penetrated, round(penetrated * 100.0 / rolls, 1),
+				round(total_chance / rolls, 1)])
+	
+	# count the number of engagements each player tank fought until it was lost, or until its
+	# campaign ended; rows are in run order, so only the current tank of the current run is tracked
+	tanks_lost = {}
+	tanks_remaining = {}
+	current_run = None
+	engagements_fought = 0
+	for row in ReadAnalyticsTable(path, 'engagements'):
+		if row['Run'] != current_run:
+			if engagements_fought > 0:
+				tanks_remaining[engagements_fought] = tanks_remaining.get(engagements_fought, 0) + 1
+			current_run = row['Run']
+			engagements_fought = 0
+		engagements_fought += 1
+		if int(row['Player Survived']) == 0:
+			tanks_lost[engagements_fought] = tanks_lost.get(engagements_fought, 0) + 1
+			engagements_fought = 0
+	if engagements_fought > 0:
+		tanks_remaining[engagements_fought] = tanks_remaining.get(engagements_fought, 0) + 1
+	
+	# Kaplan-Meier survival curve, counting tanks whose campaign ended as surviving up to that point
+	with open(path + os.sep + 'survival_curve.csv', 'w', encoding='utf-8', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['Engagements', 'Tanks At Risk', 'Tanks Lost', 'Survival Rate'])
+		at_risk = sum(tanks_lost.values()) + sum(tanks_remaining.values())
+		survival = 1.0
+		for engagements in range(1, max(list(tanks_lost) + list(tanks_remaining) + [0]) + 1):
+			lost = tanks_lost.get(engagements, 0)
+			if at_risk > 0:
+				survival = survival * (at_risk - lost) / at_risk
+			writer.writerow([engagements, at_risk, lost, round(survival, 4)])
+			at_risk -= lost + tanks_remaining.get(engagements, 0)
+	
+	print('Analytics summaries saved to ' + path)
+	
+
 # update the animation effect
 def AnimateMainMenu():
 	
@@ -41096,7 +44136,7 @@ def UpdateMainTitleCon(transition=False):
 	for y in range(WINDOW_YM, 0, -2):
 		libtcod.console_clear(0)
 		libtcod.console_blit(con, 0, y, 0, ((WINDOW_YM-y)*2)+1, 0, window_x, window_y+y)
-		Wait(2, ignore_animations=True)
+		Wait(2, ignore_animations=True, category='Transitions')
 	libtcod.console_blit(con, 0, 0, 0, 0, 0, window_x, window_y)
 
 
@@ -41107,7 +44147,7 @@ def UpdateMainTitleCon(transition=False):
 global window_x, window_y
 global main_title
 global campaign, campaign_day, scenario, session
-global steam_active, gamepad
+global steam_active, gamepad, roll_buffer
 
 campaign = None
 campaign_day = None
@@ -41115,6 +44155,9 @@ scenario = None
 session = None
 gamepad = None
 
+# buffer of percentile rolls used outside of seeded runs and random number streams, if numpy is available
+roll_buffer = NewRollBuffer(libtcod.random_get_int(0, 0, 2147483647))
+
 print(NAME + ' ' + VERSION + ' - Console Window\n')
 
 # make sure debug settings file is present if DEBUG flag is active
@@ -41138,10 +44181,21 @@ try:
 	if not os.path.isdir(HOMEPATH): os.mkdir(HOMEPATH)
 	if not os.path.isdir(MODPATH): os.mkdir(MODPATH)
 	if not os.path.isdir(LOGPATH): os.mkdir(LOGPATH)
+	
+	# summarize an analytics folder from the campaign simulator, then exit
+	if '--aggregate' in sys.argv:
+		AggregateAnalytics(sys.argv[sys.argv.index('--aggregate') + 1])
+		sys.exit()
 
 	# try to load game settings from config file, will create a new file if none present
 	LoadCFG()
 	
+	# headless play: no sound, and read input from a script if one was given
+	if HEADLESS:
+		config['ArmCom2']['sounds_enabled'] = 'false'
+		if '--input-script' in sys.argv:
+			libtcod.LoadInputScript(sys.argv[sys.argv.index('--input-script') + 1])
+	
 	# determine font to use based on settings file; set up custom font and create the root console
 	i = config['ArmCom2'].getint('display_font')
 	if i == 0:
@@ -41181,6 +44235,14 @@ try:
 	
 	# create new session object
 	session = Session()
+	if HEADLESS:
+		session.batch_resolution = True
+	
+	# record this session to a replay log, or play one back
+	if '--record' in sys.argv:
+		session.replay = ReplayLog(sys.argv[sys.argv.index('--record') + 1])
+	elif REPLAY:
+		session.replay = ReplayLog(sys.argv[sys.argv.index('--replay') + 1], playback=True)
 	
 	# try to init sound mixer and load sounds if successful
 	if config['ArmCom2'].getboolean('sounds_enabled'):
@@ -41203,24 +44265,57 @@ try:
 	libtcod.console_set_default_foreground(game_menu_con, libtcod.white)
 	libtcod.console_clear(game_menu_con)
 	
-	# try to start up steamworks
+	# try to start up steamworks; simulated campaigns and arena engagements don't count toward stats and
+	# achievements
 	global steam_active
 	steam_active = False
-	try:
-		steamworks = STEAMWORKS()
-		steamworks.initialize()
-		steam_active = True
-	except:
-		print('Unable to initialize Steamworks, stats and achievements will not be recorded!')
+	if not (SIMULATE or ARENA):
+		try:
+			steamworks = STEAMWORKS()
+			steamworks.initialize()
+			steam_active = True
+		except:
+			print('Unable to initialize Steamworks, stats and achievements will not be recorded!')
 	
 	# check for gamepad controller(s) and try to initialize
 	# if the game finds 1+ controllers at this point, it will enable the last one found
-	InitControllers(first_time=True)
+	if not HEADLESS:
+		InitControllers(first_time=True)
 	
 	# for some reason, the main console has to be re-initialized in order for the game controller to be read
 	if gamepad is not None:
 		InitMainConsole()
 	
+	# campaign simulator: play a number of campaigns under the autopilot, then exit
+	if SIMULATE:
+		num_runs = int(sys.argv[sys.argv.index('--simulate') + 1])
+		campaign_file = None
+		if '--campaign' in sys.argv:
+			campaign_file = sys.argv[sys.argv.index('--campaign') + 1]
+		workers = os.cpu_count()
+		if '--workers' in sys.argv:
+			workers = int(sys.argv[sys.argv.index('--workers') + 1])
+		base_seed = libtcod.random_get_int(0, 0, 2147483647)
+		if '--seed' in sys.argv:
+			base_seed = int(sys.argv[sys.argv.index('--seed') + 1])
+		RunCampaignSimulator(num_runs, campaign_file, workers, base_seed, analytics='--analytics' in sys.argv)
+		sys.exit()
+	
+	# arena benchmark: play a number of AI-versus-AI engagements, then exit
+	if ARENA:
+		arena_file = sys.argv[sys.argv.index('--arena') + 1]
+		num_engagements = None
+		if '--engagements' in sys.argv:
+			num_engagements = int(sys.argv[sys.argv.index('--engagements') + 1])
+		workers = os.cpu_count()
+		if '--workers' in sys.argv:
+			workers = int(sys.argv[sys.argv.index('--workers') + 1])
+		base_seed = 0
+		if '--seed' in sys.argv:
+			base_seed = int(sys.argv[sys.argv.index('--seed') + 1])
+		RunArena(arena_file, num_engagements, workers, base_seed)
+		sys.exit()
+	
 	
 	
 	##########################################################################################
@@ -41251,7 +44346,7 @@ try:
 	while time.time() - start_time < 2:
 		libtcod.console_flush()
 		FlushKeyboardEvents()
-		if DEBUG: break
+		if DEBUG or HEADLESS: break
 	
 	# load and generate main title background
 	main_title = LoadXP('main_title.xp')
@@ -41297,7 +44392,7 @@ try:
 	UpdateMainTitleCon(transition=True)
 	
 	# disable window resizing now if not in fullscreen mode
-	if config['ArmCom2']['fullscreen'] == 'false':
+	if config['ArmCom2']['fullscreen'] == 'false' and not HEADLESS:
 		sdl2.SDL_SetWindowResizable(sdl2.SDL_GetWindowFromID(session.window_id), sdl2.SDL_FALSE)
 
 	# Main Menu loop
@@ -41314,7 +44409,7 @@ try:
 			time_click = time.time()
 		
 		libtcod.console_flush()
-		if not GetInputEvent(): continue
+		if not GetInputEvent(context='Main Menu'): continue
 		key_char = DeKey(chr(key.c).lower())
 		
 		# options sub-menu active
@@ -41489,6 +44584,7 @@ except Exception:
 	traceback.print_exc()
 	if DEBUG: sys.exit()
 	OutputCrashLog(traceback.format_exc())
+	if HEADLESS: sys.exit(1)
 	if con is None: sys.exit()
 	libtcod.console_clear(con)
 	libtcod.console_set_default_foreground(con, libtcod.light_red)
@@ -0,0 +1,215 @@
+# Null display and input backend for Armoured Commander II, used when the game is started with --headless
+#
+# Provides the parts of the libtcodpy interface used by armcom2.py without opening a window: consoles are
+# kept as in-memory character buffers, screen updates do nothing, and keyboard input is read from an input
+# script rather than from SDL. Colours, constants, key and mouse objects, and the random number generators
+# are taken from libtcodpy itself so that game results are the same as with a display.
+
+import libtcodpy as _libtcod
+
+# copy over everything that doesn't need a display
+for _name, _value in vars(_libtcod).items():
+	if _name.startswith('_'): continue
+	globals()[_name] = _value
+
+
+# Console: an in-memory buffer of characters, plus default colours
+class NullConsole:
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self.default_fg = _libtcod.white
+		self.default_bg = _libtcod.black
+		self.key_color = None
+		self.chars = [[32] * width for y in range(height)]
+
+	# set the character of one cell, if it's on the console
+	def SetChar(self, x, y, c):
+		if not (0 <= x < self.width and 0 <= y < self.height): return
+		if isinstance(c, str):
+			c = ord(c)
+		self.chars[y][x] = c
+
+	# return the contents of the console as a list of text lines
+	def GetText(self):
+		lines = []
+		for row in self.chars:
+			lines.append(''.join(chr(c) if c >= 32 else ' ' for c in row).rstrip())
+		return lines
+
+
+root = NullConsole(1, 1)			# root console, 0 in console function calls
+input_script = []				# remaining lines of input script
+frames_flushed = 0				# number of times the root console would have been drawn to the screen
+
+
+# return the console object for a console argument, where 0 is the root console
+def GetConsole(con):
+	if con == 0: return root
+	return con
+
+
+# load a list of inputs from a text file, one per line: either a single character, or the name of an
+# SDL key such as RETURN, ESCAPE, or UP; blank lines and lines starting with # are skipped
+def LoadInputScript(filename):
+	global input_script
+	input_script = []
+	with open(filename, encoding='utf8') as f:
+		for line in f:
+			line = line.rstrip('\r\n')
+			if line == '' or line.startswith('#'): continue
+			input_script.append(line)
+
+
+# return the next line of the input script, or None if there are no more
+def NextScriptedInput():
+	if len(input_script) == 0: return None
+	return input_script.pop(0)
+
+
+##### Display Functions #####
+
+def console_set_custom_font(fontFile, flags=0, nb_char_horiz=0, nb_char_vertic=0):
+	pass
+
+def console_init_root(w, h, title=None, fullscreen=False, renderer=None, order='C', vsync=None):
+	global root
+	root = NullConsole(w, h)
+	return root
+
+def console_is_window_closed():
+	return False
+
+def console_is_active():
+	return True
+
+def console_flush():
+	global frames_flushed
+	frames_flushed += 1
+
+def sys_set_fps(fps):
+	pass
+
+def sys_get_renderer():
+	return 0
+
+def sys_check_for_event(mask, k, m):
+	return 0
+
+def console_new(w, h):
+	return NullConsole(w, h)
+
+def console_set_key_color(con, col):
+	GetConsole(con).key_color = col
+
+def console_set_default_foreground(con, col):
+	GetConsole(con).default_fg = col
+
+def console_set_default_background(con, col):
+	GetConsole(con).default_bg = col
+
+def console_get_default_foreground(con):
+	return GetConsole(con).default_fg
+
+def console_get_default_background(con):
+	return GetConsole(con).default_bg
+
+def console_clear(con):
+	con = GetConsole(con)
+	con.chars = [[32] * con.width for y in range(con.height)]
+
+def console_put_char(con, x, y, c, flag=None):
+	GetConsole(con).SetChar(x, y, c)
+
+def console_put_char_ex(con, x, y, c, fore, back):
+	GetConsole(con).SetChar(x, y, c)
+
+def console_set_char(con, x, y, c):
+	GetConsole(con).SetChar(x, y, c)
+
+def console_get_char(con, x, y):
+	con = GetConsole(con)
+	if not (0 <= x < con.width and 0 <= y < con.height): return 0
+	return con.chars[y][x]
+
+def console_set_char_foreground(con, x, y, col):
+	pass
+
+def console_set_char_background(con, x, y, col, flag=None):
+	pass
+
+def console_get_char_foreground(con, x, y):
+	return GetConsole(con).default_fg
+
+def console_get_char_background(con, x, y):
+	return GetConsole(con).default_bg
+
+def console_print(con, x, y, fmt):
+	con = GetConsole(con)
+	for i, c in enumerate(str(fmt)):
+		con.SetChar(x + i, y, c)
+
+def console_print_ex(con, x, y, flag, alignment, fmt):
+	text = str(fmt)
+	if alignment == _libtcod.CENTER:
+		x -= int(len(text) / 2)
+	elif alignment == _libtcod.RIGHT:
+		x -= len(text) - 1
+	console_print(con, x, y, text)
+
+def console_rect(con, x, y, w, h, clr, flag=None):
+	if not clr: return
+	con = GetConsole(con)
+	for y1 in range(y, y + h):
+		for x1 in range(x, x + w):
+			con.SetChar(x1, y1, 32)
+
+def console_hline(con, x, y, l, flag=None):
+	con = GetConsole(con)
+	for x1 in range(x, x + l):
+		con.SetChar(x1, y, 196)
+
+def console_vline(con, x, y, l, flag=None):
+	con = GetConsole(con)
+	for y1 in range(y, y + l):
+		con.SetChar(x, y1, 179)
+
+# copy characters from one console to another; blank cells on consoles with a key colour are treated
+# as transparent
+def console_blit(src, x, y, w, h, dst, xdst, ydst, ffade=1.0, bfade=1.0):
+	src = GetConsole(src)
+	dst = GetConsole(dst)
+	if w == 0: w = src.width
+	if h == 0: h = src.height
+	
+	# clip the copied area to both consoles
+	if x < 0:
+		w += x
+		xdst -= x
+		x = 0
+	if y < 0:
+		h += y
+		ydst -= y
+		y = 0
+	if xdst < 0:
+		w += xdst
+		x -= xdst
+		xdst = 0
+	if ydst < 0:
+		h += ydst
+		y -= ydst
+		ydst = 0
+	w = min(w, src.width - x, dst.width - xdst)
+	h = min(h, src.height - y, dst.height - ydst)
+	if w <= 0 or h <= 0: return
+	
+	for y1 in range(h):
+		row = src.chars[y + y1]
+		dst_row = dst.chars[ydst + y1]
+		if src.key_color is None:
+			dst_row[xdst:xdst+w] = row[x:x+w]
+			continue
+		for x1 in range(w):
+			c = row[x + x1]
+			if c in [0, 32]: continue
+			dst_row[xdst + x1] = c